@@ -1,21 +1,30 @@
 """
 Módulo de procesamiento OCR con soporte asíncrono para archivos grandes
+
+Las dependencias pesadas (cv2, numpy, pytesseract, tesserocr, PyPDF2,
+openpyxl y los pools de concurrent.futures) se importan dentro de
+cada extractor la primera vez que se usa, para no alargar el arranque de la
+API. Medir con benchmarks/bench_import_time.py.
 """
 
-import cv2
-import pytesseract
+import io
 import os
-import docx
-import PyPDF2
-import pandas as pd
 from pathlib import Path
 import xml.etree.ElementTree as ET
+import zipfile
 import json
 import asyncio
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
-from typing import Dict, Optional
+import codecs
+import csv
+import functools
+import hashlib
+from typing import Dict, List, Optional
+import math
+import re
 import time
+import threading
 import logging
+from datetime import date, datetime
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -23,77 +32,1175 @@ logger = logging.getLogger(__name__)
 
 # Configuración de procesamiento
 LARGE_FILE_THRESHOLD = 5 * 1024 * 1024  # 5MB - archivos considerados "grandes"
-MAX_WORKERS = 4  # Número máximo de workers para procesamiento paralelo
+MAX_WORKERS = int(os.getenv("OCR_THREAD_WORKERS", "4"))  # Workers del pool de hilos compartido
+MAX_PROCESS_WORKERS = int(os.getenv("OCR_PROCESS_WORKERS", str(os.cpu_count() or 2)))  # Workers del pool de procesos compartido
 
-class DocumentConverter:
-    """Módulo de conversión de documentos con soporte asíncrono"""
+# PDFs: páginas por tarea del pool de procesos y umbral de texto de una página
+# por debajo del cual se considera escaneada (solo imagen) y se le aplica OCR
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "4"))
+PDF_MIN_PAGE_TEXT_CHARS = 20
+
+# Extracción por segmentos: filas de CSV por segmento y tamaño aproximado de
+# los bloques de párrafos de Word
+CSV_ROWS_PER_SEGMENT = 500
+WORD_BLOCK_CHARS = 4000
+
+# CSV / Excel: máximo de filas de datos por hoja (o por CSV) incluidas en el
+# texto, y bytes iniciales usados para detectar codificación y separador
+TABULAR_MAX_ROWS = int(os.getenv("TABULAR_MAX_ROWS", "5000"))
+CSV_SNIFF_BYTES = 64 * 1024
+
+# OCR: idioma de Tesseract y versión del extractor. Cambiar cualquiera de los
+# dos invalida el cache de extracción (subir EXTRACTOR_VERSION al modificar
+# cualquier extract_text_from_*)
+OCR_LANG = "spa+eng"
+EXTRACTOR_VERSION = "5"
+
+# Preprocesamiento de imágenes para OCR: resolución objetivo (las fotos se
+# reducen a ~300 DPI y a un lado máximo), y reparto en bandas de líneas de
+# texto que se reconocen en paralelo
+OCR_TARGET_DPI = 300
+OCR_MAX_IMAGE_SIDE = int(os.getenv("OCR_MAX_IMAGE_SIDE", "3500"))
+OCR_BAND_WORKERS = int(os.getenv("OCR_BAND_WORKERS", str(os.cpu_count() or 2)))
+OCR_MIN_LINES_PER_BAND = 4
+
+# Motor de Tesseract: "tesserocr" mantiene un motor cargado por worker del pool
+# de procesos; "pytesseract" lanza el binario en cada llamada; "auto" usa
+# tesserocr si está instalado
+TESSERACT_BACKEND = os.getenv("TESSERACT_BACKEND", "auto").lower()
+PSM_AUTO = 3
+PSM_SINGLE_BLOCK = 6
+
+# Cache de extracción en disco (OCR_CACHE_MAX_MB=0 lo desactiva)
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "./.ocr_cache")
+OCR_CACHE_MAX_MB = int(os.getenv("OCR_CACHE_MAX_MB", "512"))
+
+# Resultados que indican fallo y no deben cachearse
+EXTRACTION_ERROR_PREFIXES = ("Error al procesar", "No se pudo extraer texto")
+
+# Extensiones soportadas
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.gif', '.webp'})
+DOCUMENT_EXTENSIONS = frozenset({'.pdf', '.docx', '.doc', '.txt', '.csv', '.xlsx', '.xls', '.json', '.xml', '.odt'})
+TEXT_FILE_TYPES = frozenset({'text', 'csv', 'json', 'xml'})
+
+# Detección por contenido: bytes iniciales leídos y firmas conocidas
+SNIFF_BYTES = 8192
+IMAGE_SIGNATURES = (b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff', b'GIF87a', b'GIF89a', b'II*\x00', b'MM\x00*')
+ZIP_SIGNATURES = (b'PK\x03\x04', b'PK\x05\x06')
+OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# ===============================
+# EXECUTORS COMPARTIDOS
+# ===============================
+
+# Un solo pool de hilos y uno de procesos por proceso, creados al primer uso
+_executor_lock = threading.Lock()
+_thread_executor = None
+_process_executor = None
+_band_executor = None
+_band_executor_pid = None
+
+def get_thread_executor():
+    """Pool de hilos compartido (se crea la primera vez que se usa)"""
+    global _thread_executor
+    if _thread_executor is None:
+        with _executor_lock:
+            if _thread_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _thread_executor = ThreadPoolExecutor(
+                    max_workers=MAX_WORKERS, thread_name_prefix="ocr"
+                )
+    return _thread_executor
+
+def get_process_executor():
+    """Pool de procesos compartido (se crea la primera vez que se usa)"""
+    global _process_executor
+    if _process_executor is None:
+        with _executor_lock:
+            if _process_executor is None:
+                from concurrent.futures import ProcessPoolExecutor
+                _process_executor = ProcessPoolExecutor(
+                    max_workers=MAX_PROCESS_WORKERS, initializer=_init_ocr_worker
+                )
+    return _process_executor
+
+def get_band_executor():
+    """
+    Pool de hilos para las bandas de OCR con pytesseract
+    
+    Cada banda la procesa un proceso de Tesseract, así que basta con hilos
+    para ocupar todos los núcleos. Es un pool aparte porque sus tareas no
+    lanzan otras tareas (usar el pool general podría bloquearse si una tarea
+    suya espera bandas), y se recrea tras un fork (workers de PDF).
+    """
+    global _band_executor, _band_executor_pid
+    if _band_executor is None or _band_executor_pid != os.getpid():
+        with _executor_lock:
+            if _band_executor is None or _band_executor_pid != os.getpid():
+                from concurrent.futures import ThreadPoolExecutor
+                _band_executor = ThreadPoolExecutor(
+                    max_workers=OCR_BAND_WORKERS, thread_name_prefix="ocr-band"
+                )
+                _band_executor_pid = os.getpid()
+    return _band_executor
+
+def shutdown_executors(wait=True):
+    """Cierra los pools compartidos (llamar al apagar la aplicación)"""
+    global _thread_executor, _process_executor, _band_executor
+    with _executor_lock:
+        executors = [_thread_executor, _process_executor, _band_executor]
+        _thread_executor = None
+        _process_executor = None
+        _band_executor = None
+    
+    for executor in executors:
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+# ===============================
+# ORIGEN DE LOS ARCHIVOS Y DETECCIÓN DE TIPO
+# ===============================
+
+class MemoryviewReader(io.RawIOBase):
+    """Lector binario con seek sobre un memoryview, sin copiar el buffer"""
+    
+    def __init__(self, data):
+        self._data = data
+        self._position = 0
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def readinto(self, buffer):
+        size = min(len(buffer), len(self._data) - self._position)
+        if size <= 0:
+            return 0
+        buffer[:size] = self._data[self._position:self._position + size]
+        self._position += size
+        return size
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._data) + offset
+        else:
+            raise ValueError(f"whence no válido: {whence}")
+        if position < 0:
+            raise ValueError("Posición negativa")
+        self._position = position
+        return position
+    
+    def tell(self):
+        return self._position
+
+class InMemoryFile:
+    """
+    Archivo recibido que se procesa desde memoria, sin archivo temporal
+    
+    Los extractores aceptan una ruta o una instancia de esta clase. Los
+    bytes se leen a través de un memoryview, sin copiarlos; el nombre solo
+    se usa para la extensión y los encabezados del texto. Al enviarse al
+    pool de procesos se copia como bytes (un memoryview no se serializa).
+    """
+    
+    def __init__(self, data, name="documento"):
+        self.data = memoryview(data).cast('B')
+        self.name = name
+        self._sha256 = None
+    
+    def __reduce__(self):
+        return (InMemoryFile, (self.data.tobytes(), self.name))
+    
+    @property
+    def size(self):
+        return self.data.nbytes
+    
+    @property
+    def sha256(self):
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+    
+    def open(self):
+        """Lector binario independiente (cada hilo puede abrir el suyo)"""
+        return io.BufferedReader(MemoryviewReader(self.data))
+
+def file_name(file):
+    """Nombre (sin directorio) de una ruta o un InMemoryFile"""
+    if isinstance(file, InMemoryFile):
+        return file.name
+    return os.path.basename(file)
+
+def file_exists(file):
+    """Indica si una ruta existe (un InMemoryFile siempre existe)"""
+    return isinstance(file, InMemoryFile) or os.path.exists(file)
+
+def file_size(file):
+    """Tamaño en bytes de una ruta o un InMemoryFile"""
+    if isinstance(file, InMemoryFile):
+        return file.size
+    return os.path.getsize(file)
+
+def open_binary(file):
+    """Abre una ruta o un InMemoryFile para lectura binaria"""
+    if isinstance(file, InMemoryFile):
+        return file.open()
+    return open(file, 'rb')
+
+def file_type_from_extension(file_path):
+    """Tipo de archivo según su extensión"""
+    extension = Path(file_path).suffix.lower()
+    
+    if extension in IMAGE_EXTENSIONS:
+        return 'image'
+    elif extension == '.pdf':
+        return 'pdf'
+    elif extension in {'.docx', '.doc'}:
+        return 'word'
+    elif extension == '.txt':
+        return 'text'
+    elif extension in {'.csv'}:
+        return 'csv'
+    elif extension in {'.xlsx', '.xls'}:
+        return 'excel'
+    elif extension == '.json':
+        return 'json'
+    elif extension == '.xml':
+        return 'xml'
+    elif extension == '.odt':
+        return 'odt'
+    else:
+        return 'unknown'
+
+def sniff_file_type(header):
+    """
+    Tipo de archivo según sus primeros bytes (magic bytes)
+    
+    Returns:
+        'pdf', 'image', 'zip' (contenedor OOXML / ODF, ver _sniff_zip_type),
+        'ole' (Word / Excel 97-2003) o None si la firma no es conocida
+    """
+    if b'%PDF-' in header[:1024]:
+        return 'pdf'
+    if header.startswith(IMAGE_SIGNATURES):
+        return 'image'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image'
+    # BMP: "BM" y cuatro bytes reservados en cero
+    if header[:2] == b'BM' and header[6:10] == b'\x00\x00\x00\x00':
+        return 'image'
+    if header.startswith(ZIP_SIGNATURES):
+        return 'zip'
+    if header.startswith(OLE_SIGNATURE):
+        return 'ole'
+    return None
+
+def _sniff_zip_type(file):
+    """Word, Excel u ODT según las partes del contenedor ZIP, o None"""
+    try:
+        with open_binary(file) as stream, zipfile.ZipFile(stream) as archive:
+            names = set(archive.namelist())
+            if 'word/document.xml' in names:
+                return 'word'
+            if 'xl/workbook.xml' in names:
+                return 'excel'
+            if 'mimetype' in names and archive.read('mimetype').startswith(b'application/vnd.oasis.opendocument.text'):
+                return 'odt'
+    except (zipfile.BadZipFile, OSError):
+        pass
+    return None
+
+def _sniff_text_type(header):
+    """JSON o XML según el primer carácter de un archivo de texto; si no, texto"""
+    content = (header[len(codecs.BOM_UTF8):] if header.startswith(codecs.BOM_UTF8) else header).lstrip()
+    if content[:1] in (b'{', b'['):
+        return 'json'
+    if content[:1] == b'<' and not content[:14].lower().startswith((b'<!doctype html', b'<html')):
+        return 'xml'
+    return 'text'
+
+def detect_file_type(file_path):
+    """
+    Detecta el tipo de archivo por su contenido y, si no alcanza, por su extensión
+    
+    Las firmas binarias (PDF, imágenes, DOCX / XLSX) tienen prioridad, así
+    que un archivo con la extensión equivocada va al extractor correcto.
+    Los archivos de texto conservan el tipo de su extensión (un .csv sigue
+    siendo CSV); sin extensión de texto se distinguen JSON, XML y texto
+    plano. Sin contenido legible se usa solo la extensión.
+    """
+    by_extension = file_type_from_extension(file_name(file_path))
+    
+    try:
+        with open_binary(file_path) as stream:
+            header = stream.read(SNIFF_BYTES)
+    except OSError:
+        return by_extension
+    
+    sniffed = sniff_file_type(header)
+    if sniffed == 'zip':
+        sniffed = _sniff_zip_type(file_path)
+    elif sniffed == 'ole':
+        # .doc y .xls comparten contenedor: decide la extensión
+        return by_extension if by_extension in ('word', 'excel') else 'unknown'
+    
+    if sniffed:
+        return sniffed
+    if by_extension in TEXT_FILE_TYPES or not header:
+        return by_extension
+    if b'\x00' not in header:
+        return _sniff_text_type(header)
+    return by_extension
+
+# ===============================
+# OCR Y MOTOR DE PDF
+# ===============================
+
+def image_dpi(image_path):
+    """DPI declarado en la cabecera de la imagen, o None"""
+    try:
+        from PIL import Image
+        with open_binary(image_path) as stream, Image.open(stream) as image:
+            dpi = image.info.get('dpi')
+        return float(dpi[0]) if dpi and dpi[0] else None
+    except Exception:
+        return None
+
+def downscale_for_ocr(gray, dpi=None):
+    """
+    Reduce la imagen a OCR_TARGET_DPI (si se conoce su DPI) y a OCR_MAX_IMAGE_SIDE
+    
+    Tesseract no gana precisión por encima de ~300 DPI y el tiempo crece con
+    el número de píxeles; nunca se amplía.
+    """
+    scale = 1.0
+    if dpi and dpi > OCR_TARGET_DPI:
+        scale = OCR_TARGET_DPI / dpi
+    
+    longest_side = max(gray.shape[:2])
+    if longest_side * scale > OCR_MAX_IMAGE_SIDE:
+        scale = OCR_MAX_IMAGE_SIDE / longest_side
+    
+    if scale >= 1.0:
+        return gray
+    
+    import cv2
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+def binarize_for_ocr(gray):
+    """Umbral adaptativo: tolera la iluminación desigual de las fotos"""
+    import cv2
+    
+    blurred = cv2.medianBlur(gray, 3)
+    return cv2.adaptiveThreshold(
+        blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15
+    )
+
+def deskew(binary):
+    """Endereza el texto según el rectángulo mínimo que contiene la tinta"""
+    import cv2
+    
+    ink = cv2.findNonZero(255 - binary)
+    if ink is None or len(ink) < 100:
+        return binary
+    
+    angle = cv2.minAreaRect(ink)[-1]
+    if angle > 45:
+        angle -= 90
+    if abs(angle) < 0.5 or abs(angle) > 30:
+        return binary
+    
+    height, width = binary.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(
+        binary, matrix, (width, height),
+        flags=cv2.INTER_NEAREST, borderMode=cv2.BORDER_CONSTANT, borderValue=255
+    )
+
+def split_line_bands(binary, max_bands):
+    """
+    Divide la imagen en bandas horizontales que no cortan líneas de texto
+    
+    Las líneas se detectan con el perfil de proyección horizontal de la
+    tinta; los cortes se hacen a mitad del espacio entre líneas.
+    
+    Returns:
+        Lista de bandas (sub-imágenes) en orden de arriba a abajo
+    """
+    import numpy as np
+    
+    height, width = binary.shape[:2]
+    rows_with_ink = (binary < 128).sum(axis=1) > max(1, width // 500)
+    
+    padded = np.concatenate(([False], rows_with_ink, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    lines = list(zip(edges[::2], edges[1::2]))
+    
+    bands_count = min(max_bands, len(lines) // OCR_MIN_LINES_PER_BAND)
+    if bands_count <= 1:
+        return [binary]
+    
+    lines_per_band = math.ceil(len(lines) / bands_count)
+    cuts = [0]
+    for index in range(lines_per_band, len(lines), lines_per_band):
+        previous_end = lines[index - 1][1]
+        next_start = lines[index][0]
+        cuts.append((previous_end + next_start) // 2)
+    cuts.append(height)
+    
+    return [binary[top:bottom] for top, bottom in zip(cuts, cuts[1:])]
+
+# ===============================
+# MOTOR TESSERACT
+# ===============================
+
+# Estado por proceso: los workers del pool de procesos cargan su motor una vez
+_in_ocr_worker = False
+_tess_api = None
+
+@functools.lru_cache(maxsize=None)
+def load_tesserocr():
+    """
+    Motor Tesseract persistente (opcional): sin él cada llamada lanza un
+    proceso. Retorna el módulo tesserocr, o None si no está instalado.
+    """
+    try:
+        import tesserocr
+    except ImportError:
+        return None
+    return tesserocr
+
+def use_tesserocr():
+    """Indica si se usa el motor persistente (tesserocr) en lugar de pytesseract"""
+    if TESSERACT_BACKEND == "pytesseract":
+        return False
+    return load_tesserocr() is not None
+
+def _init_ocr_worker():
+    """
+    Inicializador de los workers del pool de procesos
+    
+    Carga el motor de Tesseract con los datos de idioma una sola vez por
+    proceso. Nunca lanza excepciones: un fallo aquí rompería el pool entero.
+    """
+    global _in_ocr_worker
+    _in_ocr_worker = True
+    if not use_tesserocr():
+        return
+    try:
+        _get_tess_api()
+    except Exception as e:
+        logger.warning(f"No se pudo precargar Tesseract en el worker: {e}")
+
+def _get_tess_api():
+    """Motor tesserocr del proceso (OCR_LANG, o el idioma por defecto si falta)"""
+    global _tess_api
+    if _tess_api is None:
+        tesserocr = load_tesserocr()
+        try:
+            _tess_api = tesserocr.PyTessBaseAPI(lang=OCR_LANG)
+        except RuntimeError:
+            _tess_api = tesserocr.PyTessBaseAPI()
+    return _tess_api
+
+def _tesserocr_recognize(image, psm=PSM_AUTO):
+    """Reconoce una imagen en escala de grises con el motor ya cargado"""
+    import numpy as np
+    
+    image = np.ascontiguousarray(image)
+    height, width = image.shape[:2]
+    
+    api = _get_tess_api()
+    api.SetPageSegMode(psm)
+    api.SetImageBytes(image.tobytes(), width, height, 1, width)
+    return api.GetUTF8Text()
+
+def _pytesseract_recognize(image, psm=PSM_AUTO):
+    """Una llamada al binario de Tesseract (OCR_LANG, o el idioma por defecto si falta)"""
+    import pytesseract
+    
+    config = f'--psm {psm}'
+    try:
+        return pytesseract.image_to_string(image, lang=OCR_LANG, config=config)
+    except pytesseract.TesseractError:
+        return pytesseract.image_to_string(image, config=config)
+
+def recognize_images(images, psm=PSM_AUTO):
+    """
+    Reconoce varias imágenes y retorna sus textos en el mismo orden
+    
+    - tesserocr, proceso principal: las imágenes se encolan al pool de
+      procesos, donde cada worker tiene su motor ya cargado
+    - tesserocr, dentro de un worker (páginas de PDF): en serie con el motor
+      del propio worker; el paralelismo ya está en las páginas
+    - pytesseract: hilos, porque cada llamada ya es un proceso aparte
+    """
+    if use_tesserocr():
+        if _in_ocr_worker:
+            return [_tesserocr_recognize(image, psm) for image in images]
+        executor = get_process_executor()
+        return list(executor.map(_tesserocr_recognize, images, [psm] * len(images)))
+    
+    if len(images) == 1:
+        return [_pytesseract_recognize(images[0], psm)]
+    
+    executor = get_band_executor()
+    return list(executor.map(lambda image: _pytesseract_recognize(image, psm), images))
+
+def ocr_image_array(gray, dpi=None):
+    """
+    Pipeline de OCR para una imagen en escala de grises
+    
+    Reducción, umbral adaptativo y enderezado; luego las bandas de líneas se
+    reconocen en paralelo (--psm 6: bloque uniforme de texto) y se unen en orden.
+    """
+    binary = deskew(binarize_for_ocr(downscale_for_ocr(gray, dpi)))
+    bands = split_line_bands(binary, OCR_BAND_WORKERS)
+    
+    if len(bands) == 1:
+        return recognize_images([binary])[0].strip()
+    
+    texts = recognize_images(bands, PSM_SINGLE_BLOCK)
+    return "\n".join(text.strip() for text in texts if text.strip())
+
+def _ocr_pdf_page_images(page):
+    """
+    OCR de las imágenes incrustadas en una página de PDF
+    
+    Los PDF escaneados guardan cada página como una imagen; se decodifican
+    directamente en lugar de rasterizar la página completa.
+    """
+    import cv2
+    import numpy as np
+    
+    texts = []
+    for image in page.images:
+        gray = cv2.imdecode(np.frombuffer(image.data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            continue
+        text = ocr_image_array(gray)
+        if text:
+            texts.append(text)
+    return "\n".join(texts)
+
+def _extract_pdf_page_range(pdf_path, start, end):
+    """
+    Extrae texto de las páginas [start, end) de un PDF
+    
+    Se ejecuta en el pool de procesos, por eso es una función de módulo y
+    abre su propio lector. Las páginas sin texto se procesan con OCR.
+    
+    Returns:
+        Lista de dicts con page, text, seconds, ocr y error por página
+    """
+    import PyPDF2
+    
+    reader = PyPDF2.PdfReader(pdf_path.open() if isinstance(pdf_path, InMemoryFile) else pdf_path)
+    results = []
+    
+    for page_index in range(start, end):
+        page_start = time.perf_counter()
+        result = {'page': page_index + 1, 'text': '', 'ocr': False, 'error': None}
+        
+        try:
+            page = reader.pages[page_index]
+            text = page.extract_text() or ""
+            
+            if len(text.strip()) < PDF_MIN_PAGE_TEXT_CHARS:
+                ocr_text = _ocr_pdf_page_images(page)
+                if len(ocr_text) > len(text.strip()):
+                    text = ocr_text
+                    result['ocr'] = True
+            
+            result['text'] = text
+        except Exception as e:
+            result['error'] = str(e)
+        
+        result['seconds'] = round(time.perf_counter() - page_start, 4)
+        results.append(result)
+    
+    return results
+
+def _format_pdf_page(result):
+    """Texto de una página con el separador usado en el documento convertido"""
+    if result['error']:
+        return f"\n--- Error en página {result['page']}: {result['error']} ---\n"
+    if result['text'].strip():
+        return f"\n--- Página {result['page']} ---\n{result['text']}\n"
+    return ""
+
+def iter_pdf_pages(pdf_path):
+    """
+    Extrae las páginas de un PDF repartiendo rangos en el pool de procesos
+    
+    Todos los rangos se encolan de inmediato y las páginas se entregan en
+    orden a medida que termina cada rango. Un InMemoryFile también se
+    reparte: cada rango recibe una copia de los bytes (a lo sumo
+    UPLOAD_IN_MEMORY_MAX_MB), poco frente al OCR de sus páginas.
+    
+    Yields:
+        Dicts con page, text, seconds, ocr y error por página
+    """
+    import PyPDF2
+    
+    with open_binary(pdf_path) as file:
+        total_pages = len(PyPDF2.PdfReader(file).pages)
+    
+    logger.info(f"Procesando PDF con {total_pages} páginas...")
+    
+    pages_per_task = max(PDF_PAGES_PER_TASK, math.ceil(total_pages / (MAX_PROCESS_WORKERS * 4)))
+    ranges = [
+        (start, min(start + pages_per_task, total_pages))
+        for start in range(0, total_pages, pages_per_task)
+    ]
+    
+    futures = []
+    if len(ranges) > 1:
+        try:
+            executor = get_process_executor()
+            futures = [
+                executor.submit(_extract_pdf_page_range, pdf_path, start, end)
+                for start, end in ranges
+            ]
+        except Exception as e:
+            logger.warning(f"Pool de procesos no disponible ({e}), procesando PDF en serie")
+            futures = []
+    
+    try:
+        for index, (start, end) in enumerate(ranges):
+            chunk = None
+            if futures:
+                try:
+                    chunk = futures[index].result()
+                except Exception as e:
+                    logger.warning(f"Falló el rango {start + 1}-{end} en el pool ({e}), reintentando en serie")
+            if chunk is None:
+                chunk = _extract_pdf_page_range(pdf_path, start, end)
+            
+            yield from chunk
+    finally:
+        # Si quien consume abandona el generador, no seguir trabajando
+        for future in futures:
+            future.cancel()
+
+def extract_pdf_pages(pdf_path):
+    """
+    Extrae el texto completo de un PDF con tiempos por página
+    
+    Returns:
+        Dict con text (páginas unidas en orden), pages (tiempos por página) y
+        total_seconds
+    """
+    start_time = time.perf_counter()
+    
+    parts = []
+    pages = []
+    for result in iter_pdf_pages(pdf_path):
+        parts.append(_format_pdf_page(result))
+        pages.append({
+            'page': result['page'],
+            'seconds': result['seconds'],
+            'ocr': result['ocr'],
+            'chars': len(result['text'])
+        })
+    
+    total_seconds = time.perf_counter() - start_time
+    ocr_pages = sum(1 for page in pages if page['ocr'])
+    logger.info(
+        f"PDF procesado: {len(pages)} páginas ({ocr_pages} con OCR) en {total_seconds:.2f}s"
+    )
+    
+    return {
+        'text': "".join(parts),
+        'pages': pages,
+        'total_seconds': round(total_seconds, 4)
+    }
+
+# ===============================
+# CACHE DE EXTRACCIÓN
+# ===============================
+
+class ExtractionCache:
+    """
+    Cache en disco de texto extraído, con expulsión LRU por tamaño
+    
+    La clave combina el SHA-256 del archivo, EXTRACTOR_VERSION, OCR_LANG y el
+    tipo de extractor. El uso se registra en el mtime de cada entrada, así que
+    los procesos que comparten el directorio comparten también el orden LRU.
+    """
+    
+    def __init__(self, cache_dir=OCR_CACHE_DIR, max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+    
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+    
+    @staticmethod
+    def file_sha256(file_path):
+        """SHA-256 del contenido de un archivo, leído por bloques"""
+        if isinstance(file_path, InMemoryFile):
+            return file_path.sha256
+        
+        hasher = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                hasher.update(block)
+        return hasher.hexdigest()
+    
+    def _entry_path(self, sha256, kind):
+        key = hashlib.sha256(
+            f"{sha256}:{EXTRACTOR_VERSION}:{OCR_LANG}:{kind}".encode()
+        ).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.txt"
+    
+    def get(self, sha256, kind):
+        """Texto cacheado o None"""
+        entry = self._entry_path(sha256, kind)
+        try:
+            text = entry.read_text(encoding='utf-8')
+        except (FileNotFoundError, OSError):
+            return None
+        
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return text
+    
+    def put(self, sha256, kind, text):
+        """Guarda un resultado (los mensajes de error no se cachean)"""
+        if not text or not text.strip() or text.startswith(EXTRACTION_ERROR_PREFIXES):
+            return
+        
+        entry = self._entry_path(sha256, kind)
+        data = text.encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+        
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._tmp_path(entry)
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, entry)
+        except OSError as e:
+            logger.warning(f"No se pudo escribir en el cache de extracción: {e}")
+            return
+        
+        self._account(len(data))
+    
+    def tee_segments(self, sha256, kind, segments):
+        """
+        Entrega los segmentos tal cual y, si se consumen completos, guarda su
+        texto en el cache sin acumularlo en memoria
+        """
+        entry = self._entry_path(sha256, kind)
+        tmp_path = self._tmp_path(entry)
+        
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = open(tmp_path, 'w', encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"No se pudo escribir en el cache de extracción: {e}")
+            yield from segments
+            return
+        
+        completed = False
+        try:
+            with tmp_file:
+                for segment in segments:
+                    tmp_file.write(segment['text'])
+                    yield segment
+            completed = True
+        finally:
+            size = tmp_path.stat().st_size if tmp_path.exists() else 0
+            if completed and 0 < size <= self.max_bytes:
+                os.replace(tmp_path, entry)
+                self._account(size)
+            elif tmp_path.exists():
+                tmp_path.unlink()
+    
+    def _tmp_path(self, entry):
+        return entry.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    
+    def _account(self, size):
+        """Suma una entrada nueva al total y expulsa si se pasa del límite"""
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += size
+            
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+    
+    def _entries(self):
+        entries = []
+        for entry in self.cache_dir.glob('*/*.txt'):
+            try:
+                info = entry.stat()
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, entry))
+        return entries
+    
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
     
-    def __init__(self):
-        # Configurar Tesseract si es necesario
-        # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    def _evict(self):
+        """Borra las entradas menos usadas hasta quedar al 90% del límite"""
+        entries = sorted(self._entries(), key=lambda item: item[0])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
         
-        # Extensiones soportadas
-        self.image_extensions = {'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.gif', '.webp'}
-        self.document_extensions = {'.pdf', '.docx', '.doc', '.txt', '.csv', '.xlsx', '.xls', '.json', '.xml', '.odt'}
+        for _, size, entry in entries:
+            if total <= target:
+                break
+            try:
+                entry.unlink()
+                total -= size
+            except OSError:
+                pass
+        
+        self._total_bytes = total
+
+extraction_cache = ExtractionCache()
+
+def cached_extraction(kind):
+    """
+    Decorador para métodos extract_* de DocumentConverter
+    
+    Con un acierto en el cache no se ejecuta el extractor. Si el método
+    retorna un dict (extract_pdf_pages), se cachea su campo 'text'.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, file_path):
+            if not extraction_cache.enabled:
+                return method(self, file_path)
+            
+            try:
+                sha256 = ExtractionCache.file_sha256(file_path)
+            except OSError:
+                return method(self, file_path)
+            
+            cached = extraction_cache.get(sha256, kind)
+            if cached is not None:
+                logger.info(f"Extracción desde cache ({kind}): {file_name(file_path)}")
+                if method.__name__ == 'extract_pdf_pages':
+                    return {'text': cached, 'pages': [], 'total_seconds': 0, 'cached': True}
+                return cached
+            
+            result = method(self, file_path)
+            extraction_cache.put(sha256, kind, result['text'] if isinstance(result, dict) else result)
+            return result
+        return wrapper
+    return decorator
+
+# ===============================
+# SEGMENTOS DE TEXTO
+# ===============================
+
+def _segment(text, kind, **position):
+    """
+    Segmento de texto extraído con su posición en el archivo de origen
+    
+    kind: page (PDF), block / table / page_header / page_footer (Word),
+    header / rows / summary (CSV y Excel), sheet (Excel) o document (archivo
+    completo)
+    """
+    return {
+        'text': text.encode('utf-8', errors='ignore').decode('utf-8'),
+        'kind': kind,
+        'position': position
+    }
+
+def detect_text_encoding(file_path, max_bytes=None):
+    """
+    Detecta la codificación de un archivo de texto en una sola lectura
+    
+    UTF-8 (con o sin BOM) si todo el archivo es UTF-8 válido; si no, latin-1,
+    que acepta cualquier byte (mismo resultado que la cadena de reintentos
+    utf-8 -> latin-1 usada antes, sin volver a parsear el archivo).
+    
+    Con max_bytes solo se revisa el inicio del archivo; quien lo use debe
+    leer el resto con errors='replace'.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    remaining = max_bytes
+    with open_binary(file_path) as file:
+        first_block = True
+        has_bom = False
+        while remaining is None or remaining > 0:
+            block = file.read(1024 * 1024 if remaining is None else min(remaining, 1024 * 1024))
+            if not block:
+                # Fin del archivo: una secuencia UTF-8 incompleta es un error
+                try:
+                    decoder.decode(b'', final=True)
+                except UnicodeDecodeError:
+                    return 'latin-1'
+                break
+            if remaining is not None:
+                remaining -= len(block)
+            if first_block:
+                has_bom = block.startswith(codecs.BOM_UTF8)
+                first_block = False
+            try:
+                decoder.decode(block)
+            except UnicodeDecodeError:
+                return 'latin-1'
+    
+    return 'utf-8-sig' if has_bom else 'utf-8'
+
+def format_cell(value):
+    """
+    Texto compacto de una celda de CSV / Excel
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        if value.time() == datetime.min.time():
+            return value.date().isoformat()
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return " ".join(str(value).split())
+
+def format_row(values):
+    """
+    Fila como "a | b | c", sin las celdas vacías del final ("" si está vacía)
+    """
+    cells = [format_cell(value) for value in values]
+    while cells and not cells[-1]:
+        cells.pop()
+    return " | ".join(cells)
+
+def iter_table_segments(rows, max_rows=None, **position):
+    """
+    Segmentos 'rows' de CSV_ROWS_PER_SEGMENT filas de datos no vacías
+    
+    Se detiene al pasar de max_rows (TABULAR_MAX_ROWS por defecto) sin leer
+    el resto de filas. Al agotarse retorna (total_filas, truncado) como
+    valor del generador.
+    """
+    max_rows = TABULAR_MAX_ROWS if max_rows is None else max_rows
+    batch = []
+    total_rows = 0
+    truncated = False
+    
+    for values in rows:
+        line = format_row(values)
+        if not line:
+            continue
+        if total_rows >= max_rows:
+            truncated = True
+            break
         
-        # Executor para procesamiento asíncrono
-        self.thread_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
-        self.process_executor = ProcessPoolExecutor(max_workers=2)
+        batch.append(line)
+        total_rows += 1
+        if len(batch) >= CSV_ROWS_PER_SEGMENT:
+            yield _segment("\n".join(batch) + "\n", 'rows', first_row=total_rows - len(batch) + 1,
+                           last_row=total_rows, **position)
+            batch = []
+    
+    if batch:
+        yield _segment("\n".join(batch) + "\n", 'rows', first_row=total_rows - len(batch) + 1,
+                       last_row=total_rows, **position)
+    return total_rows, truncated
+
+def rows_summary(total_rows, truncated):
+    """
+    Línea con el total de filas, indicando si se aplicó TABULAR_MAX_ROWS
+    """
+    if truncated:
+        return f"Filas: más de {total_rows} (se incluyen las primeras {total_rows})"
+    return f"Filas: {total_rows}"
+
+# ===============================
+# DOCX (WORDPROCESSINGML)
+# ===============================
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+MC_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
+DOCX_BODY_PART = 'word/document.xml'
+
+def iter_wordml_items(stream):
+    """
+    Recorre una parte WordprocessingML (documento, encabezado o pie) con
+    iterparse, en orden del documento
+    
+    Los párrafos de cuadros de texto se entregan como párrafos propios; las
+    tablas anidadas se aplanan dentro de la celda que las contiene
+    ("a, b / c, d"). Las
+    versiones alternativas (mc:Fallback) se omiten para no duplicar texto.
+    Los elementos ya entregados se liberan, así que la memoria no crece con
+    el documento.
+    
+    Yields:
+        ('paragraph', texto) o ('table', [filas "a | b | c"])
+    """
+    paragraphs = []  # pila: párrafo de un cuadro de texto dentro de otro párrafo
+    tables = []  # pila: dicts con rows, row y cell de cada tabla abierta
+    elements = []
+    in_run = 0
+    in_fallback = 0
+    
+    for event, element in ET.iterparse(stream, events=('start', 'end')):
+        tag = element.tag
+        
+        if event == 'start':
+            elements.append(element)
+            if tag == WORD_NS + 'p':
+                paragraphs.append([])
+            elif tag == WORD_NS + 'r':
+                in_run += 1
+            elif tag == WORD_NS + 'tbl':
+                tables.append({'rows': [], 'row': None, 'cell': None})
+            elif tag == WORD_NS + 'tr' and tables:
+                tables[-1]['row'] = []
+            elif tag == WORD_NS + 'tc' and tables:
+                tables[-1]['cell'] = []
+            elif tag == MC_FALLBACK:
+                in_fallback += 1
+            continue
+        
+        elements.pop()
+        item = None
+        
+        if tag == WORD_NS + 't':
+            if paragraphs and not in_fallback:
+                paragraphs[-1].append(element.text or '')
+        elif tag == WORD_NS + 'tab' and in_run:
+            if paragraphs and not in_fallback:
+                paragraphs[-1].append('\t')
+        elif tag in (WORD_NS + 'br', WORD_NS + 'cr'):
+            if paragraphs and not in_fallback:
+                paragraphs[-1].append('\n')
+        elif tag == WORD_NS + 'noBreakHyphen':
+            if paragraphs and not in_fallback:
+                paragraphs[-1].append('-')
+        elif tag == WORD_NS + 'r':
+            in_run -= 1
+        elif tag == MC_FALLBACK:
+            in_fallback -= 1
+        elif tag == WORD_NS + 'p':
+            text = ''.join(paragraphs.pop())
+            if in_fallback:
+                pass
+            elif tables and tables[-1]['cell'] is not None:
+                if text.strip():
+                    tables[-1]['cell'].append(text.strip())
+            else:
+                item = ('paragraph', text)
+        elif tag == WORD_NS + 'tc' and tables:
+            table = tables[-1]
+            if table['row'] is not None:
+                table['row'].append(' '.join(table['cell'] or []))
+            table['cell'] = None
+        elif tag == WORD_NS + 'tr' and tables:
+            table = tables[-1]
+            # Cada celda combinada aparece una vez: sin reconstruir la cuadrícula
+            if len(tables) > 1:
+                row = ', '.join(cell for cell in table['row'] or [] if cell)
+            else:
+                row = format_row(table['row'] or [])
+            if row:
+                table['rows'].append(row)
+            table['row'] = None
+        elif tag == WORD_NS + 'tbl' and tables:
+            table = tables.pop()
+            if tables and tables[-1]['cell'] is not None:
+                if table['rows']:
+                    tables[-1]['cell'].append(' / '.join(table['rows']))
+            elif not in_fallback:
+                item = ('table', table['rows'])
+        
+        # Al terminar un elemento de primer nivel se libera todo lo anterior
+        if not paragraphs and not tables and elements and tag in (WORD_NS + 'p', WORD_NS + 'tbl'):
+            elements[-1].clear()
+        
+        if item is not None:
+            yield item
+
+def docx_part_text(docx_path, part):
+    """
+    Texto de una parte del DOCX (encabezado o pie de página)
+    
+    Abre su propio ZipFile para poder ejecutarse en el pool de hilos en
+    paralelo con la lectura del cuerpo.
+    """
+    lines = []
+    with open_binary(docx_path) as file, zipfile.ZipFile(file) as archive, archive.open(part) as stream:
+        for kind, content in iter_wordml_items(stream):
+            if kind == 'paragraph':
+                if content.strip():
+                    lines.append(content.strip())
+            else:
+                lines.extend(content)
+    return "\n".join(lines)
+
+def _docx_part_number(part):
+    """Número de header3.xml / footer12.xml, para ordenarlos"""
+    digits = ''.join(character for character in Path(part).stem if character.isdigit())
+    return int(digits) if digits else 0
+
+class DocumentConverter:
+    """Módulo de conversión de documentos con soporte asíncrono"""
+    
+    # Configurar Tesseract si es necesario
+    # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    
+    image_extensions = IMAGE_EXTENSIONS
+    document_extensions = DOCUMENT_EXTENSIONS
+    
+    @property
+    def thread_executor(self):
+        """Pool de hilos compartido por todos los conversores"""
+        return get_thread_executor()
+    
+    @property
+    def process_executor(self):
+        """Pool de procesos compartido por todos los conversores"""
+        return get_process_executor()
     
     def detect_file_type(self, file_path):
-        """Detecta el tipo de archivo basado en su extensión"""
-        extension = Path(file_path).suffix.lower()
-        
-        if extension in self.image_extensions:
-            return 'image'
-        elif extension == '.pdf':
-            return 'pdf'
-        elif extension in {'.docx', '.doc'}:
-            return 'word'
-        elif extension == '.txt':
-            return 'text'
-        elif extension in {'.csv'}:
-            return 'csv'
-        elif extension in {'.xlsx', '.xls'}:
-            return 'excel'
-        elif extension == '.json':
-            return 'json'
-        elif extension == '.xml':
-            return 'xml'
-        elif extension == '.odt':
-            return 'odt'
-        else:
-            return 'unknown'
+        """Detecta el tipo de archivo por su contenido y su extensión"""
+        return detect_file_type(file_path)
     
-    def is_large_file(self, file_path: str) -> bool:
+    def is_large_file(self, file_path) -> bool:
         """Determina si un archivo es grande y necesita procesamiento asíncrono"""
         try:
-            file_size = os.path.getsize(file_path)
-            return file_size > LARGE_FILE_THRESHOLD
+            return file_size(file_path) > LARGE_FILE_THRESHOLD
         except:
             return False
     
+    @cached_extraction('image')
     def extract_text_from_image(self, image_path):
         """Extrae texto de imágenes usando OCR"""
+        import cv2
+        import numpy as np
+        
         try:
-            img = cv2.imread(image_path)
-            if img is None:
-                raise ValueError(f"No se pudo cargar la imagen: {image_path}")
-            
-            # Convertir a escala de grises
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            
-            # Aplicar umbral para mejorar el OCR
-            _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
+            # Cargar directamente en escala de grises
+            if isinstance(image_path, InMemoryFile):
+                gray = cv2.imdecode(np.frombuffer(image_path.data, np.uint8), cv2.IMREAD_GRAYSCALE)
+            else:
+                gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                raise ValueError(f"No se pudo cargar la imagen: {file_name(image_path)}")
             
-            # Realizar OCR
-            try:
-                text = pytesseract.image_to_string(thresh, lang='spa')
-            except pytesseract.TesseractError:
-                try:
-                    text = pytesseract.image_to_string(thresh, lang='eng')
-                except pytesseract.TesseractError:
-                    text = pytesseract.image_to_string(thresh)
+            text = ocr_image_array(gray, image_dpi(image_path))
             
             # Normalizar encoding
             text = text.encode('utf-8', errors='ignore').decode('utf-8')
@@ -103,7 +1210,7 @@ class DocumentConverter:
     
     async def extract_text_from_pdf_async(self, pdf_path):
         """Extrae texto de PDFs grandes de forma asíncrona"""
-        loop = asyncio.get_event_loop()
+        loop = asyncio.get_running_loop()
         return await loop.run_in_executor(
             self.thread_executor,
             self._extract_text_from_pdf_sync,
@@ -112,115 +1219,253 @@ class DocumentConverter:
     
     def _extract_text_from_pdf_sync(self, pdf_path):
         """Versión síncrona de extracción de PDF"""
+        return self.extract_pdf_pages(pdf_path)['text']
+    
+    @cached_extraction('pdf')
+    def extract_pdf_pages(self, pdf_path):
+        """
+        Extrae texto de un PDF con tiempos por página
+        
+        Returns:
+            Dict con text (o mensaje de error), pages y total_seconds
+        """
         try:
-            text = ""
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                total_pages = len(pdf_reader.pages)
-                
-                logger.info(f"Procesando PDF con {total_pages} páginas...")
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text.strip():
-                            text += f"\n--- Página {page_num + 1} ---\n"
-                            text += page_text + "\n"
-                        
-                        # Log de progreso cada 10 páginas
-                        if (page_num + 1) % 10 == 0:
-                            logger.info(f"Procesadas {page_num + 1}/{total_pages} páginas")
-                            
-                    except Exception as e:
-                        text += f"\n--- Error en página {page_num + 1}: {str(e)} ---\n"
-            
-            text = text.encode('utf-8', errors='ignore').decode('utf-8')
-            return text.strip() if text.strip() else "No se pudo extraer texto del PDF"
+            result = extract_pdf_pages(pdf_path)
+            text = result['text'].encode('utf-8', errors='ignore').decode('utf-8')
+            result['text'] = text.strip() if text.strip() else "No se pudo extraer texto del PDF"
+            return result
         except Exception as e:
-            return f"Error al procesar PDF: {str(e)}"
+            return {
+                'text': f"Error al procesar PDF: {str(e)}",
+                'pages': [],
+                'total_seconds': 0
+            }
     
     def extract_text_from_pdf(self, pdf_path):
         """Extrae texto de archivos PDF (versión síncrona para PDFs pequeños)"""
         return self._extract_text_from_pdf_sync(pdf_path)
     
-    def extract_text_from_word(self, word_path):
-        """Extrae texto de documentos Word (.docx)"""
-        try:
-            doc = docx.Document(word_path)
-            text = ""
+    def iter_word_segments(self, word_path):
+        """
+        Segmentos de un documento Word en orden del documento
+        
+        word/document.xml se lee en streaming (iterparse): los párrafos
+        consecutivos, incluidos los de cuadros de texto, se agrupan en bloques
+        de ~WORD_BLOCK_CHARS y cada tabla es un segmento propio. Los
+        encabezados y pies de página se leen en el pool de hilos mientras
+        tanto y se agregan al final, sin repetir los idénticos.
+        """
+        with open_binary(word_path) as file, zipfile.ZipFile(file) as archive:
+            names = set(archive.namelist())
+            if DOCX_BODY_PART not in names:
+                raise ValueError("El archivo no es un documento Word (.docx) válido")
             
-            # Extraer texto de párrafos
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
+            header_parts = sorted((name for name in names if re.fullmatch(r'word/header\d*\.xml', name)),
+                                  key=_docx_part_number)
+            footer_parts = sorted((name for name in names if re.fullmatch(r'word/footer\d*\.xml', name)),
+                                  key=_docx_part_number)
             
-            # Extraer texto de tablas
-            for table in doc.tables:
-                text += "\n--- Tabla ---\n"
-                for row in table.rows:
-                    row_text = []
-                    for cell in row.cells:
-                        row_text.append(cell.text.strip())
-                    text += " | ".join(row_text) + "\n"
+            executor = self.thread_executor
+            futures = [
+                (kind, part, executor.submit(docx_part_text, word_path, part))
+                for kind, parts in (('page_header', header_parts), ('page_footer', footer_parts))
+                for part in parts
+            ]
             
-            text = text.encode('utf-8', errors='ignore').decode('utf-8')
+            try:
+                block = []
+                block_chars = 0
+                index = 0
+                
+                with archive.open(DOCX_BODY_PART) as stream:
+                    for kind, content in iter_wordml_items(stream):
+                        if kind == 'paragraph':
+                            text = content + "\n"
+                            block.append(text)
+                            block_chars += len(text)
+                            
+                            if block_chars >= WORD_BLOCK_CHARS:
+                                yield _segment("".join(block), 'block', block=index)
+                                index += 1
+                                block = []
+                                block_chars = 0
+                        
+                        else:
+                            if block:
+                                yield _segment("".join(block), 'block', block=index)
+                                index += 1
+                                block = []
+                                block_chars = 0
+                            
+                            rows = ["\n--- Tabla ---\n"]
+                            rows.extend(row + "\n" for row in content)
+                            yield _segment("".join(rows), 'table', block=index)
+                            index += 1
+                
+                if block:
+                    yield _segment("".join(block), 'block', block=index)
+                
+                seen = set()
+                titles = {'page_header': "Encabezado", 'page_footer': "Pie de página"}
+                for kind, part, future in futures:
+                    # Si la tarea no empezó (pool ocupado) se ejecuta aquí: esperar
+                    # a otra tarea del mismo pool desde una de sus tareas podría bloquearse
+                    if future.cancel():
+                        text = docx_part_text(word_path, part)
+                    else:
+                        text = future.result()
+                    if text and text not in seen:
+                        seen.add(text)
+                        yield _segment(f"\n--- {titles[kind]} ---\n{text}\n", kind)
+            finally:
+                for _, _, future in futures:
+                    future.cancel()
+    
+    @cached_extraction('word')
+    def extract_text_from_word(self, word_path):
+        """Extrae texto de documentos Word (.docx)"""
+        try:
+            text = "".join(segment['text'] for segment in self.iter_word_segments(word_path))
             return text.strip()
         except Exception as e:
             return f"Error al procesar documento Word: {str(e)}"
     
+    def iter_csv_segments(self, csv_path):
+        """
+        Segmentos de un CSV: encabezado, lotes de CSV_ROWS_PER_SEGMENT filas
+        y un resumen final con el total de filas
+        
+        Se lee fila a fila con el módulo csv. La codificación y el separador
+        se detectan una sola vez sobre el inicio del archivo.
+        """
+        encoding = detect_text_encoding(csv_path, max_bytes=CSV_SNIFF_BYTES)
+        
+        with io.TextIOWrapper(open_binary(csv_path), encoding=encoding, errors='replace', newline='') as file:
+            sample = file.read(CSV_SNIFF_BYTES)
+            file.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+            except csv.Error:
+                dialect = csv.excel
+            
+            reader = csv.reader(file, dialect)
+            columns = next(reader, [])
+            
+            header = f"Archivo CSV: {file_name(csv_path)}\n"
+            header += f"Columnas: {len(columns)}\n\n"
+            header += "--- Columnas ---\n"
+            header += ", ".join(format_cell(column) for column in columns) + "\n\n"
+            header += "--- Datos ---\n"
+            yield _segment(header, 'header')
+            
+            total_rows, truncated = yield from iter_table_segments(reader)
+        
+        yield _segment(f"\n{rows_summary(total_rows, truncated)}\n", 'summary',
+                       rows=total_rows, truncated=truncated)
+    
+    @cached_extraction('csv')
     def extract_text_from_csv(self, csv_path):
         """Extrae texto de archivos CSV"""
         try:
-            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-            df = None
+            return "".join(segment['text'] for segment in self.iter_csv_segments(csv_path))
+        except Exception as e:
+            return f"Error al procesar CSV: {str(e)}"
+    
+    def _open_workbook(self, excel_path):
+        """
+        Abre un libro de Excel para leerlo fila a fila
+        
+        .xlsx con openpyxl en modo read_only (las filas se leen del XML a
+        medida que se recorren); .xls con xlrd bajo demanda.
+        
+        Returns:
+            (nombres de hojas, función nombre -> iterador de filas, cerrar)
+        """
+        with open_binary(excel_path) as stream:
+            is_xlsx = stream.read(4) in ZIP_SIGNATURES
+        
+        if not is_xlsx:
+            import xlrd
+            
+            if isinstance(excel_path, InMemoryFile):
+                workbook = xlrd.open_workbook(file_contents=excel_path.data.tobytes(), on_demand=True)
+            else:
+                workbook = xlrd.open_workbook(excel_path, on_demand=True)
             
-            for encoding in encodings:
+            def xls_cell(value, cell_type):
+                # xlrd entrega las fechas como número de serie de Excel
+                if cell_type != xlrd.XL_CELL_DATE:
+                    return value
                 try:
-                    df = pd.read_csv(csv_path, encoding=encoding)
-                    break
-                except UnicodeDecodeError:
-                    continue
+                    return xlrd.xldate.xldate_as_datetime(value, workbook.datemode)
+                except (xlrd.xldate.XLDateError, ValueError, OverflowError):
+                    return value
             
-            if df is None:
-                df = pd.read_csv(csv_path, encoding='utf-8', errors='ignore')
+            def xls_rows(sheet_name):
+                sheet = workbook.sheet_by_name(sheet_name)
+                for row in range(sheet.nrows):
+                    yield [
+                        xls_cell(value, cell_type)
+                        for value, cell_type in zip(sheet.row_values(row), sheet.row_types(row))
+                    ]
+                workbook.unload_sheet(sheet_name)
             
-            text = f"Archivo CSV: {os.path.basename(csv_path)}\n"
-            text += f"Filas: {len(df)}, Columnas: {len(df.columns)}\n\n"
-            text += "--- Columnas ---\n"
-            text += ", ".join(df.columns.tolist()) + "\n\n"
-            text += "--- Datos ---\n"
-            text += df.to_string(index=False)
+            return workbook.sheet_names(), xls_rows, workbook.release_resources
+        
+        import openpyxl
+        
+        source = excel_path.open() if isinstance(excel_path, InMemoryFile) else excel_path
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        
+        def xlsx_rows(sheet_name):
+            return workbook[sheet_name].iter_rows(values_only=True)
+        
+        return workbook.sheetnames, xlsx_rows, workbook.close
+    
+    def iter_excel_segments(self, excel_path):
+        """
+        Segmentos de un libro de Excel: encabezado y, por cada hoja, su
+        encabezado, lotes de filas y total de filas
+        
+        Cada hoja se recorre una sola vez, hasta TABULAR_MAX_ROWS filas.
+        """
+        sheet_names, sheet_rows, close = self._open_workbook(excel_path)
+        try:
+            header = f"Archivo Excel: {file_name(excel_path)}\n"
+            header += f"Hojas: {len(sheet_names)}\n\n"
+            yield _segment(header, 'header')
             
-            text = text.encode('utf-8', errors='ignore').decode('utf-8')
-            return text
-        except Exception as e:
-            return f"Error al procesar CSV: {str(e)}"
+            for index, sheet_name in enumerate(sheet_names):
+                rows = iter(sheet_rows(sheet_name))
+                columns = format_row(next(rows, ()))
+                
+                text = f"=== Hoja: {sheet_name} ===\n"
+                text += f"Columnas: {columns}\n\n"
+                yield _segment(text, 'sheet', sheet=sheet_name, index=index)
+                
+                total_rows, truncated = yield from iter_table_segments(rows, sheet=sheet_name)
+                yield _segment(f"{rows_summary(total_rows, truncated)}\n\n", 'summary',
+                               sheet=sheet_name, rows=total_rows, truncated=truncated)
+        finally:
+            close()
     
+    @cached_extraction('excel')
     def extract_text_from_excel(self, excel_path):
         """Extrae texto de archivos Excel"""
         try:
-            excel_file = pd.ExcelFile(excel_path)
-            text = f"Archivo Excel: {os.path.basename(excel_path)}\n"
-            text += f"Hojas: {len(excel_file.sheet_names)}\n\n"
-            
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(excel_path, sheet_name=sheet_name)
-                text += f"=== Hoja: {sheet_name} ===\n"
-                text += f"Filas: {len(df)}, Columnas: {len(df.columns)}\n"
-                text += "Columnas: " + ", ".join(df.columns.tolist()) + "\n\n"
-                text += df.to_string(index=False) + "\n\n"
-            
-            text = text.encode('utf-8', errors='ignore').decode('utf-8')
-            return text
+            return "".join(segment['text'] for segment in self.iter_excel_segments(excel_path))
         except Exception as e:
             return f"Error al procesar Excel: {str(e)}"
     
+    @cached_extraction('json')
     def extract_text_from_json(self, json_path):
         """Extrae texto de archivos JSON"""
         try:
-            with open(json_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
+            # json.loads detecta UTF-8 (con o sin BOM), UTF-16 y UTF-32
+            with open_binary(json_path) as file:
+                data = json.loads(file.read())
             
-            text = f"Archivo JSON: {os.path.basename(json_path)}\n\n"
+            text = f"Archivo JSON: {file_name(json_path)}\n\n"
             text += json.dumps(data, indent=2, ensure_ascii=False)
             
             text = text.encode('utf-8', errors='ignore').decode('utf-8')
@@ -228,13 +1473,14 @@ class DocumentConverter:
         except Exception as e:
             return f"Error al procesar JSON: {str(e)}"
     
+    @cached_extraction('xml')
     def extract_text_from_xml(self, xml_path):
         """Extrae texto de archivos XML"""
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
+            with open_binary(xml_path) as file:
+                root = ET.parse(file).getroot()
             
-            text = f"Archivo XML: {os.path.basename(xml_path)}\n"
+            text = f"Archivo XML: {file_name(xml_path)}\n"
             text += f"Elemento raíz: {root.tag}\n\n"
             
             def extract_text_recursive(element, level=0):
@@ -261,35 +1507,149 @@ class DocumentConverter:
     def extract_text_from_text(self, text_path):
         """Lee archivos de texto plano"""
         try:
-            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-            text = None
-            
-            for encoding in encodings:
-                try:
-                    with open(text_path, 'r', encoding=encoding) as file:
-                        text = file.read()
-                        break
-                except UnicodeDecodeError:
-                    continue
-            
-            if text is None:
-                with open(text_path, 'r', encoding='utf-8', errors='ignore') as file:
+            encoding = detect_text_encoding(text_path)
+            if isinstance(text_path, InMemoryFile):
+                text = str(text_path.data, encoding)
+            else:
+                with open(text_path, 'r', encoding=encoding) as file:
                     text = file.read()
             
             text = text.encode('utf-8', errors='ignore').decode('utf-8')
             return text
         except Exception as e:
             return f"Error al procesar archivo de texto: {str(e)}"
+    
+    def iter_pdf_segments(self, pdf_path):
+        """Segmentos de un PDF: una página por segmento, en orden"""
+        for result in iter_pdf_pages(pdf_path):
+            text = _format_pdf_page(result)
+            if text:
+                yield _segment(
+                    text, 'page',
+                    page=result['page'], ocr=result['ocr'], seconds=result['seconds']
+                )
+    
+    def extract_text(self, file_path, file_type=None):
+        """Extrae el texto completo de un archivo según su tipo"""
+        file_type = file_type or self.detect_file_type(file_path)
+        extractors = {
+            'image': self.extract_text_from_image,
+            'pdf': self.extract_text_from_pdf,
+            'word': self.extract_text_from_word,
+            'text': self.extract_text_from_text,
+            'csv': self.extract_text_from_csv,
+            'excel': self.extract_text_from_excel,
+            'json': self.extract_text_from_json,
+            'xml': self.extract_text_from_xml
+        }
+        if file_type not in extractors:
+            raise ValueError(f"Tipo de archivo no implementado: {file_type}")
+        return extractors[file_type](file_path)
+    
+    def extract_from_bytes(self, data, filename=None):
+        """
+        Extrae el texto completo de un archivo en memoria (bytes o memoryview)
+        
+        Mismo resultado que extract_text sobre el archivo en disco, sin
+        escribirlo: cada extractor lee del buffer (ver InMemoryFile).
+        """
+        return self.extract_text(InMemoryFile(data, filename or "documento"))
+    
+    def iter_text_segments(self, file_path):
+        """
+        Extrae el texto como una secuencia de segmentos con su posición
+        
+        PDF por página, Word por bloque o tabla, CSV por lote de filas y Excel
+        por hoja; el resto de tipos en un único segmento. Quien consume puede
+        procesar o subir cada segmento sin tener el documento completo en
+        memoria. Los errores se propagan como excepciones.
+        
+        Yields:
+            Dicts con text, kind y position (ver _segment)
+        """
+        file_type = self.detect_file_type(file_path)
+        iterators = {
+            'pdf': self.iter_pdf_segments,
+            'word': self.iter_word_segments,
+            'csv': self.iter_csv_segments,
+            'excel': self.iter_excel_segments
+        }
+        
+        if file_type not in iterators:
+            yield _segment(self.extract_text(file_path, file_type), 'document')
+            return
+        
+        if not extraction_cache.enabled:
+            yield from iterators[file_type](file_path)
+            return
+        
+        sha256 = ExtractionCache.file_sha256(file_path)
+        kind = f"{file_type}-segments"
+        
+        cached = extraction_cache.get(sha256, kind)
+        if cached is not None:
+            logger.info(f"Extracción desde cache ({file_type}): {file_name(file_path)}")
+            yield _segment(cached, 'document', cached=True)
+            return
+        
+        yield from extraction_cache.tee_segments(sha256, kind, iterators[file_type](file_path))
+
+# ===============================
+# FORMATO DEL TEXTO CONVERTIDO
+# ===============================
+
+CONVERTED_HEADER = "=== DOCUMENTO CONVERTIDO ==="
+CONVERTED_SEPARATOR = "=" * 50
+
+def converted_header(source, file_type):
+    """
+    Encabezado estándar de documento convertido
+    """
+    return (
+        f"{CONVERTED_HEADER}\n"
+        f"Archivo original: {source}\n"
+        f"Tipo de archivo: {file_type}\n"
+        f"Fecha de conversión: {datetime.now()}\n"
+        f"{CONVERTED_SEPARATOR}\n\n"
+    )
+
+def format_converted_text(text, source, file_type):
+    """
+    Agrega el encabezado estándar de documento convertido al texto extraído
+    """
+    return converted_header(source, file_type) + text
+
+def strip_converted_header(content):
+    """
+    Quita el encabezado de documento convertido y retorna solo el texto
+    """
+    content = content.lstrip('\ufeff')
+    if not content.startswith(CONVERTED_HEADER):
+        return content
+    
+    separator = f"\n{CONVERTED_SEPARATOR}\n\n"
+    position = content.find(separator)
+    if position == -1:
+        return content
+    
+    return content[position + len(separator):]
 
 # ===============================
 # FUNCIONES PRINCIPALES
 # ===============================
 
+# El conversor no guarda estado por archivo: una instancia sirve a todo el proceso
+_converter = DocumentConverter()
+
+def get_converter():
+    """Conversor compartido del módulo"""
+    return _converter
+
 async def process_file_to_txt_async(file_path, output_path=None):
     """
     Versión asíncrona para archivos grandes
     """
-    converter = DocumentConverter()
+    converter = get_converter()
     
     response = {
         'success': False,
@@ -316,7 +1676,7 @@ async def process_file_to_txt_async(file_path, output_path=None):
         
         if output_path is None:
             base_name = Path(file_path).stem
-            timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_path = f"{base_name}_converted_{timestamp}.txt"
         
         # Procesar según tipo y tamaño
@@ -325,13 +1685,19 @@ async def process_file_to_txt_async(file_path, output_path=None):
         
         # Procesamiento asíncrono para PDFs grandes
         if file_type == 'pdf' and is_large:
-            extracted_text = await converter.extract_text_from_pdf_async(file_path)
+            pdf_result = await asyncio.get_running_loop().run_in_executor(
+                converter.thread_executor, converter.extract_pdf_pages, file_path
+            )
+            extracted_text = pdf_result['text']
+            response['page_timings'] = pdf_result['pages']
         else:
             # Procesamiento síncrono para el resto
             if file_type == 'image':
                 extracted_text = converter.extract_text_from_image(file_path)
             elif file_type == 'pdf':
-                extracted_text = converter.extract_text_from_pdf(file_path)
+                pdf_result = converter.extract_pdf_pages(file_path)
+                extracted_text = pdf_result['text']
+                response['page_timings'] = pdf_result['pages']
             elif file_type == 'word':
                 extracted_text = converter.extract_text_from_word(file_path)
             elif file_type == 'text':
@@ -353,12 +1719,7 @@ async def process_file_to_txt_async(file_path, output_path=None):
         
         # Generar archivo .txt
         with open(output_path, 'w', encoding='utf-8-sig', errors='replace') as f:
-            f.write(f"=== DOCUMENTO CONVERTIDO ===\n")
-            f.write(f"Archivo original: {file_path}\n")
-            f.write(f"Tipo de archivo: {file_type}\n")
-            f.write(f"Fecha de conversión: {pd.Timestamp.now()}\n")
-            f.write("="*50 + "\n\n")
-            f.write(extracted_text)
+            f.write(format_converted_text(extracted_text, file_path, file_type))
         
         if os.path.exists(output_path):
             response['success'] = True
@@ -378,20 +1739,14 @@ def process_file_to_txt(file_path, output_path=None):
     """
     Versión síncrona mejorada (compatible con el código existente)
     """
-    converter = DocumentConverter()
+    converter = get_converter()
     
-    # Si el archivo es grande, usar versión asíncrona
+    # Los archivos grandes se procesan igual que los pequeños: quien llama ya
+    # está en un hilo de trabajo, y crear un event loop por llamada falla si
+    # el hilo ya tiene uno corriendo
     if converter.is_large_file(file_path):
-        logger.info(f"Archivo grande detectado, usando procesamiento optimizado")
-        # Ejecutar versión asíncrona en un loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(process_file_to_txt_async(file_path, output_path))
-        finally:
-            loop.close()
+        logger.info(f"Archivo grande detectado: {file_path}")
     
-    # Para archivos pequeños, usar procesamiento normal
     response = {
         'success': False,
         'output_file': None,
@@ -414,7 +1769,7 @@ def process_file_to_txt(file_path, output_path=None):
         
         if output_path is None:
             base_name = Path(file_path).stem
-            timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_path = f"{base_name}_converted_{timestamp}.txt"
         
         # Procesar archivo según su tipo
@@ -423,7 +1778,9 @@ def process_file_to_txt(file_path, output_path=None):
         if file_type == 'image':
             extracted_text = converter.extract_text_from_image(file_path)
         elif file_type == 'pdf':
-            extracted_text = converter.extract_text_from_pdf(file_path)
+            pdf_result = converter.extract_pdf_pages(file_path)
+            extracted_text = pdf_result['text']
+            response['page_timings'] = pdf_result['pages']
         elif file_type == 'word':
             extracted_text = converter.extract_text_from_word(file_path)
         elif file_type == 'text':
@@ -445,12 +1802,7 @@ def process_file_to_txt(file_path, output_path=None):
         
         # Generar archivo .txt
         with open(output_path, 'w', encoding='utf-8-sig', errors='replace') as f:
-            f.write(f"=== DOCUMENTO CONVERTIDO ===\n")
-            f.write(f"Archivo original: {file_path}\n")
-            f.write(f"Tipo de archivo: {file_type}\n")
-            f.write(f"Fecha de conversión: {pd.Timestamp.now()}\n")
-            f.write("="*50 + "\n\n")
-            f.write(extracted_text)
+            f.write(format_converted_text(extracted_text, file_path, file_type))
         
         if os.path.exists(output_path):
             response['success'] = True
@@ -466,8 +1818,10 @@ def process_file_to_txt(file_path, output_path=None):
 def get_text_only(file_path):
     """
     Función que solo retorna el texto extraído (sin generar archivo)
+    
+    file_path puede ser una ruta o un InMemoryFile (ver extract_from_bytes)
     """
-    converter = DocumentConverter()
+    converter = get_converter()
     
     response = {
         'success': False,
@@ -477,7 +1831,7 @@ def get_text_only(file_path):
     }
     
     try:
-        if not os.path.exists(file_path):
+        if not file_exists(file_path):
             response['error'] = f"El archivo '{file_path}' no existe"
             return response
         
@@ -485,14 +1839,16 @@ def get_text_only(file_path):
         response['file_type'] = file_type
         
         if file_type == 'unknown':
-            response['error'] = f"Tipo de archivo no soportado: {Path(file_path).suffix}"
+            response['error'] = f"Tipo de archivo no soportado: {Path(file_name(file_path)).suffix}"
             return response
         
         # Extraer solo el texto
         if file_type == 'image':
             text = converter.extract_text_from_image(file_path)
         elif file_type == 'pdf':
-            text = converter.extract_text_from_pdf(file_path)
+            pdf_result = converter.extract_pdf_pages(file_path)
+            text = pdf_result['text']
+            response['page_timings'] = pdf_result['pages']
         elif file_type == 'word':
             text = converter.extract_text_from_word(file_path)
         elif file_type == 'text':
@@ -517,17 +1873,90 @@ def get_text_only(file_path):
     
     return response
 
-def check_supported_file(file_path):
+def extract_from_bytes(data, filename=None):
     """
-    Verifica si un archivo es soportado sin procesarlo
+    Extrae el texto de un archivo recibido en memoria (bytes, bytearray o
+    memoryview), sin escribirlo a disco
+    
+    El tipo se detecta por el contenido; filename solo aporta la extensión
+    (para distinguir CSV de texto, o .doc de .xls) y el nombre en los
+    encabezados.
+    
+    Returns:
+        Dict con el mismo formato que get_text_only
+    """
+    return get_text_only(InMemoryFile(data, filename or "documento"))
+
+def iter_text_segments(file_path):
+    """
+    Extrae el texto de un archivo como segmentos (ver DocumentConverter.iter_text_segments)
+    """
+    return get_converter().iter_text_segments(file_path)
+
+def stream_converted_text(file_path, source=None):
     """
-    converter = DocumentConverter()
+    Prepara el documento convertido (encabezado + texto) como un flujo de bytes
     
-    extension = Path(file_path).suffix.lower()
-    file_type = converter.detect_file_type(file_path)
+    Equivale al .txt de process_file_to_txt sin escribirlo a disco: el texto se
+    extrae a medida que se consumen los bloques. El primer segmento con texto
+    se extrae antes de retornar, para informar errores o documentos vacíos
+    antes de empezar a subir nada.
+    
+    file_path puede ser una ruta o un InMemoryFile.
+    
+    Returns:
+        Dict con success, file_type, error y chunks (iterador de bytes en
+        UTF-8 con BOM)
+    """
+    response = {
+        'success': False,
+        'file_type': None,
+        'error': None,
+        'chunks': None
+    }
+    
+    if not file_exists(file_path):
+        response['error'] = f"El archivo '{file_path}' no existe"
+        return response
+    
+    file_type = detect_file_type(file_path)
+    response['file_type'] = file_type
+    
+    if file_type == 'unknown':
+        response['error'] = f"Tipo de archivo no soportado: {Path(file_name(file_path)).suffix}"
+        return response
+    
+    segments = iter_text_segments(file_path)
+    try:
+        first = next((segment for segment in segments if segment['text'].strip()), None)
+    except Exception as e:
+        response['error'] = f"Error durante extracción: {str(e)}"
+        return response
+    
+    if first is None or first['text'].startswith(EXTRACTION_ERROR_PREFIXES):
+        segments.close()
+        response['error'] = f"No se pudo extraer texto del archivo {file_type}"
+        return response
+    
+    def chunks():
+        yield ('\ufeff' + converted_header(source or file_name(file_path), file_type)).encode('utf-8')
+        yield first['text'].encode('utf-8', errors='replace')
+        for segment in segments:
+            yield segment['text'].encode('utf-8', errors='replace')
+    
+    response['success'] = True
+    response['chunks'] = chunks()
+    return response
+
+def check_supported_file(file_path):
+    """
+    Verifica si un archivo es soportado sin procesarlo (por sus primeros
+    bytes y su extensión)
+    """
+    file_type = detect_file_type(file_path)
     
     return {
         'supported': file_type != 'unknown',
         'file_type': file_type,
-        'extension': extension
-    }
\ No newline at end of file
+        'extension': Path(file_name(file_path)).suffix.lower()
+    }
@@ -0,0 +1,116 @@
+"""
+Benchmark: verificación de ID tokens de Firebase
+
+Compara, sin red, la verificación local completa de un token (firma RS256
+y claims) con la búsqueda en el cache de tokens ya verificados. Usa una
+llave RSA y un certificado autofirmado generados al vuelo, como se haría
+con FIREBASE_CERTS_FILE en desarrollo.
+
+Uso:
+    python benchmarks/bench_auth.py --tokens 200 --repeat 20
+"""
+
+import argparse
+import datetime
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from firebase_auth import VerificadorTokensFirebase, emitir_token_local
+
+PROJECT_ID = "profego-bench"
+KID = "bench-kid"
+
+
+def generar_llave_y_certificado():
+    """Llave privada PEM y certificado autofirmado PEM"""
+    llave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    nombre = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.local")])
+    ahora = datetime.datetime.now(datetime.timezone.utc)
+    certificado = (
+        x509.CertificateBuilder()
+        .subject_name(nombre)
+        .issuer_name(nombre)
+        .public_key(llave.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(ahora - datetime.timedelta(days=1))
+        .not_valid_after(ahora + datetime.timedelta(days=1))
+        .sign(llave, hashes.SHA256())
+    )
+    
+    llave_pem = llave.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode("ascii")
+    certificado_pem = certificado.public_bytes(serialization.Encoding.PEM).decode("ascii")
+    return llave_pem, certificado_pem
+
+
+def medir(funcion, tokens):
+    """Segundos por token (promedio) de aplicar funcion a todos los tokens"""
+    inicio = time.perf_counter()
+    for token in tokens:
+        funcion(token)
+    return (time.perf_counter() - inicio) / len(tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de verificación de tokens de Firebase")
+    parser.add_argument("--tokens", type=int, default=200, help="Tokens distintos")
+    parser.add_argument("--repeat", type=int, default=20, help="Verificaciones en cache por token")
+    args = parser.parse_args()
+    
+    llave_pem, certificado_pem = generar_llave_y_certificado()
+    tokens = [
+        emitir_token_local(llave_pem, KID, PROJECT_ID, f"usuario{i}@profego.test")
+        for i in range(args.tokens)
+    ]
+    
+    print("=" * 60)
+    print(f"🔐 Verificación de {args.tokens} tokens")
+    print("=" * 60)
+    
+    # Cache de tokens deshabilitado: cada petición verifica la firma
+    sin_cache = VerificadorTokensFirebase(
+        PROJECT_ID, ttl_cache_segundos=0,
+        obtener_certificados=lambda: ({KID: certificado_pem}, 3600)
+    )
+    por_token_firma = medir(sin_cache.verificar, tokens)
+    
+    verificador = VerificadorTokensFirebase(
+        PROJECT_ID, obtener_certificados=lambda: ({KID: certificado_pem}, 3600)
+    )
+    primera = medir(verificador.verificar, tokens)
+    
+    en_cache = []
+    for _ in range(args.repeat):
+        en_cache.append(medir(verificador.verificar_en_cache, tokens))
+    por_token_cache = statistics.median(en_cache)
+    
+    # Un token de otro proyecto debe rechazarse
+    ajeno = emitir_token_local(llave_pem, KID, "otro-proyecto", "intruso@profego.test")
+    try:
+        verificador.verificar(ajeno)
+        print("✗ Se aceptó un token de otro proyecto")
+        sys.exit(1)
+    except ValueError:
+        pass
+    
+    print(f"  Firma RS256 + claims:   {por_token_firma * 1e6:10.1f} µs/token")
+    print(f"  Primera verificación:   {primera * 1e6:10.1f} µs/token")
+    print(f"  Token en cache:         {por_token_cache * 1e6:10.1f} µs/token")
+    print(f"  Aceleración del cache:  {por_token_firma / por_token_cache:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
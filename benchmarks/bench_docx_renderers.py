@@ -0,0 +1,142 @@
+"""
+Benchmark: renderers del documento Word de un plan
+
+Genera un plan sintético con muchos módulos y actividades y mide el tiempo
+de producir el .docx con python-docx y con la plantilla (WordprocessingML
+directo). Verifica además que ambos documentos tengan los mismos párrafos.
+
+Uso:
+    python benchmarks/bench_docx_renderers.py --modules 20 --activities 8 --repeat 5
+"""
+
+import argparse
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from docx import Document
+
+import docx_renderer
+
+
+def generar_plan(modulos, actividades):
+    """Plan con la estructura que produce Gemini"""
+    return {
+        "plan_id": "plan_benchmark_0",
+        "nombre_plan": "Plan de benchmark",
+        "grado": "2° de preescolar",
+        "edad_aprox": "4-5 años",
+        "duracion_total": f"{modulos} semanas",
+        "fecha_generacion": "2026-01-01T09:00:00",
+        "campo_formativo_principal": "Lenguajes",
+        "ejes_articuladores_generales": ["Inclusión", "Pensamiento crítico", "Vida saludable"],
+        "modulos": [
+            {
+                "numero": numero,
+                "nombre": f"Exploramos el mundo {numero}",
+                "campo_formativo": "Saberes y pensamiento científico",
+                "ejes_articuladores": ["Inclusión", "Interculturalidad crítica"],
+                "aprendizaje_esperado": "Observa, describe y compara elementos de su entorno. " * 3,
+                "tiempo_estimado": "1 semana",
+                "actividad_inicio": {
+                    "nombre": "Asamblea de bienvenida",
+                    "descripcion": "Los niños comparten lo que saben del tema. " * 5,
+                    "duracion": "20 minutos",
+                    "materiales": ["cartulina", "plumones"],
+                    "organizacion": "Grupal"
+                },
+                "actividades_desarrollo": [
+                    {
+                        "nombre": f"Actividad {indice} del módulo {numero}",
+                        "tipo": "Juego simbólico",
+                        "basada_en_actividad_biblioteca": "SI" if indice % 2 else "NO",
+                        "fuente_actividad": "actividad_biblioteca.txt",
+                        "descripcion": "Paso a paso de la actividad con indicaciones para el grupo. " * 8,
+                        "duracion": "30 minutos",
+                        "organizacion": "Equipos de 4",
+                        "materiales": ["crayones", "hojas", "pegamento"],
+                        "aspectos_a_observar": "Participación y uso del lenguaje"
+                    }
+                    for indice in range(1, actividades + 1)
+                ],
+                "actividad_cierre": {
+                    "nombre": "Reflexión",
+                    "descripcion": "Se recuperan los aprendizajes del día.",
+                    "duracion": "15 minutos",
+                    "preguntas_guia": ["¿Qué aprendimos?", "¿Qué fue lo más divertido?"]
+                },
+                "consejos_maestra": "Favorecer la participación de todos.",
+                "variaciones": "Trabajar al aire libre.",
+                "vinculo_familia": "Platicar en casa sobre la actividad.",
+                "evaluacion": "Registro anecdótico."
+            }
+            for numero in range(1, modulos + 1)
+        ],
+        "recursos_educativos": {
+            "materiales_generales": ["Papel", "Pinturas", "Bloques"],
+            "cuentos_recomendados": [{"titulo": "El cuento", "autor": "Autor", "descripcion_breve": "Breve"}],
+            "canciones_recomendadas": [{"titulo": "La canción", "acceso": "YouTube", "uso_sugerido": "Inicio"}],
+            "actividades_complementarias": [
+                {"titulo": "Complementaria", "ambito": "Aula", "materiales_necesarios": ["a", "b"]}
+            ]
+        },
+        "recomendaciones_ambiente": "Ambiente alfabetizador.",
+        "vinculacion_curricular": {"aprendizajes_clave": ["Lenguaje oral", "Exploración"]}
+    }
+
+
+def medir(renderer, plan, repeticiones):
+    """Mediana de segundos por documento y el último documento generado"""
+    tiempos = []
+    docx_bytes = b""
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        docx_bytes = docx_renderer.generar_documento_word(plan, renderer)
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos), docx_bytes
+
+
+def parrafos(docx_bytes):
+    """(estilo, texto) de cada párrafo del documento"""
+    return [(p.style.name, p.text) for p in Document(io.BytesIO(docx_bytes)).paragraphs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de renderers de Word")
+    parser.add_argument("--modules", type=int, default=20, help="Módulos del plan")
+    parser.add_argument("--activities", type=int, default=8, help="Actividades de desarrollo por módulo")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones (se reporta la mediana)")
+    args = parser.parse_args()
+    
+    plan = generar_plan(args.modules, args.activities)
+    
+    # La plantilla se prepara una vez por proceso; no se cuenta
+    docx_renderer.cargar_plantilla()
+    
+    print("=" * 60)
+    print(f"📄 Word de {args.modules} módulos x {args.activities} actividades")
+    print("=" * 60)
+    
+    resultados = {}
+    for renderer in docx_renderer.RENDERERS:
+        segundos, docx_bytes = medir(renderer, plan, args.repeat)
+        resultados[renderer] = (segundos, docx_bytes)
+        print(f"  {renderer:12s} {segundos * 1000:9.1f} ms  {len(docx_bytes) / 1024:8.1f} KB")
+    
+    base, _ = resultados["python-docx"]
+    plantilla, _ = resultados["plantilla"]
+    print(f"\n  Aceleración de la plantilla: {base / plantilla:.1f}x")
+    
+    iguales = parrafos(resultados["python-docx"][1]) == parrafos(resultados["plantilla"][1])
+    print(f"  {'✓' if iguales else '✗'} Mismos párrafos y estilos en ambos documentos")
+    if not iguales:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark: tiempo de importación de los módulos de la API (arranque en frío)
+
+Importa cada módulo en un intérprete nuevo con `python -X importtime` y
+resume la salida: tiempo acumulado del módulo y los paquetes que más
+aportan. Con --max-seconds falla (código de salida 1) si algún módulo lo
+supera, para vigilar el tiempo hasta la primera petición.
+
+Uso:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py PruebaOcr --top 20 --max-seconds 0.5
+    python benchmarks/bench_import_time.py main --repeat 5
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).parent.parent
+
+# import time: self [us] | cumulative | imported package
+LINEA_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$")
+
+
+def medir_importacion(modulo):
+    """
+    Importa el módulo en un proceso nuevo con -X importtime
+    
+    Returns:
+        Lista de (paquete, self_us, acumulado_us, profundidad), o None si
+        la importación falla
+    """
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, capture_output=True, text=True
+    )
+    
+    if proceso.returncode != 0:
+        print(f"✗ No se pudo importar {modulo}:")
+        print("\n".join(proceso.stderr.strip().splitlines()[-5:]))
+        return None
+    
+    registros = []
+    for linea in proceso.stderr.splitlines():
+        coincidencia = LINEA_IMPORTTIME.match(linea)
+        if coincidencia:
+            propio, acumulado, sangria, paquete = coincidencia.groups()
+            # Un espacio por nivel de anidamiento, más dos por cada nivel bajo el primero
+            registros.append((paquete, int(propio), int(acumulado), (len(sangria) - 1) // 2))
+    return registros
+
+
+def importaciones_del_modulo(modulo, registros):
+    """
+    Registros de la importación de primer nivel del módulo
+    
+    -X importtime escribe cada paquete después de los que importa, así que
+    los del módulo son los que preceden a su línea hasta la anterior de
+    primer nivel (las de site, .pth, etc. quedan fuera).
+    
+    Returns:
+        (registro del módulo o None, registros de sus importaciones)
+    """
+    for indice, registro in enumerate(registros):
+        if registro[0] == modulo and registro[3] == 0:
+            inicio = indice
+            while inicio > 0 and registros[inicio - 1][3] > 0:
+                inicio -= 1
+            return registro, registros[inicio:indice]
+    return None, []
+
+
+def tiempo_modulo(modulo, registros):
+    """Tiempo acumulado (segundos) de la importación de primer nivel del módulo"""
+    registro, _ = importaciones_del_modulo(modulo, registros)
+    return registro[2] / 1e6 if registro else 0.0
+
+
+def resumir(modulo, registros, top):
+    """Muestra el tiempo del módulo y los paquetes más costosos"""
+    segundos = tiempo_modulo(modulo, registros)
+    _, importaciones = importaciones_del_modulo(modulo, registros)
+    print(f"\n{modulo}: {segundos:.3f}s acumulado")
+    
+    # Dependencias directas del módulo (primer nivel bajo él) por tiempo acumulado
+    directas = sorted(
+        (registro for registro in importaciones if registro[3] == 1),
+        key=lambda registro: registro[2], reverse=True
+    )
+    print("  Dependencias directas más lentas:")
+    for paquete, _, acumulado, _ in directas[:top]:
+        print(f"    {acumulado / 1000:9.1f} ms  {paquete}")
+    
+    # Paquetes individuales por tiempo propio (sin contar sus importaciones)
+    propios = sorted(importaciones, key=lambda registro: registro[1], reverse=True)
+    print("  Mayor tiempo propio:")
+    for paquete, propio, _, _ in propios[:top]:
+        print(f"    {propio / 1000:9.1f} ms  {paquete}")
+    
+    return segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["PruebaOcr", "main"], help="Módulos a importar")
+    parser.add_argument("--top", type=int, default=10, help="Paquetes a mostrar por sección")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones (se reporta la mediana)")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Falla si el tiempo acumulado de algún módulo lo supera")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print(f"📊 Tiempo de importación ({sys.executable})")
+    print("=" * 60)
+    
+    resultados = {}
+    for modulo in args.modules:
+        tiempos = []
+        registros = None
+        for _ in range(args.repeat):
+            registros = medir_importacion(modulo)
+            if registros is None:
+                break
+            tiempos.append(tiempo_modulo(modulo, registros))
+        
+        if registros is None:
+            resultados[modulo] = None
+            continue
+        
+        # El detalle es el de la última ejecución; el total, la mediana
+        resumir(modulo, registros, args.top)
+        resultados[modulo] = (statistics.median(tiempos), len(tiempos))
+    
+    print("\n" + "=" * 60)
+    fallo = False
+    for modulo, resultado in resultados.items():
+        if resultado is None:
+            print(f"✗ {modulo}: error al importar")
+            fallo = True
+            continue
+        
+        segundos, ejecuciones = resultado
+        excedido = args.max_seconds is not None and segundos > args.max_seconds
+        fallo = fallo or excedido
+        marca = "✗" if excedido else "✓"
+        print(f"{marca} {modulo}: mediana {segundos:.3f}s en {ejecuciones} ejecuciones")
+    
+    if fallo:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
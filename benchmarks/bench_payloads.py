@@ -0,0 +1,147 @@
+"""
+Benchmark: tamaño y latencia de las respuestas JSON grandes
+
+Para el detalle de un plan y la respuesta de rag-analysis mide:
+- serialización con json (JSONResponse) frente a orjson (ORJSONResponse)
+- tamaño sin comprimir, con gzip y con brotli, y el tiempo de comprimir
+- tiempo estimado de transferencia con el ancho de banda indicado
+
+rag-analysis se compara además con el formato anterior, que repetía el
+contenido completo de cada recurso en el análisis y en markdown_formato.
+
+Uso:
+    python benchmarks/bench_payloads.py
+    python benchmarks/bench_payloads.py --plan plan_abc_123.json --mbps 5
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import orjson
+
+import compresion
+from bench_docx_renderers import generar_plan
+
+RAG_DATA_DIR = Path(__file__).parent.parent / "rag_data"
+
+
+def medir(funcion, repeticiones):
+    """Mediana en segundos y último resultado"""
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos), resultado
+
+
+def serializar_json(contenido):
+    # Igual que starlette.responses.JSONResponse.render
+    return json.dumps(contenido, ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def textos_biblioteca(cantidad):
+    """Textos reales de rag_data si existen; si no, textos sintéticos"""
+    textos = [ruta.read_text(encoding="utf-8", errors="ignore")
+              for ruta in sorted(RAG_DATA_DIR.glob("**/*.txt"))[:cantidad]]
+    while len(textos) < cantidad:
+        textos.append("Había una vez un grupo de niños que exploraba el jardín. " * 120)
+    return textos
+
+
+def analisis_rag(textos, formato_anterior):
+    """Respuesta de rag-analysis con un recurso por texto"""
+    recursos = []
+    for indice, texto in enumerate(textos):
+        recurso = {
+            "titulo": f"Recurso {indice}",
+            "tipo": "cuento",
+            "fuente": "RECURSO REAL",
+            "similitud_porcentaje": 70.0,
+            "similitud_nivel": "ALTA",
+            "contenido_completo": texto,
+            "fragmento": texto[:300] + "...",
+            "filename": f"recurso_{indice}.txt",
+            "acceso": "GRATUITO"
+        }
+        recursos.append(recurso)
+    
+    if formato_anterior:
+        resumen = [{**recurso, "markdown_formato": f"---\n{recurso['contenido_completo'][:500]}...\n---\n"}
+                   for recurso in recursos]
+        completos = [{**recurso, "markdown_formato": f"---\n{recurso['contenido_completo']}\n---\n"}
+                     for recurso in recursos]
+    else:
+        resumen = [{clave: valor for clave, valor in recurso.items() if clave != "contenido_completo"}
+                   for recurso in recursos]
+        completos = recursos
+    
+    return {
+        "success": True,
+        "plan_id": "plan_benchmark_0",
+        "analisis": {"recursos_altamente_relevantes": resumen, "metricas_rag": {}},
+        "recursos_completos": completos
+    }
+
+
+def reportar(nombre, contenido, repeticiones, mbps):
+    print(f"\n{nombre}")
+    
+    t_json, cuerpo = medir(lambda: serializar_json(contenido), repeticiones)
+    t_orjson, _ = medir(lambda: orjson.dumps(contenido), repeticiones)
+    print(f"  Serialización: json {t_json * 1000:7.2f} ms | orjson {t_orjson * 1000:7.2f} ms "
+          f"({t_json / t_orjson:.1f}x)")
+    
+    codificaciones = ["gzip"] + (["br"] if compresion.load_brotli() else [])
+    bytes_por_segundo = mbps * 1e6 / 8
+    print(f"  {'identity':8s} {len(cuerpo) / 1024:9.1f} KB  "
+          f"transferencia {len(cuerpo) / bytes_por_segundo * 1000:8.1f} ms")
+    
+    for codificacion in codificaciones:
+        t_comp, comprimido = medir(lambda: compresion.comprimir(cuerpo, codificacion), repeticiones)
+        print(f"  {codificacion:8s} {len(comprimido) / 1024:9.1f} KB  "
+              f"transferencia {len(comprimido) / bytes_por_segundo * 1000:8.1f} ms  "
+              f"compresión {t_comp * 1000:6.2f} ms  ({len(cuerpo) / len(comprimido):.1f}x)")
+    
+    if "br" not in codificaciones:
+        print("  (brotli no instalado: solo gzip)")
+    
+    return len(cuerpo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de payloads JSON")
+    parser.add_argument("--plan", action="append", default=[], help="JSON de un plan real (repetible)")
+    parser.add_argument("--resources", type=int, default=8, help="Recursos en rag-analysis")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones (se reporta la mediana)")
+    parser.add_argument("--mbps", type=float, default=10.0, help="Ancho de banda para estimar la transferencia")
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print(f"📦 Payloads JSON (ancho de banda {args.mbps:g} Mbps)")
+    print("=" * 60)
+    
+    planes = [(ruta, json.loads(Path(ruta).read_text(encoding="utf-8"))) for ruta in args.plan]
+    if not planes:
+        planes = [("plan sintético 20x8", generar_plan(20, 8))]
+    
+    for nombre, plan in planes:
+        reportar(f"Detalle del plan: {nombre}", {"success": True, "plan": plan}, args.repeat, args.mbps)
+    
+    textos = textos_biblioteca(args.resources)
+    anterior = reportar("rag-analysis (formato anterior)", analisis_rag(textos, True), args.repeat, args.mbps)
+    actual = reportar("rag-analysis (contenido una sola vez)", analisis_rag(textos, False), args.repeat, args.mbps)
+    print(f"\n  rag-analysis sin comprimir: {anterior / 1024:.1f} KB -> {actual / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: motor Tesseract persistente (tesserocr en el pool de procesos)
+frente a una llamada a pytesseract (un proceso nuevo) por imagen
+
+Genera imágenes sintéticas pequeñas (como bandas de texto o páginas
+escaneadas recortadas) y mide el tiempo total de reconocerlas con cada motor.
+
+Uso:
+    python benchmarks/bench_tesseract_pool.py --images 200 --lines 3
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import cv2
+import numpy as np
+
+import PruebaOcr
+
+
+def generar_imagenes(cantidad, lineas):
+    """Imágenes en escala de grises con texto negro sobre blanco"""
+    imagenes = []
+    for i in range(cantidad):
+        imagen = np.full((40 + lineas * 40, 900), 255, np.uint8)
+        for linea in range(lineas):
+            cv2.putText(
+                imagen, f"Actividad {i} linea {linea}: leer y escribir cuentos",
+                (20, 40 + linea * 40), cv2.FONT_HERSHEY_SIMPLEX, 0.9, 0, 2
+            )
+        imagenes.append(imagen)
+    return imagenes
+
+
+def medir(nombre, funcion, imagenes, repeticiones):
+    """Ejecuta funcion(imagenes) varias veces y muestra el resultado"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        textos = funcion(imagenes)
+        tiempos.append(time.perf_counter() - inicio)
+    
+    mediana = statistics.median(tiempos)
+    print(f"{nombre:<34} {mediana:8.3f}s total  {mediana / len(imagenes) * 1000:8.2f} ms/imagen")
+    return textos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=100, help="Número de imágenes")
+    parser.add_argument("--lines", type=int, default=3, help="Líneas de texto por imagen")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones (se reporta la mediana)")
+    args = parser.parse_args()
+    
+    imagenes = generar_imagenes(args.images, args.lines)
+    
+    print("=" * 60)
+    print(f"📊 OCR de {args.images} imágenes de {args.lines} líneas ({PruebaOcr.OCR_LANG})")
+    print(f"   Workers del pool de procesos: {PruebaOcr.MAX_PROCESS_WORKERS}")
+    print("=" * 60)
+    
+    # Una llamada a pytesseract por imagen, en serie (comportamiento original)
+    medir(
+        "pytesseract, serie",
+        lambda imgs: [PruebaOcr._pytesseract_recognize(img) for img in imgs],
+        imagenes, args.repeat
+    )
+    
+    # pytesseract repartido en hilos (un proceso tesseract por llamada)
+    PruebaOcr.TESSERACT_BACKEND = "pytesseract"
+    medir("pytesseract, hilos", PruebaOcr.recognize_images, imagenes, args.repeat)
+    
+    if PruebaOcr.load_tesserocr() is None:
+        print("\n⚠️ tesserocr no está instalado: se omite el motor persistente")
+        return
+    
+    # Motores persistentes en el pool de procesos (se excluye el arranque)
+    PruebaOcr.TESSERACT_BACKEND = "tesserocr"
+    PruebaOcr.recognize_images(imagenes[:PruebaOcr.MAX_PROCESS_WORKERS])
+    medir("tesserocr, pool de procesos", PruebaOcr.recognize_images, imagenes, args.repeat)
+    
+    PruebaOcr.shutdown_executors()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Compresión de respuestas HTTP (brotli o gzip)
+
+Middleware ASGI que comprime las respuestas de texto (JSON, HTML, JS, CSS)
+a partir de un tamaño mínimo, según el Accept-Encoding del cliente:
+
+- br si el cliente lo acepta y el paquete brotli está instalado
+- gzip en otro caso
+
+Los planes y análisis son JSON grandes con texto en español, que se
+reducen varias veces. Los archivos ya comprimidos (PDF, imágenes, .docx)
+y las respuestas pequeñas o sin cuerpo (304) se envían tal cual.
+"""
+
+from functools import lru_cache
+from typing import Optional
+import gzip
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+
+# Respuestas menores a esto no se comprimen (el ahorro no compensa)
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+NIVEL_GZIP = 6
+# Calidad 4-5 de brotli comprime mejor que gzip 6 en un tiempo similar
+CALIDAD_BROTLI = 4
+
+TIPOS_COMPRIMIBLES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/"
+)
+
+
+@lru_cache(maxsize=1)
+def load_brotli():
+    """
+    Módulo brotli si está instalado, o None (se usa solo gzip)
+    """
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def elegir_codificacion(accept_encoding: str) -> Optional[str]:
+    """
+    'br', 'gzip' o None según lo que acepta el cliente
+    """
+    aceptadas = set()
+    for valor in accept_encoding.lower().split(","):
+        nombre, _, parametros = valor.strip().partition(";")
+        if parametros.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        aceptadas.add(nombre.strip())
+    
+    if "br" in aceptadas and load_brotli() is not None:
+        return "br"
+    if "gzip" in aceptadas or "*" in aceptadas:
+        return "gzip"
+    return None
+
+
+def es_comprimible(content_type: str) -> bool:
+    return content_type.lower().startswith(TIPOS_COMPRIMIBLES)
+
+
+def comprimir(contenido: bytes, codificacion: str) -> bytes:
+    """Comprime un cuerpo completo con la codificación elegida"""
+    if codificacion == "br":
+        return load_brotli().compress(contenido, quality=CALIDAD_BROTLI)
+    return gzip.compress(contenido, compresslevel=NIVEL_GZIP, mtime=0)
+
+
+class _Compresor:
+    """Compresión incremental para respuestas en streaming"""
+    
+    def __init__(self, codificacion: str):
+        if codificacion == "br":
+            self._compresor = load_brotli().Compressor(quality=CALIDAD_BROTLI)
+            self._procesar = self._compresor.process
+            self._terminar = self._compresor.finish
+        else:
+            # wbits 16 + 15: formato gzip
+            self._compresor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._procesar = self._compresor.compress
+            self._terminar = self._compresor.flush
+    
+    def procesar(self, contenido: bytes) -> bytes:
+        return self._procesar(contenido)
+    
+    def terminar(self) -> bytes:
+        return self._terminar()
+
+
+class CompresionMiddleware:
+    """
+    Comprime con brotli o gzip las respuestas de texto de al menos minimo_bytes
+    """
+    
+    def __init__(self, app, minimo_bytes: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimo_bytes = minimo_bytes
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        codificacion = elegir_codificacion(Headers(scope=scope).get("accept-encoding", ""))
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+        
+        respuesta = _RespuestaComprimida(send, codificacion, self.minimo_bytes)
+        await self.app(scope, receive, respuesta.send)
+
+
+class _RespuestaComprimida:
+    """
+    Intercepta los mensajes ASGI de una respuesta y decide con el primer
+    bloque del cuerpo si se comprime
+    """
+    
+    def __init__(self, send, codificacion: str, minimo_bytes: int):
+        self._send = send
+        self.codificacion = codificacion
+        self.minimo_bytes = minimo_bytes
+        self._inicio = None
+        self._compresor: Optional[_Compresor] = None
+        self._sin_comprimir = False
+    
+    async def send(self, mensaje):
+        tipo = mensaje["type"]
+        
+        if tipo == "http.response.start":
+            self._inicio = mensaje
+            return
+        
+        if tipo != "http.response.body" or self._sin_comprimir:
+            await self._send(mensaje)
+            return
+        
+        cuerpo = mensaje.get("body", b"")
+        mas_cuerpo = mensaje.get("more_body", False)
+        
+        if self._compresor is not None:
+            comprimido = self._compresor.procesar(cuerpo)
+            if not mas_cuerpo:
+                comprimido += self._compresor.terminar()
+            await self._send({"type": "http.response.body", "body": comprimido, "more_body": mas_cuerpo})
+            return
+        
+        # Primer bloque del cuerpo: decidir
+        cabeceras = MutableHeaders(raw=self._inicio["headers"])
+        comprimible = (
+            self._inicio["status"] not in (204, 206, 304)
+            and "content-encoding" not in cabeceras
+            and es_comprimible(cabeceras.get("content-type", ""))
+            and (mas_cuerpo or len(cuerpo) >= self.minimo_bytes)
+        )
+        
+        if not comprimible:
+            self._sin_comprimir = True
+            await self._send(self._inicio)
+            await self._send(mensaje)
+            return
+        
+        cabeceras["Content-Encoding"] = self.codificacion
+        cabeceras.add_vary_header("Accept-Encoding")
+        # La representación comprimida no es idéntica byte a byte
+        etag = cabeceras.get("etag")
+        if etag and not etag.startswith("W/"):
+            cabeceras["ETag"] = f"W/{etag}"
+        
+        if not mas_cuerpo:
+            comprimido = comprimir(cuerpo, self.codificacion)
+            cabeceras["Content-Length"] = str(len(comprimido))
+            await self._send(self._inicio)
+            await self._send({"type": "http.response.body", "body": comprimido})
+            return
+        
+        # Streaming: se comprime bloque a bloque y se desconoce el tamaño final
+        del cabeceras["Content-Length"]
+        self._compresor = _Compresor(self.codificacion)
+        await self._send(self._inicio)
+        await self._send({
+            "type": "http.response.body",
+            "body": self._compresor.procesar(cuerpo),
+            "more_body": True
+        })
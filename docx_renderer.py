@@ -0,0 +1,580 @@
+"""
+Generación del documento Word (.docx) de un plan de estudio
+
+El contenido del documento se describe una sola vez como una secuencia de
+bloques (títulos, párrafos con runs y saltos de página) y se escribe con
+uno de dos renderers, elegido con DOCX_RENDERER:
+
+- python-docx (por defecto): construye el documento objeto por objeto
+- plantilla: copia un .docx base y escribe word/document.xml directamente
+  como fragmentos de WordprocessingML, en streaming dentro del zip. Evita
+  los proxies de lxml y la resolución de estilos por cada run, que dominan
+  el tiempo en planes con muchos módulos y actividades.
+
+La plantilla es DOCX_TEMPLATE_PATH o, si no se define, el documento base de
+python-docx con los mismos estilos que el otro renderer.
+"""
+
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+import io
+import os
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+
+# Versión del .docx generado: al cambiar el formato se incrementa y los
+# documentos cacheados con otra versión se vuelven a generar
+VERSION_DOCUMENTO_WORD = "1"
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+DOCX_RENDERER = os.getenv("DOCX_RENDERER", "python-docx").strip().lower()
+DOCX_TEMPLATE_PATH = os.getenv("DOCX_TEMPLATE_PATH")
+
+NS_CORE_PROPERTIES = {
+    'cp': 'http://schemas.openxmlformats.org/package/2006/metadata/core-properties',
+    'dc': 'http://purl.org/dc/elements/1.1/'
+}
+NS_WORD = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+# Estilo del documento: Arial 12 con interlineado 1.5
+FUENTE_NORMAL = 'Arial'
+TAMANO_NORMAL_PT = 12
+INTERLINEADO = 1.5
+COLOR_TITULOS = (0, 102, 204)
+
+
+# ============================================================================
+# CONTENIDO DEL DOCUMENTO
+# ============================================================================
+
+# Bloques:
+#   ('titulo', texto, nivel, color, centrado)
+#   ('parrafo', runs, estilo, centrado) con runs (texto, negrita, cursiva, tamaño_pt)
+#   ('salto',)
+Run = Tuple[str, bool, bool, Optional[int]]
+SALTO_PAGINA = ('salto',)
+
+
+def _titulo(texto: str, nivel: int, color: Optional[Tuple[int, int, int]] = None,
+            centrado: bool = False) -> Tuple:
+    return ('titulo', texto, nivel, color, centrado)
+
+
+def _run(texto: str, negrita: bool = False, cursiva: bool = False,
+         tamano: Optional[int] = None) -> Run:
+    return (texto, negrita, cursiva, tamano)
+
+
+def _parrafo(*runs: Run, estilo: Optional[str] = None, centrado: bool = False) -> Tuple:
+    return ('parrafo', runs, estilo, centrado)
+
+
+def _texto(texto: str, estilo: Optional[str] = None) -> Tuple:
+    """Párrafo de un solo run sin formato"""
+    return _parrafo(_run(texto), estilo=estilo)
+
+
+def _campo(etiqueta: str, valor: str, estilo: Optional[str] = None) -> Tuple:
+    """Párrafo 'Etiqueta: valor' con la etiqueta en negrita"""
+    return _parrafo(_run(etiqueta, negrita=True), _run(valor), estilo=estilo)
+
+
+def _lista(valor) -> List[str]:
+    return valor if isinstance(valor, list) else [valor]
+
+
+def bloques_plan(plan_data: Dict) -> Iterator[Tuple]:
+    """
+    Contenido del Word de un plan, en orden, como bloques
+    """
+    # ========== PORTADA ==========
+    yield _titulo(plan_data.get('nombre_plan', 'Plan Educativo'), 0, COLOR_TITULOS, centrado=True)
+    
+    # Información general
+    info_general = []
+    
+    if plan_data.get('grado'):
+        info_general.append(_run(f"Grado: {plan_data['grado']}\n", negrita=True, tamano=12))
+    
+    if plan_data.get('edad_aprox'):
+        info_general.append(_run(f"Edad aproximada: {plan_data['edad_aprox']}\n", tamano=12))
+    
+    if plan_data.get('duracion_total'):
+        info_general.append(_run(f"Duración total: {plan_data['duracion_total']}\n", tamano=12))
+    
+    if plan_data.get('fecha_generacion'):
+        fecha = datetime.fromisoformat(plan_data['fecha_generacion']).strftime('%d/%m/%Y %H:%M')
+        info_general.append(_run(f"Generado: {fecha}\n", cursiva=True, tamano=12))
+    
+    yield _parrafo(*info_general, centrado=True)
+    yield _parrafo()
+    
+    # Campo formativo y ejes
+    if plan_data.get('campo_formativo_principal'):
+        yield _campo('Campo Formativo Principal: ', plan_data['campo_formativo_principal'])
+    
+    if plan_data.get('ejes_articuladores_generales'):
+        yield _campo('Ejes Articuladores: ', ', '.join(plan_data['ejes_articuladores_generales']))
+    
+    yield SALTO_PAGINA
+    
+    # ========== MÓDULOS ==========
+    yield _titulo('◈ Módulos del Plan', 1)
+    
+    modulos = plan_data.get('modulos', [])
+    
+    for idx, modulo in enumerate(modulos, 1):
+        yield from _bloques_modulo(modulo, idx)
+        
+        # Separador entre módulos
+        if idx < len(modulos):
+            yield SALTO_PAGINA
+    
+    # ========== RECURSOS EDUCATIVOS ==========
+    if plan_data.get('recursos_educativos'):
+        yield SALTO_PAGINA
+        yield _titulo('◈ Recursos Educativos', 1)
+        yield from _bloques_recursos(plan_data['recursos_educativos'])
+    
+    # ========== RECOMENDACIONES DE AMBIENTE ==========
+    if plan_data.get('recomendaciones_ambiente'):
+        yield _titulo('◇ Recomendaciones para el Ambiente', 2)
+        yield _texto(plan_data['recomendaciones_ambiente'])
+    
+    # ========== VINCULACIÓN CURRICULAR ==========
+    if plan_data.get('vinculacion_curricular'):
+        yield _titulo('◇ Vinculación Curricular', 2)
+        vinculacion = plan_data['vinculacion_curricular']
+        
+        if vinculacion.get('campo_formativo_principal'):
+            yield _campo('Campo Formativo Principal: ', vinculacion['campo_formativo_principal'])
+        
+        if vinculacion.get('campos_secundarios'):
+            yield _campo('Campos Secundarios: ', ', '.join(vinculacion['campos_secundarios']))
+        
+        if vinculacion.get('ejes_transversales'):
+            yield _campo('Ejes Transversales: ', ', '.join(vinculacion['ejes_transversales']))
+        
+        if vinculacion.get('aprendizajes_clave'):
+            yield _titulo('Aprendizajes Clave:', 3)
+            for aprendizaje in vinculacion['aprendizajes_clave']:
+                yield _texto(f" {aprendizaje}", 'List Bullet')
+
+
+def _bloques_modulo(modulo: Dict, idx: int) -> Iterator[Tuple]:
+    """Encabezado, actividades y notas de un módulo"""
+    yield _titulo(f"Módulo {modulo.get('numero', idx)}: {modulo.get('nombre', '')}", 2, COLOR_TITULOS)
+    
+    # Información del módulo
+    if modulo.get('campo_formativo'):
+        yield _campo('◇ Campo Formativo: ', modulo['campo_formativo'])
+    
+    if modulo.get('ejes_articuladores'):
+        yield _campo('◇ Ejes Articuladores: ', ', '.join(modulo['ejes_articuladores']))
+    
+    if modulo.get('aprendizaje_esperado'):
+        yield _campo('◇ Aprendizaje Esperado: ', modulo['aprendizaje_esperado'])
+    
+    if modulo.get('tiempo_estimado'):
+        yield _campo('◇ Tiempo Estimado: ', modulo['tiempo_estimado'])
+    
+    yield _parrafo()
+    
+    # Actividad de inicio
+    if modulo.get('actividad_inicio'):
+        yield _titulo('◆ Actividad de Inicio', 3)
+        inicio = modulo['actividad_inicio']
+        
+        yield _campo('Nombre: ', inicio.get('nombre', ''))
+        yield _campo('Descripción: ', inicio.get('descripcion', ''))
+        
+        if inicio.get('duracion'):
+            yield _campo('Duración: ', inicio['duracion'])
+        
+        if inicio.get('materiales'):
+            yield _campo('Materiales: ', ', '.join(_lista(inicio['materiales'])))
+        
+        if inicio.get('organizacion'):
+            yield _campo('Organización: ', inicio['organizacion'])
+    
+    # Actividades de desarrollo
+    if modulo.get('actividades_desarrollo'):
+        yield _titulo('◆ Actividades de Desarrollo', 3)
+        
+        for act_idx, actividad in enumerate(modulo['actividades_desarrollo'], 1):
+            yield _titulo(f"Actividad {act_idx}: {actividad.get('nombre', '')}", 4)
+            
+            if actividad.get('tipo'):
+                yield _campo('Tipo: ', actividad['tipo'])
+            
+            # Actividades adaptadas de la biblioteca RAG
+            if actividad.get('basada_en_actividad_biblioteca') == 'SI':
+                yield _campo('📚 Basada en biblioteca: ', 'SÍ')
+                if actividad.get('fuente_actividad'):
+                    yield _campo('📄 Fuente: ', actividad['fuente_actividad'])
+            
+            if actividad.get('descripcion'):
+                yield _campo('Descripción: ', actividad['descripcion'])
+            
+            if actividad.get('duracion'):
+                yield _campo('Duración: ', actividad['duracion'])
+            
+            if actividad.get('organizacion'):
+                yield _campo('Organización: ', actividad['organizacion'])
+            
+            if actividad.get('materiales'):
+                yield _campo('Materiales: ', ', '.join(_lista(actividad['materiales'])))
+            
+            if actividad.get('aspectos_a_observar'):
+                yield _campo('Aspectos a observar: ', actividad['aspectos_a_observar'])
+            
+            yield _parrafo()
+    
+    # Actividad de cierre
+    if modulo.get('actividad_cierre'):
+        yield _titulo('◆ Actividad de Cierre', 3)
+        cierre = modulo['actividad_cierre']
+        
+        yield _campo('Nombre: ', cierre.get('nombre', ''))
+        yield _campo('Descripción: ', cierre.get('descripcion', ''))
+        
+        if cierre.get('duracion'):
+            yield _campo('Duración: ', cierre['duracion'])
+        
+        if cierre.get('preguntas_guia'):
+            yield _parrafo(_run('Preguntas guía:', negrita=True))
+            for pregunta in cierre['preguntas_guia']:
+                yield _texto(f" {pregunta}", 'List Bullet')
+    
+    # Información adicional del módulo
+    for clave, titulo in (('consejos_maestra', '◇ Consejos para el Docente'),
+                          ('variaciones', '◇ Variaciones'),
+                          ('vinculo_familia', '◇ Vínculo con la Familia'),
+                          ('evaluacion', '◇ Evaluación')):
+        if modulo.get(clave):
+            yield _titulo(titulo, 3)
+            yield _texto(modulo[clave])
+
+
+def _detalles(elemento: Dict, campos: Tuple[Tuple[str, str], ...]) -> str:
+    """'Etiqueta: valor | ...' con los campos presentes"""
+    return ' | '.join(f"{etiqueta}: {elemento[clave]}" for clave, etiqueta in campos if elemento.get(clave))
+
+
+def _bloques_recursos(recursos: Dict) -> Iterator[Tuple]:
+    """Materiales, cuentos, canciones y actividades complementarias"""
+    if recursos.get('materiales_generales'):
+        yield _titulo('◇ Materiales Generales', 2)
+        for material in recursos['materiales_generales']:
+            yield _texto(f" {material}", 'List Bullet')
+    
+    if recursos.get('cuentos_recomendados'):
+        yield _titulo('◇ Cuentos Recomendados', 2)
+        for cuento in recursos['cuentos_recomendados']:
+            yield _campo(f"• {cuento.get('titulo', '')}: ", _detalles(cuento, (
+                ('autor', 'Autor'), ('tipo', 'Tipo'), ('acceso', 'Acceso'), ('disponibilidad', 'Disponibilidad')
+            )))
+            
+            if cuento.get('descripcion_breve'):
+                yield _texto(f"  {cuento['descripcion_breve']}", 'List Bullet 2')
+    
+    if recursos.get('canciones_recomendadas'):
+        yield _titulo('◇ Canciones Recomendadas', 2)
+        for cancion in recursos['canciones_recomendadas']:
+            yield _campo(f"• {cancion.get('titulo', '')}: ", _detalles(cancion, (
+                ('tipo', 'Tipo'), ('acceso', 'Acceso'), ('disponibilidad', 'Disponibilidad')
+            )))
+            
+            if cancion.get('uso_sugerido'):
+                yield _texto(f"  Uso sugerido: {cancion['uso_sugerido']}", 'List Bullet 2')
+    
+    if recursos.get('actividades_complementarias'):
+        yield _titulo('🎯 Actividades Complementarias', 2)
+        for actividad in recursos['actividades_complementarias']:
+            yield _campo(f"• {actividad.get('titulo', '')}: ", _detalles(actividad, (
+                ('linea_trabajo', 'Línea'), ('ambito', 'Ámbito'), ('organizacion', 'Organización'),
+                ('tipo', 'Tipo'), ('acceso', 'Acceso')
+            )))
+            
+            if actividad.get('descripcion_breve'):
+                yield _texto(f"  {actividad['descripcion_breve']}", 'List Bullet 2')
+            
+            if actividad.get('materiales_necesarios'):
+                yield _campo('  Materiales: ', ', '.join(actividad['materiales_necesarios']), 'List Bullet 2')
+
+
+# ============================================================================
+# RENDERER PYTHON-DOCX
+# ============================================================================
+
+def _configurar_estilos(doc):
+    """Estilo Normal del documento (Arial 12, interlineado 1.5)"""
+    from docx.shared import Pt
+    
+    style = doc.styles['Normal']
+    style.font.name = FUENTE_NORMAL
+    style.font.size = Pt(TAMANO_NORMAL_PT)
+    style.paragraph_format.line_spacing = INTERLINEADO
+
+
+def renderizar_con_python_docx(plan_data: Dict) -> bytes:
+    """
+    Genera el .docx construyendo cada párrafo y run con python-docx
+    """
+    from docx import Document
+    from docx.shared import Pt, RGBColor
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    
+    doc = Document()
+    _configurar_estilos(doc)
+    
+    # Título y versión permiten servir después el .docx cacheado sin el JSON
+    doc.core_properties.title = plan_data.get('nombre_plan', 'Plan Educativo')
+    doc.core_properties.version = VERSION_DOCUMENTO_WORD
+    
+    for bloque in bloques_plan(plan_data):
+        tipo = bloque[0]
+        
+        if tipo == 'titulo':
+            _, texto, nivel, color, centrado = bloque
+            parrafo = doc.add_heading(texto, nivel)
+            if color and parrafo.runs:
+                parrafo.runs[0].font.color.rgb = RGBColor(*color)
+        
+        elif tipo == 'parrafo':
+            _, runs, estilo, centrado = bloque
+            parrafo = doc.add_paragraph(style=estilo)
+            for texto, negrita, cursiva, tamano in runs:
+                run = parrafo.add_run(texto)
+                if negrita:
+                    run.bold = True
+                if cursiva:
+                    run.italic = True
+                if tamano:
+                    run.font.size = Pt(tamano)
+        
+        else:
+            doc.add_page_break()
+            continue
+        
+        if centrado:
+            parrafo.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    
+    docx_bytes = io.BytesIO()
+    doc.save(docx_bytes)
+    return docx_bytes.getvalue()
+
+
+# ============================================================================
+# RENDERER DE PLANTILLA (WordprocessingML directo)
+# ============================================================================
+
+# Caracteres que XML 1.0 no admite (python-docx los rechaza)
+CARACTERES_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+@lru_cache(maxsize=1)
+def cargar_plantilla() -> Dict:
+    """
+    Partes de la plantilla .docx, leídas una sola vez
+    
+    Returns:
+        Dict con 'partes' [(ZipInfo, bytes)] sin document.xml ni core.xml,
+        'inicio' y 'fin' de document.xml (el contenido va entre ambos) y
+        'estilos' {nombre: styleId}
+    """
+    if DOCX_TEMPLATE_PATH:
+        with open(DOCX_TEMPLATE_PATH, 'rb') as f:
+            plantilla = f.read()
+    else:
+        from docx import Document
+        
+        doc = Document()
+        _configurar_estilos(doc)
+        salida = io.BytesIO()
+        doc.save(salida)
+        plantilla = salida.getvalue()
+    
+    with zipfile.ZipFile(io.BytesIO(plantilla)) as paquete:
+        partes = [
+            (info, paquete.read(info.filename))
+            for info in paquete.infolist()
+            if info.filename not in ('word/document.xml', 'docProps/core.xml')
+        ]
+        documento = paquete.read('word/document.xml').decode('utf-8')
+        estilos_xml = paquete.read('word/styles.xml')
+    
+    # El contenido se inserta antes de las propiedades de sección finales
+    corte = documento.rfind('<w:sectPr')
+    if corte == -1:
+        corte = documento.rfind('</w:body>')
+    
+    estilos = {}
+    for estilo in ET.fromstring(estilos_xml).iter(f'{{{NS_WORD}}}style'):
+        nombre = estilo.find(f'{{{NS_WORD}}}name')
+        if nombre is not None:
+            estilos[nombre.get(f'{{{NS_WORD}}}val')] = estilo.get(f'{{{NS_WORD}}}styleId')
+    
+    return {
+        'partes': partes,
+        'inicio': documento[:corte],
+        'fin': documento[corte:],
+        'estilos': estilos
+    }
+
+
+def _id_estilo(estilos: Dict[str, str], nombre: str) -> str:
+    # python-docx usa los nombres en minúscula de los estilos integrados ("heading 1")
+    return estilos.get(nombre) or estilos.get(nombre.lower()) or nombre.replace(' ', '')
+
+
+def _xml_texto(texto: str) -> str:
+    """
+    Contenido de un run: saltos de línea como <w:br/> y tabs como <w:tab/>,
+    igual que run.text en python-docx
+    """
+    texto = CARACTERES_INVALIDOS_XML.sub('', texto)
+    partes = []
+    for indice, linea in enumerate(texto.split('\n')):
+        if indice:
+            partes.append('<w:br/>')
+        for indice_tab, segmento in enumerate(linea.split('\t')):
+            if indice_tab:
+                partes.append('<w:tab/>')
+            if segmento:
+                partes.append(f'<w:t xml:space="preserve">{escape(segmento)}</w:t>')
+    return ''.join(partes)
+
+
+def _xml_run(texto: str, negrita: bool = False, cursiva: bool = False,
+             tamano: Optional[int] = None, color: Optional[Tuple[int, int, int]] = None) -> str:
+    propiedades = ''
+    if negrita:
+        propiedades += '<w:b/>'
+    if cursiva:
+        propiedades += '<w:i/>'
+    if color:
+        propiedades += '<w:color w:val="{:02X}{:02X}{:02X}"/>'.format(*color)
+    if tamano:
+        propiedades += f'<w:sz w:val="{tamano * 2}"/>'
+    if propiedades:
+        propiedades = f'<w:rPr>{propiedades}</w:rPr>'
+    return f'<w:r>{propiedades}{_xml_texto(texto)}</w:r>'
+
+
+def _xml_parrafo(contenido: str, estilo_id: Optional[str] = None, centrado: bool = False) -> str:
+    propiedades = ''
+    if estilo_id:
+        propiedades += f'<w:pStyle w:val="{estilo_id}"/>'
+    if centrado:
+        propiedades += '<w:jc w:val="center"/>'
+    if propiedades:
+        propiedades = f'<w:pPr>{propiedades}</w:pPr>'
+    return f'<w:p>{propiedades}{contenido}</w:p>'
+
+
+def _xml_bloques(plan_data: Dict, estilos: Dict[str, str]) -> Iterator[str]:
+    """Fragmentos de WordprocessingML del cuerpo del documento"""
+    for bloque in bloques_plan(plan_data):
+        tipo = bloque[0]
+        
+        if tipo == 'titulo':
+            _, texto, nivel, color, centrado = bloque
+            estilo = 'Title' if nivel == 0 else f'Heading {nivel}'
+            yield _xml_parrafo(_xml_run(texto, color=color), _id_estilo(estilos, estilo), centrado)
+        
+        elif tipo == 'parrafo':
+            _, runs, estilo, centrado = bloque
+            contenido = ''.join(_xml_run(*run) for run in runs)
+            yield _xml_parrafo(contenido, _id_estilo(estilos, estilo) if estilo else None, centrado)
+        
+        else:
+            yield '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+
+def _xml_propiedades(titulo: str) -> str:
+    """docProps/core.xml con título, versión y fechas"""
+    ahora = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return (
+        "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+        '<cp:coreProperties'
+        f' xmlns:cp="{NS_CORE_PROPERTIES["cp"]}" xmlns:dc="{NS_CORE_PROPERTIES["dc"]}"'
+        ' xmlns:dcterms="http://purl.org/dc/terms/"'
+        ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+        f'<dc:title>{escape(CARACTERES_INVALIDOS_XML.sub("", titulo))}</dc:title>'
+        '<dc:creator>ProfeGo</dc:creator>'
+        f'<cp:version>{VERSION_DOCUMENTO_WORD}</cp:version>'
+        f'<dcterms:created xsi:type="dcterms:W3CDTF">{ahora}</dcterms:created>'
+        f'<dcterms:modified xsi:type="dcterms:W3CDTF">{ahora}</dcterms:modified>'
+        '</cp:coreProperties>'
+    )
+
+
+def renderizar_con_plantilla(plan_data: Dict) -> bytes:
+    """
+    Genera el .docx copiando la plantilla y escribiendo document.xml en streaming
+    """
+    plantilla = cargar_plantilla()
+    salida = io.BytesIO()
+    
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as paquete:
+        for info, contenido in plantilla['partes']:
+            paquete.writestr(info, contenido)
+        
+        titulo = plan_data.get('nombre_plan', 'Plan Educativo')
+        paquete.writestr('docProps/core.xml', _xml_propiedades(titulo))
+        
+        with paquete.open('word/document.xml', 'w') as documento:
+            documento.write(plantilla['inicio'].encode('utf-8'))
+            for fragmento in _xml_bloques(plan_data, plantilla['estilos']):
+                documento.write(fragmento.encode('utf-8'))
+            documento.write(plantilla['fin'].encode('utf-8'))
+    
+    return salida.getvalue()
+
+
+# ============================================================================
+# API DEL MÓDULO
+# ============================================================================
+
+RENDERERS = {
+    'python-docx': renderizar_con_python_docx,
+    'plantilla': renderizar_con_plantilla
+}
+
+
+def generar_documento_word(plan_data: Dict, renderer: Optional[str] = None) -> bytes:
+    """
+    Genera el documento Word de un plan
+    
+    Args:
+        plan_data: Plan generado (JSON de Gemini con metadata)
+        renderer: 'python-docx' o 'plantilla' (por defecto DOCX_RENDERER)
+    
+    Returns:
+        Contenido del .docx
+    """
+    nombre = renderer or DOCX_RENDERER
+    if nombre not in RENDERERS:
+        raise ValueError(f"DOCX_RENDERER no soportado: {nombre} (usa 'python-docx' o 'plantilla')")
+    return RENDERERS[nombre](plan_data)
+
+
+def propiedades_documento_word(docx_bytes: bytes) -> Dict:
+    """
+    Título y versión de un .docx (docProps/core.xml), sin cargar el documento
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(docx_bytes)) as paquete:
+            raiz = ET.fromstring(paquete.read('docProps/core.xml'))
+    except (KeyError, zipfile.BadZipFile, ET.ParseError):
+        return {}
+    
+    return {
+        'titulo': raiz.findtext('dc:title', '', NS_CORE_PROPERTIES),
+        'version': raiz.findtext('cp:version', '', NS_CORE_PROPERTIES)
+    }
@@ -0,0 +1,266 @@
+"""
+Verificación local de ID tokens de Firebase
+
+Los ID tokens son JWT firmados con RS256 por Google. Se verifican en el
+propio proceso contra los certificados públicos de securetoken (cacheados
+según su Cache-Control y recargados cuando aparece un kid nuevo por
+rotación), en lugar de consultar a Firebase en cada petición.
+
+Los tokens ya verificados se guardan en un LRU en memoria, indexado por el
+SHA-256 del token, durante FIREBASE_TOKEN_CACHE_SECONDS (nunca más allá de
+su exp): una petición autenticada repetida cuesta un hash y una búsqueda.
+
+Sin red (desarrollo o pruebas) se puede usar un archivo local de
+certificados con FIREBASE_CERTS_FILE={"kid": "-----BEGIN CERTIFICATE-----..."}
+y firmar tokens con emitir_token_local().
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+
+
+FIREBASE_CERTS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/"
+    "securetoken@system.gserviceaccount.com"
+)
+
+# Vigencia de los certificados si la respuesta no trae max-age
+CERTS_TTL_POR_DEFECTO_SEGUNDOS = 3600
+# Mínimo entre recargas forzadas por un kid desconocido
+CERTS_RECARGA_MINIMA_SEGUNDOS = 60
+# Tolerancia de reloj para iat / exp / auth_time
+MARGEN_RELOJ_SEGUNDOS = 60
+
+
+class CertificadosNoDisponibles(Exception):
+    """No se pudieron obtener los certificados públicos (la verificación local no es posible)"""
+
+
+class VerificadorTokensFirebase:
+    """
+    Verifica ID tokens de Firebase sin llamadas a la API de Firebase
+    """
+    
+    def __init__(self, project_id: str,
+                 ttl_cache_segundos: int = 300,
+                 max_tokens_cache: int = 10000,
+                 archivo_certificados: Optional[str] = None,
+                 obtener_certificados: Optional[Callable[[], Tuple[Dict[str, str], int]]] = None):
+        """
+        Args:
+            project_id: ID del proyecto de Firebase (aud del token)
+            ttl_cache_segundos: Tiempo que un token verificado se acepta sin volver a verificarlo
+            max_tokens_cache: Tokens verificados que se conservan (LRU)
+            archivo_certificados: JSON local {kid: certificado PEM}, en lugar de la red
+            obtener_certificados: Función que retorna ({kid: PEM}, max_age); por
+                defecto se descargan de FIREBASE_CERTS_URL
+        """
+        self.project_id = project_id
+        self.emisor = f"https://securetoken.google.com/{project_id}"
+        self.ttl_cache_segundos = ttl_cache_segundos
+        self.max_tokens_cache = max_tokens_cache
+        
+        if obtener_certificados is not None:
+            self._obtener_certificados = obtener_certificados
+        elif archivo_certificados:
+            self._obtener_certificados = lambda: (self._leer_certificados(archivo_certificados), 365 * 24 * 3600)
+        else:
+            self._obtener_certificados = self._descargar_certificados
+        
+        self._certificados: Dict[str, str] = {}
+        self._certificados_expiran = 0.0
+        self._certificados_cargados = 0.0
+        self._certificados_lock = threading.Lock()
+        
+        # sha256(token) -> (claims, válido hasta)
+        self._tokens: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self._tokens_lock = threading.Lock()
+    
+    # ---------------- Certificados ----------------
+    
+    @staticmethod
+    def _descargar_certificados() -> Tuple[Dict[str, str], int]:
+        """Certificados públicos de securetoken y su max-age"""
+        with urllib.request.urlopen(FIREBASE_CERTS_URL, timeout=5) as respuesta:
+            certificados = json.loads(respuesta.read().decode("utf-8"))
+            cache_control = respuesta.headers.get("Cache-Control", "")
+        
+        coincidencia = re.search(r"max-age=(\d+)", cache_control)
+        max_age = int(coincidencia.group(1)) if coincidencia else CERTS_TTL_POR_DEFECTO_SEGUNDOS
+        return certificados, max_age
+    
+    @staticmethod
+    def _leer_certificados(ruta: str) -> Dict[str, str]:
+        with open(ruta, "r", encoding="utf-8") as archivo:
+            return json.load(archivo)
+    
+    def _certificado(self, kid: str) -> Optional[str]:
+        """
+        Certificado PEM del kid, recargando si los certificados expiraron o
+        si el kid es desconocido (rotación de llaves)
+        """
+        ahora = time.time()
+        certificados = self._certificados
+        if kid in certificados and ahora < self._certificados_expiran:
+            return certificados[kid]
+        
+        with self._certificados_lock:
+            ahora = time.time()
+            vencidos = ahora >= self._certificados_expiran
+            # Un kid desconocido fuerza la recarga, como mucho una vez por minuto
+            kid_nuevo = (kid not in self._certificados
+                         and ahora - self._certificados_cargados >= CERTS_RECARGA_MINIMA_SEGUNDOS)
+            
+            if vencidos or kid_nuevo:
+                try:
+                    certificados, max_age = self._obtener_certificados()
+                except Exception as e:
+                    if not self._certificados:
+                        raise CertificadosNoDisponibles(str(e)) from e
+                    # Se siguen usando los anteriores hasta poder recargarlos
+                    print(f"⚠️ No se pudieron recargar los certificados de Firebase: {e}")
+                    self._certificados_expiran = ahora + CERTS_RECARGA_MINIMA_SEGUNDOS
+                else:
+                    self._certificados = certificados
+                    self._certificados_expiran = ahora + max_age
+                    self._certificados_cargados = ahora
+            
+            return self._certificados.get(kid)
+    
+    # ---------------- Tokens ----------------
+    
+    @staticmethod
+    def _clave(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+    
+    def verificar_en_cache(self, token: str) -> Optional[Dict]:
+        """
+        Claims de un token ya verificado y aún vigente, o None
+        """
+        clave = self._clave(token)
+        with self._tokens_lock:
+            entrada = self._tokens.get(clave)
+            if entrada is None:
+                return None
+            
+            claims, valido_hasta = entrada
+            if time.time() >= valido_hasta:
+                del self._tokens[clave]
+                return None
+            
+            self._tokens.move_to_end(clave)
+            return claims
+    
+    def verificar(self, token: str) -> Dict:
+        """
+        Verifica firma y claims de un ID token de Firebase
+        
+        Returns:
+            Claims del token (sub, email, exp, ...)
+        
+        Raises:
+            ValueError: Token inválido, expirado o de otro proyecto
+            CertificadosNoDisponibles: No hay certificados para verificarlo localmente
+        """
+        claims = self.verificar_en_cache(token)
+        if claims is not None:
+            return claims
+        
+        from jose import jwt, JWTError
+        
+        try:
+            encabezado = jwt.get_unverified_header(token)
+        except JWTError as e:
+            raise ValueError(f"Token mal formado: {e}") from e
+        
+        if encabezado.get("alg") != "RS256":
+            raise ValueError(f"Algoritmo no permitido: {encabezado.get('alg')}")
+        
+        certificado = self._certificado(encabezado.get("kid", ""))
+        if certificado is None:
+            raise ValueError("El token está firmado con una llave desconocida")
+        
+        try:
+            claims = jwt.decode(
+                token, certificado, algorithms=["RS256"],
+                audience=self.project_id, issuer=self.emisor,
+                options={"leeway": MARGEN_RELOJ_SEGUNDOS}
+            )
+        except JWTError as e:
+            raise ValueError(f"Token inválido: {e}") from e
+        
+        ahora = time.time()
+        if not claims.get("sub"):
+            raise ValueError("El token no tiene sub")
+        if claims.get("auth_time", 0) > ahora + MARGEN_RELOJ_SEGUNDOS:
+            raise ValueError("auth_time en el futuro")
+        
+        self._guardar(token, claims, min(ahora + self.ttl_cache_segundos, claims["exp"]))
+        return claims
+    
+    def _guardar(self, token: str, claims: Dict, valido_hasta: float):
+        with self._tokens_lock:
+            clave = self._clave(token)
+            self._tokens[clave] = (claims, valido_hasta)
+            self._tokens.move_to_end(clave)
+            while len(self._tokens) > self.max_tokens_cache:
+                self._tokens.popitem(last=False)
+    
+    def invalidar(self, token: str):
+        """Olvida un token verificado (por ejemplo al cerrar sesión)"""
+        with self._tokens_lock:
+            self._tokens.pop(self._clave(token), None)
+
+
+def crear_verificador_firebase() -> Optional[VerificadorTokensFirebase]:
+    """
+    Verificador configurado por variables de entorno, o None sin FIREBASE_PROJECT_ID
+    
+    - FIREBASE_TOKEN_CACHE_SECONDS: vida de un token en el cache (por defecto 300)
+    - FIREBASE_TOKEN_CACHE_MAX: tokens en el cache (por defecto 10000)
+    - FIREBASE_CERTS_FILE: certificados locales en lugar de la red
+    """
+    project_id = os.getenv("FIREBASE_PROJECT_ID")
+    if not project_id:
+        return None
+    
+    return VerificadorTokensFirebase(
+        project_id,
+        ttl_cache_segundos=int(os.getenv("FIREBASE_TOKEN_CACHE_SECONDS", "300")),
+        max_tokens_cache=int(os.getenv("FIREBASE_TOKEN_CACHE_MAX", "10000")),
+        archivo_certificados=os.getenv("FIREBASE_CERTS_FILE") or None
+    )
+
+
+def emitir_token_local(llave_privada_pem: str, kid: str, project_id: str, email: str,
+                       uid: Optional[str] = None, vigencia_segundos: int = 3600) -> str:
+    """
+    Firma un ID token con el formato de Firebase usando una llave local
+    
+    Solo para desarrollo y pruebas sin red, junto con FIREBASE_CERTS_FILE
+    apuntando al certificado de esa llave.
+    """
+    from jose import jwt
+    
+    ahora = int(time.time())
+    uid = uid or hashlib.sha1(email.encode("utf-8")).hexdigest()[:28]
+    claims = {
+        "iss": f"https://securetoken.google.com/{project_id}",
+        "aud": project_id,
+        "auth_time": ahora,
+        "user_id": uid,
+        "sub": uid,
+        "iat": ahora,
+        "exp": ahora + vigencia_segundos,
+        "email": email,
+        "email_verified": False,
+        "firebase": {"identities": {"email": [email]}, "sign_in_provider": "password"}
+    }
+    return jwt.encode(claims, llave_privada_pem, algorithm="RS256", headers={"kid": kid})
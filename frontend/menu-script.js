@@ -1458,11 +1458,11 @@ function displayRAGAnalysis(data) {
                         ` : ''}
                     </div>
                     
-                    ${recurso.markdown_formato ? `
+                    ${recurso.contenido_completo ? `
                         <div class="recurso-markdown-section">
                             <h5>📋 Recurso Interno:</h5>
                             <div class="markdown-preview">
-                                <pre>${escapeHtml(recurso.markdown_formato)}</pre>
+                                <pre>${escapeHtml(recursoMarkdown(recurso))}</pre>
                             </div>
                             
                         </div>
@@ -1582,6 +1582,27 @@ function displayRAGAnalysis(data) {
     content.innerHTML = html;
 }
 
+/**
+ * Ficha en markdown de un recurso RAG (la API envía el contenido una sola vez)
+ */
+function recursoMarkdown(recurso) {
+    return `---
+### 📚 Recurso Educativo Relacionado
+
+**Título:** ${recurso.titulo}  
+**Tipo:** ${(recurso.tipo || '').toUpperCase()}  
+**Fuente:** ${recurso.fuente}  
+**Similitud con el plan:** ${recurso.similitud_porcentaje}% (${recurso.similitud_nivel})  
+**Acceso:** ${recurso.acceso}
+
+**Contenido completo:**
+
+${recurso.contenido_completo}
+
+---
+`;
+}
+
 function toggleFullContent(button, fullContent) {
     const contentDiv = button.nextElementSibling;
     
@@ -9,6 +9,10 @@ const API_BASE = '/api';
 const SESSION_STORAGE_KEY = 'profego_session';
 const SESSION_DURATION = 3600000; // 1 hora en milisegundos
 
+// Respuestas GET con ETag: endpoint -> { etag, data }. Al repetir la peticiÃ³n
+// se envÃ­a If-None-Match y, si la API responde 304, se reutilizan los datos
+const etagCache = new Map();
+
 // ===== GESTIÃ"N DE SESIÃ"N =====
 
 /**
@@ -95,6 +99,7 @@ function clearSession() {
         localStorage.removeItem('userToken');
         localStorage.removeItem('userEmail');
         localStorage.removeItem(SESSION_STORAGE_KEY);
+        etagCache.clear();
         currentUser = null;
         currentToken = null;
         console.log('SesiÃ³n limpiada correctamente');
@@ -254,6 +259,13 @@ async function apiRequest(endpoint, options = {}) {
             headers['Content-Type'] = 'application/json';
         }
         
+        // Revalidar con el ETag de la Ãºltima respuesta (solo GET)
+        const isGet = (options.method || 'GET').toUpperCase() === 'GET';
+        const cached = isGet ? etagCache.get(endpoint) : null;
+        if (cached) {
+            headers['If-None-Match'] = cached.etag;
+        }
+        
         // Combinar headers personalizados
         Object.assign(headers, options.headers || {});
         
@@ -268,6 +280,12 @@ async function apiRequest(endpoint, options = {}) {
             headers
         });
         
+        // Sin cambios desde la Ãºltima vez: solo se transfirieron headers
+        if (response.status === 304 && cached) {
+            console.log('API Response (304, sin cambios):', endpoint);
+            return cached.data;
+        }
+        
         // Manejar respuesta
         if (!response.ok) {
             let errorMessage = 'Error en la solicitud';
@@ -292,6 +310,12 @@ async function apiRequest(endpoint, options = {}) {
         // Parsear respuesta JSON
         const data = await response.json();
         console.log('API Response:', data);
+        
+        const etag = response.headers.get('ETag');
+        if (isGet && etag) {
+            etagCache.set(endpoint, { etag, data });
+        }
+        
         return data;
         
     } catch (error) {
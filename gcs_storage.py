@@ -1,23 +1,46 @@
 """
 Módulo mejorado para gestión de archivos en Google Cloud Storage
 Nueva estructura: users/{email}/uploads|processed/{año}/{mes}/archivo
+
+Los originales y textos procesados se guardan una sola vez por contenido en
+cas/ (direccionado por SHA-256); los archivos del usuario son referencias
+vacías que apuntan a ese objeto mediante metadata. El contenido sin
+referencias se borra con recolectar_cas_huerfanos (ver storage_base).
 """
 
 from google.cloud import storage
+from google.api_core.exceptions import NotFound, PreconditionFailed, TooManyRequests
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import Iterable, List, Optional, Dict, Union
 import os
 import json
 import tempfile
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import io
+import threading
+import time
+
+from storage_base import PREFIJO_CAS_ORIGINALES, PREFIJO_CAS_PROCESADOS, StorageBackend
+
 
+# Margen antes de la expiración en el que una URL firmada cacheada se renueva
+MARGEN_RENOVACION_URL_SEGUNDOS = 120
 
-class GCSStorageManagerV2:
+# Metadata de las referencias de usuario hacia cas/
+META_RUTA_CAS = "profego-cas"
+META_SHA256 = "profego-sha256"
+META_TAMANO = "profego-size"
+# Metadata de los objetos de cas/: último momento en que se deduplicó contra ellos
+META_ULTIMO_USO = "profego-last-used"
+
+
+class GCSStorageManagerV2(StorageBackend):
     """
     Manejador mejorado de almacenamiento en GCS con estructura por fechas
     """
     
+    nombre_backend = "gcs"
+    
     def __init__(self, bucket_name: str = "bucket-profe-go"):
         """
         Inicializa el manejador de GCS
@@ -42,62 +65,47 @@ class GCSStorageManagerV2:
         self.client = storage.Client()
         self.bucket = self.client.bucket(bucket_name)
         self.bucket_name = bucket_name
+        self.ubicacion = f"gs://{bucket_name}"
         self.usuarios_inicializados = set()
+        
+        # Cache de URLs firmadas: (email, tipo, archivo, disposición) -> entrada
+        # con la referencia y su versión (generation.metageneration)
+        self._urls_firmadas: Dict[tuple, Dict] = {}
+        self._urls_firmadas_lock = threading.Lock()
     
-    def _normalizar_email(self, email: str) -> str:
-        """
-        Normaliza el email para usarlo como nombre de carpeta
-        """
-        return email.replace("@", "_").replace(".", "_")
-    
-    def _obtener_fecha_path(self) -> str:
+    def esta_disponible(self) -> bool:
         """
-        Obtiene la ruta de fecha actual (año/mes)
+        Indica si el bucket existe y es accesible
         """
-        now = datetime.now()
-        return f"{now.year}/{now.month:02d}"
+        return self.bucket.exists()
     
-    def _construir_ruta(self, email: str, es_procesado: bool, nombre_archivo: str, 
-                       fecha_personalizada: Optional[str] = None) -> str:
+    def _buscar_blob(self, email: str, nombre_archivo: str, es_procesado: bool = False):
         """
-        Construye la ruta completa en el bucket con nueva estructura
-        
-        Args:
-            email: Email del usuario
-            es_procesado: Si es archivo procesado o original
-            nombre_archivo: Nombre del archivo
-            fecha_personalizada: Fecha en formato "YYYY/MM" (opcional)
+        Busca el blob de un archivo del usuario en cualquier fecha
         
         Returns:
-            Ruta: users/{email}/uploads|processed/{año}/{mes}/archivo
+            Blob encontrado o None si no existe
         """
         usuario_normalizado = self._normalizar_email(email)
         tipo_carpeta = "processed" if es_procesado else "uploads"
-        fecha_path = fecha_personalizada or self._obtener_fecha_path()
+        prefijo = f"users/{usuario_normalizado}/{tipo_carpeta}/"
+        
+        for blob in self.bucket.list_blobs(prefix=prefijo):
+            if blob.name.rsplit('/', 1)[-1] == nombre_archivo:
+                return blob
         
-        return f"users/{usuario_normalizado}/{tipo_carpeta}/{fecha_path}/{nombre_archivo}"
+        return None
     
-    def inicializar_usuario(self, email: str) -> bool:
+    def _crear_marcador_usuario(self, ruta: str, contenido: bytes) -> bool:
         """
-        Crea la estructura de carpetas para un nuevo usuario
+        Escribe el marcador de usuario con una sola escritura condicional
         """
         try:
-            usuario_normalizado = self._normalizar_email(email)
-            
-            # Crear archivos .keep en las carpetas base
-            for tipo in ["uploads", "processed"]:
-                ruta_keep = f"users/{usuario_normalizado}/{tipo}/.keep"
-                blob = self.bucket.blob(ruta_keep)
-                
-                if not blob.exists():
-                    blob.upload_from_string("")
-                    print(f"✓ Creada estructura: users/{usuario_normalizado}/{tipo}/")
-            
-            self.usuarios_inicializados.add(email)
+            self.bucket.blob(ruta).upload_from_string(
+                contenido, content_type="application/json", if_generation_match=0
+            )
             return True
-            
-        except Exception as e:
-            print(f"✗ Error inicializando usuario {email}: {e}")
+        except PreconditionFailed:
             return False
     
     def subir_archivo_desde_bytes(self, contenido: bytes, email: str, 
@@ -115,15 +123,13 @@ class GCSStorageManagerV2:
             Dict con información del archivo subido
         """
         try:
-            if email not in self.usuarios_inicializados:
-                self.inicializar_usuario(email)
-            
             # Construir ruta en GCS con fecha actual
             ruta_gcs = self._construir_ruta(email, es_procesado, nombre_archivo)
             
             # Subir archivo
             blob = self.bucket.blob(ruta_gcs)
             blob.upload_from_string(contenido)
+            self._invalidar_urls_firmadas(email, nombre_archivo, es_procesado)
             
             # Obtener información
             blob.reload()
@@ -143,6 +149,210 @@ class GCSStorageManagerV2:
                 'filename': nombre_archivo
             }
     
+    def _subir_contenido_cas(self, ruta_cas: str, ruta_local: Optional[str] = None,
+                             contenido: Optional[Union[bytes, Iterable[bytes]]] = None,
+                             content_type: Optional[str] = None) -> bool:
+        """
+        Sube un objeto a cas/ solo si aún no existe
+        
+        contenido puede ser bytes o un iterable de bloques de bytes; en ese
+        caso se sube con una subida reanudable a medida que llegan los bloques.
+        
+        Returns:
+            True si el contenido ya existía (deduplicado), False si se subió
+        """
+        blob = self.bucket.blob(ruta_cas)
+        try:
+            self._marcar_uso_cas(blob)
+            return True
+        except TooManyRequests:
+            # Otra subida del mismo contenido lo acaba de marcar: existe
+            return True
+        except NotFound:
+            pass
+        
+        try:
+            # if_generation_match=0: si otra petición lo creó entretanto, no se sobrescribe
+            if ruta_local is not None:
+                blob.upload_from_filename(ruta_local, content_type=content_type, if_generation_match=0)
+            elif isinstance(contenido, (bytes, bytearray)):
+                blob.upload_from_string(contenido, content_type=content_type, if_generation_match=0)
+            else:
+                escritor = blob.open("wb", content_type=content_type, if_generation_match=0)
+                # Si un bloque falla la subida no se cierra y GCS no crea el objeto
+                for bloque in contenido:
+                    escritor.write(bloque)
+                escritor.close()
+        except PreconditionFailed:
+            return True
+        
+        return False
+    
+    def _marcar_uso_cas(self, blob):
+        """
+        Marca un objeto de cas/ como recién usado
+        
+        Cambia su metageneration y su fecha de actualización, así que un
+        barrido de recolectar_cas_huerfanos en curso ya no lo borra.
+        Lanza NotFound si el objeto no existe.
+        """
+        blob.metadata = {META_ULTIMO_USO: datetime.now(timezone.utc).isoformat()}
+        blob.patch()
+    
+    def _crear_referencia(self, email: str, nombre_archivo: str, es_procesado: bool,
+                          ruta_cas: str, sha256: str, tamano: int,
+                          content_type: Optional[str] = None) -> Dict:
+        """
+        Crea el archivo del usuario como referencia vacía hacia un objeto de cas/
+        """
+        ruta_gcs = self._construir_ruta(email, es_procesado, nombre_archivo)
+        blob = self.bucket.blob(ruta_gcs)
+        blob.metadata = {
+            META_RUTA_CAS: ruta_cas,
+            META_SHA256: sha256,
+            META_TAMANO: str(tamano)
+        }
+        blob.upload_from_string(b"", content_type=content_type or "application/octet-stream")
+        self._invalidar_urls_firmadas(email, nombre_archivo, es_procesado)
+        
+        return {
+            'success': True,
+            'filename': nombre_archivo,
+            'path': ruta_gcs,
+            'size': tamano,
+            'url': f"gs://{self.bucket_name}/{ruta_cas}"
+        }
+    
+    def guardar_original_en_cas(self, ruta_local: Optional[str], sha256: str,
+                                content_type: Optional[str] = None,
+                                contenido: Optional[bytes] = None) -> bool:
+        """
+        Sube el contenido de un original a cas/ (solo si aún no existe)
+        
+        Returns:
+            True si el contenido ya existía (deduplicado), False si se subió
+        """
+        return self._subir_contenido_cas(
+            self._ruta_cas_original(sha256), ruta_local=ruta_local,
+            contenido=contenido, content_type=content_type
+        )
+    
+    def crear_referencia_original(self, sha256: str, tamano: int, email: str,
+                                  nombre_archivo: str,
+                                  content_type: Optional[str] = None) -> Dict:
+        """
+        Crea en uploads/ la referencia del usuario hacia el original en cas/
+        """
+        try:
+            return self._crear_referencia(
+                email, nombre_archivo, False, self._ruta_cas_original(sha256),
+                sha256, tamano, content_type
+            )
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'filename': nombre_archivo
+            }
+    
+    def existe_procesado_por_hash(self, sha256_original: str) -> bool:
+        """
+        Indica si el contenido con ese SHA-256 ya tiene texto procesado
+        """
+        try:
+            return self.bucket.blob(self._ruta_cas_procesado(sha256_original)).exists()
+        except Exception as e:
+            print(f"Error verificando procesado por hash: {e}")
+            return False
+    
+    def obtener_procesado_por_hash(self, sha256_original: str) -> Optional[bytes]:
+        """
+        Obtiene el texto procesado de un original ya convertido, sin OCR
+        
+        Returns:
+            Contenido del .txt procesado o None si ese contenido nunca se procesó
+        """
+        try:
+            blob = self.bucket.blob(self._ruta_cas_procesado(sha256_original))
+            if not blob.exists():
+                return None
+            return blob.download_as_bytes()
+        except Exception as e:
+            print(f"Error buscando procesado por hash: {e}")
+            return None
+    
+    def guardar_procesado_por_hash(self, sha256_original: str, contenido: bytes) -> bool:
+        """
+        Guarda el texto procesado de un original para reutilizarlo en el futuro
+        """
+        try:
+            self._subir_contenido_cas(
+                self._ruta_cas_procesado(sha256_original),
+                contenido=contenido,
+                content_type="text/plain; charset=utf-8"
+            )
+            return True
+        except Exception as e:
+            print(f"Error guardando procesado por hash: {e}")
+            return False
+    
+    def subir_procesado_deduplicado(self, sha256_original: str, email: str,
+                                    nombre_archivo: str,
+                                    contenido: Optional[Union[bytes, Iterable[bytes]]] = None) -> Dict:
+        """
+        Crea el .txt procesado del usuario como referencia al texto compartido
+        
+        Args:
+            sha256_original: Hash SHA-256 del archivo original
+            email: Email del usuario
+            nombre_archivo: Nombre del .txt procesado
+            contenido: Texto procesado (bytes o bloques de bytes); si es None
+                debe existir ya en cas/
+        
+        Returns:
+            Dict con información del archivo
+        """
+        try:
+            ruta_cas = self._ruta_cas_procesado(sha256_original)
+            blob = self.bucket.blob(ruta_cas)
+            
+            if contenido is not None:
+                self._subir_contenido_cas(ruta_cas, contenido=contenido, content_type="text/plain; charset=utf-8")
+                blob.reload()
+            else:
+                try:
+                    self._marcar_uso_cas(blob)
+                except TooManyRequests:
+                    blob.reload()
+            
+            return self._crear_referencia(
+                email, nombre_archivo, True, ruta_cas, sha256_original,
+                blob.size, "text/plain; charset=utf-8"
+            )
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'filename': nombre_archivo
+            }
+    
+    def _descargar_blob(self, blob) -> bytes:
+        """
+        Descarga el contenido de un blob, siguiendo la referencia a cas/ si la tiene
+        """
+        ruta_cas = (blob.metadata or {}).get(META_RUTA_CAS)
+        if ruta_cas:
+            return self.bucket.blob(ruta_cas).download_as_bytes()
+        return blob.download_as_bytes()
+    
+    def _tamano_blob(self, blob) -> int:
+        """
+        Tamaño lógico de un blob (el del contenido referenciado si es referencia)
+        """
+        tamano = (blob.metadata or {}).get(META_TAMANO)
+        return int(tamano) if tamano is not None else (blob.size or 0)
+    
     def obtener_archivo_bytes(self, email: str, nombre_archivo: str, 
                               es_procesado: bool = False) -> Optional[bytes]:
         """
@@ -157,53 +367,42 @@ class GCSStorageManagerV2:
             Contenido del archivo en bytes o None si no existe
         """
         try:
-            # Buscar el archivo en cualquier fecha
-            usuario_normalizado = self._normalizar_email(email)
-            tipo_carpeta = "processed" if es_procesado else "uploads"
-            prefijo = f"users/{usuario_normalizado}/{tipo_carpeta}/"
+            blob = self._buscar_blob(email, nombre_archivo, es_procesado)
+            if blob is None:
+                return None
             
-            # Buscar el archivo
-            blobs = list(self.bucket.list_blobs(prefix=prefijo))
-            for blob in blobs:
-                if blob.name.endswith(nombre_archivo):
-                    return blob.download_as_bytes()
-            
-            return None
+            return self._descargar_blob(blob)
             
         except Exception as e:
             print(f"Error obteniendo archivo: {e}")
             return None
     
-    def descargar_archivo(self, email: str, nombre_archivo: str, 
-                         destino_local: str, es_procesado: bool = False) -> Dict:
+    def _version_blob(self, blob) -> str:
+        """
+        Versión del objeto: cambia al reescribirlo o al modificar su metadata
+        """
+        return f"{blob.generation}.{blob.metageneration}"
+    
+    def obtener_archivo_condicional(self, email: str, nombre_archivo: str,
+                                    es_procesado: bool = False,
+                                    versiones_conocidas: Iterable[str] = ()) -> Optional[Dict]:
         """
-        Descarga un archivo del bucket a un archivo local
+        Obtiene un archivo solo si su generación no es una de las conocidas
         """
         try:
-            contenido = self.obtener_archivo_bytes(email, nombre_archivo, es_procesado)
-            
-            if contenido is None:
-                return {
-                    'success': False,
-                    'error': f'Archivo no encontrado: {nombre_archivo}'
-                }
-            
-            # Guardar en archivo local
-            with open(destino_local, 'wb') as f:
-                f.write(contenido)
+            blob = self._buscar_blob(email, nombre_archivo, es_procesado)
+            if blob is None:
+                return None
             
+            version = self._version_blob(blob)
             return {
-                'success': True,
-                'filename': nombre_archivo,
-                'local_path': destino_local,
-                'size': len(contenido)
+                'version': version,
+                'contenido': None if version in versiones_conocidas else self._descargar_blob(blob)
             }
             
         except Exception as e:
-            return {
-                'success': False,
-                'error': str(e)
-            }
+            print(f"Error obteniendo archivo: {e}")
+            return None
     
     def listar_archivos(self, email: str, tipo: str = "uploads") -> List[Dict]:
         """
@@ -223,7 +422,7 @@ class GCSStorageManagerV2:
             
             archivos = []
             for blob in blobs:
-                # Ignorar archivos .keep
+                # Ignorar archivos .keep (creados por versiones anteriores)
                 if blob.name.endswith('.keep'):
                     continue
                 
@@ -233,14 +432,16 @@ class GCSStorageManagerV2:
                     nombre_archivo = partes[-1]
                     fecha = f"{partes[-3]}/{partes[-2]}"
                     
+                    tamano = self._tamano_blob(blob)
                     archivos.append({
                         'name': nombre_archivo,
-                        'size': blob.size,
-                        'size_mb': f"{blob.size / (1024*1024):.2f}",
+                        'size': tamano,
+                        'size_mb': f"{tamano / (1024*1024):.2f}",
                         'date': fecha,
                         'created': blob.time_created.isoformat() if blob.time_created else "",
                         'path': blob.name,
-                        'content_type': blob.content_type
+                        'content_type': blob.content_type,
+                        'version': self._version_blob(blob)
                     })
             
             # Ordenar por fecha de creación (más reciente primero)
@@ -256,29 +457,22 @@ class GCSStorageManagerV2:
                         es_procesado: bool = False) -> Dict:
         """
         Elimina un archivo del bucket
+        
+        Si es una referencia, el contenido en cas/ se borra en el siguiente
+        barrido de recolectar_cas_huerfanos cuando ya nadie más lo usa.
         """
         try:
-            # Buscar el archivo en cualquier fecha
-            usuario_normalizado = self._normalizar_email(email)
-            tipo_carpeta = "processed" if es_procesado else "uploads"
-            prefijo = f"users/{usuario_normalizado}/{tipo_carpeta}/"
-            
-            # Buscar y eliminar el archivo
-            blobs = list(self.bucket.list_blobs(prefix=prefijo))
-            archivo_encontrado = False
+            blob = self._buscar_blob(email, nombre_archivo, es_procesado)
             
-            for blob in blobs:
-                if blob.name.endswith(nombre_archivo):
-                    blob.delete()
-                    archivo_encontrado = True
-                    break
-            
-            if not archivo_encontrado:
+            if blob is None:
                 return {
                     'success': False,
                     'error': f'Archivo no encontrado: {nombre_archivo}'
                 }
             
+            blob.delete()
+            self._invalidar_urls_firmadas(email, nombre_archivo, es_procesado)
+            
             return {
                 'success': True,
                 'filename': nombre_archivo,
@@ -291,78 +485,136 @@ class GCSStorageManagerV2:
                 'error': str(e)
             }
     
-    def obtener_info_almacenamiento(self, email: str) -> Dict:
+    def recolectar_cas_huerfanos(self, antiguedad_minima_segundos: float = 3600) -> Dict:
         """
-        Obtiene información detallada del almacenamiento del usuario
-        """
-        try:
-            archivos_subidos = self.listar_archivos(email, "uploads")
-            archivos_procesados = self.listar_archivos(email, "processed")
-            
-            total_size_subidos = sum(archivo['size'] for archivo in archivos_subidos)
-            total_size_procesados = sum(archivo['size'] for archivo in archivos_procesados)
-            total_size = total_size_subidos + total_size_procesados
-            
-            return {
-                "email": email,
-                "total_files": len(archivos_subidos) + len(archivos_procesados),
-                "uploaded_files": len(archivos_subidos),
-                "processed_files": len(archivos_procesados),
-                "total_size_bytes": total_size,
-                "total_size_mb": f"{total_size / (1024*1024):.2f}",
-                "uploaded_size_mb": f"{total_size_subidos / (1024*1024):.2f}",
-                "processed_size_mb": f"{total_size_procesados / (1024*1024):.2f}",
-                "storage_structure": {
-                    "uploads_by_month": self._agrupar_por_fecha(archivos_subidos),
-                    "processed_by_month": self._agrupar_por_fecha(archivos_procesados)
-                }
-            }
-            
-        except Exception as e:
-            return {
-                "error": str(e),
-                "email": email,
-                "total_files": 0
-            }
-    
-    def _agrupar_por_fecha(self, archivos: List[Dict]) -> Dict:
-        """
-        Agrupa archivos por año/mes
+        Borra los objetos de cas/ a los que ya no apunta ninguna referencia
+        
+        Primero se listan los candidatos de cas/ y después las referencias.
+        Cada borrado exige la metageneration listada: si una subida
+        deduplicó contra el objeto entretanto (_marcar_uso_cas), no se borra.
         """
-        agrupados = {}
-        for archivo in archivos:
-            fecha = archivo.get('date', 'sin_fecha')
-            if fecha not in agrupados:
-                agrupados[fecha] = []
-            agrupados[fecha].append(archivo['name'])
-        return agrupados
+        limite = datetime.now(timezone.utc) - timedelta(seconds=antiguedad_minima_segundos)
+        resultado = {'revisados': 0, 'eliminados': 0, 'bytes_liberados': 0}
+        
+        candidatos = []
+        for prefijo in (PREFIJO_CAS_ORIGINALES, PREFIJO_CAS_PROCESADOS):
+            for blob in self.bucket.list_blobs(prefix=f"{prefijo}/"):
+                resultado['revisados'] += 1
+                if blob.updated is not None and blob.updated < limite:
+                    candidatos.append(blob)
+        
+        if not candidatos:
+            return resultado
+        
+        # Originales y procesados se conservan mientras su original tenga referencias
+        referenciados = set()
+        for blob in self.bucket.list_blobs(prefix="users/"):
+            sha256 = (blob.metadata or {}).get(META_SHA256)
+            if sha256:
+                referenciados.add(sha256)
+        
+        for blob in candidatos:
+            if self._sha256_de_ruta_cas(blob.name) in referenciados:
+                continue
+            try:
+                blob.delete(if_metageneration_match=blob.metageneration)
+            except (NotFound, PreconditionFailed):
+                continue
+            resultado['eliminados'] += 1
+            resultado['bytes_liberados'] += blob.size or 0
+        
+        return resultado
     
     def obtener_url_descarga_temporal(self, email: str, nombre_archivo: str,
                                      es_procesado: bool = False, 
-                                     expiracion_minutos: int = 60) -> Optional[str]:
+                                     expiracion_minutos: int = 60,
+                                     disposicion: Optional[str] = None,
+                                     tamano_minimo: int = 0) -> Optional[str]:
         """
-        Genera una URL firmada temporal para descargar un archivo
+        Genera una URL firmada temporal (V4) para descargar un archivo
+        
+        Las URLs se cachean por objeto hasta poco antes de su expiración, de
+        modo que las descargas repetidas no vuelven a listar el bucket ni a
+        firmar. En cada acierto se relee la referencia (una sola lectura de
+        metadata): si otro worker la eliminó o la reemplazó, la entrada se
+        descarta.
+        
+        Args:
+            email: Email del usuario
+            nombre_archivo: Nombre del archivo
+            es_procesado: Si es archivo procesado o original
+            expiracion_minutos: Vigencia de la URL firmada
+            disposicion: Valor de Content-Disposition que GCS devolverá (opcional)
+            tamano_minimo: Si el objeto pesa menos que esto no se firma y se retorna None
+        
+        Returns:
+            URL firmada o None si no existe, es menor a tamano_minimo o no se pudo firmar
         """
+        tipo_carpeta = "processed" if es_procesado else "uploads"
+        clave = (email, tipo_carpeta, nombre_archivo, disposicion)
+        ahora = time.time()
+        
         try:
-            from datetime import timedelta
+            with self._urls_firmadas_lock:
+                entrada = self._urls_firmadas.get(clave)
             
-            # Buscar el archivo
-            usuario_normalizado = self._normalizar_email(email)
-            tipo_carpeta = "processed" if es_procesado else "uploads"
-            prefijo = f"users/{usuario_normalizado}/{tipo_carpeta}/"
+            blob = None
+            if entrada is not None and ahora < entrada['expira_en'] - MARGEN_RENOVACION_URL_SEGUNDOS:
+                blob = self.bucket.blob(entrada['referencia'])
+                try:
+                    blob.reload()
+                except NotFound:
+                    blob = None
+                    entrada = None
+                else:
+                    if self._version_blob(blob) != entrada['version']:
+                        entrada = None
+            else:
+                entrada = None
             
-            blobs = list(self.bucket.list_blobs(prefix=prefijo))
-            for blob in blobs:
-                if blob.name.endswith(nombre_archivo):
-                    url = blob.generate_signed_url(
-                        version="v4",
-                        expiration=timedelta(minutes=expiracion_minutos),
-                        method="GET"
-                    )
-                    return url
+            if entrada is None:
+                if blob is None:
+                    blob = self._buscar_blob(email, nombre_archivo, es_procesado)
+                if blob is None:
+                    self._invalidar_urls_firmadas(email, nombre_archivo, es_procesado)
+                    return None
+                
+                entrada = {
+                    'url': None,
+                    'referencia': blob.name,
+                    'version': self._version_blob(blob),
+                    'path': (blob.metadata or {}).get(META_RUTA_CAS, blob.name),
+                    'size': self._tamano_blob(blob),
+                    'expira_en': ahora + expiracion_minutos * 60
+                }
             
-            return None
+            if entrada['size'] >= tamano_minimo and not entrada['url']:
+                entrada['url'] = self.bucket.blob(entrada['path']).generate_signed_url(
+                    version="v4",
+                    expiration=timedelta(minutes=expiracion_minutos),
+                    method="GET",
+                    response_disposition=disposicion
+                )
+                entrada['expira_en'] = ahora + expiracion_minutos * 60
+            
+            with self._urls_firmadas_lock:
+                self._urls_firmadas[clave] = entrada
+            
+            if entrada['size'] < tamano_minimo:
+                return None
+            
+            return entrada['url']
             
         except Exception as e:
             print(f"Error generando URL: {e}")
-            return None
\ No newline at end of file
+            return None
+    
+    def _invalidar_urls_firmadas(self, email: str, nombre_archivo: str, es_procesado: bool = False):
+        """
+        Elimina del cache las URLs firmadas de un archivo
+        """
+        tipo_carpeta = "processed" if es_procesado else "uploads"
+        with self._urls_firmadas_lock:
+            for clave in list(self._urls_firmadas):
+                if clave[:3] == (email, tipo_carpeta, nombre_archivo):
+                    del self._urls_firmadas[clave]
@@ -16,6 +16,8 @@ from dotenv import load_dotenv
 from json_repair import repair_json
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from tracing import span
+
 load_dotenv()
 
 # Configurar logging
@@ -431,11 +433,13 @@ No se proporcionó diagnóstico específico del grupo.
                 }
             
             # Construir prompt
-            prompt = self._build_prompt(plan_text, diagnostico_text)
+            with span("gemini.prompt"):
+                prompt = self._build_prompt(plan_text, diagnostico_text)
             
             # Generar respuesta
             logger.info("📤 Enviando solicitud a Gemini...")
-            response = self.model.generate_content(prompt)
+            with span("gemini.llamada"):
+                response = self.model.generate_content(prompt)
             
             if not response or not response.text:
                 return {
@@ -447,13 +451,15 @@ No se proporcionó diagnóstico específico del grupo.
             logger.info(f"📏 Longitud de respuesta: {len(response.text)} caracteres")
             
             # Limpiar y parsear respuesta
-            cleaned_response = self._clean_json_response(response.text)
+            with span("gemini.parseo"):
+                cleaned_response = self._clean_json_response(response.text)
             logger.info(f"📄 Respuesta limpiada (primeros 200 chars): {cleaned_response[:200]}...")
             
             # Intentar parsear JSON
             plan_data = None
             try:
-                plan_data = json.loads(cleaned_response)
+                with span("gemini.parseo"):
+                    plan_data = json.loads(cleaned_response)
                 logger.info("✅ JSON parseado correctamente en primer intento")
             except json.JSONDecodeError as e:
                 logger.error(f"❌ Error parseando JSON: {e}")
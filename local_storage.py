@@ -0,0 +1,566 @@
+"""
+Backend de almacenamiento en disco local con la misma interfaz que GCS
+Estructura: {base_dir}/users/{email}/uploads|processed/{año}/{mes}/archivo
+
+Pensado para desarrollo sin credenciales de Google y para benchmarks:
+- Escrituras atómicas (archivo temporal en el mismo directorio + os.replace)
+- Lecturas con mmap
+- Deduplicación por contenido en {base_dir}/cas/ con hardlinks hacia el
+  archivo del usuario (copia si el sistema de archivos no los soporta); un
+  objeto de cas/ con un solo enlace ya no tiene referencias y lo borra
+  recolectar_cas_huerfanos
+- URLs temporales firmadas con HMAC, servidas por la API en RUTA_DESCARGA_LOCAL
+"""
+
+from pathlib import Path
+from typing import Iterable, List, Optional, Dict, Union
+from datetime import datetime
+from urllib.parse import urlencode
+import os
+import glob
+import hmac
+import hashlib
+import mimetypes
+import mmap
+import secrets
+import shutil
+import tempfile
+import time
+
+from storage_base import PREFIJO_CAS_ORIGINALES, PREFIJO_CAS_PROCESADOS, StorageBackend
+
+
+# Endpoint de la API que sirve las URLs firmadas locales
+RUTA_DESCARGA_LOCAL = "/api/storage/local"
+
+# Prefijo de los temporales de escritura (se ignoran al listar)
+PREFIJO_TEMPORAL = ".tmp-"
+
+
+class LocalStorageManager(StorageBackend):
+    """
+    Manejador de almacenamiento en disco local con estructura por fechas
+    """
+    
+    nombre_backend = "local"
+    
+    def __init__(self, base_dir: str = "./local_storage", secreto: Optional[str] = None):
+        """
+        Inicializa el almacenamiento local
+        
+        Args:
+            base_dir: Directorio raíz del almacenamiento
+            secreto: Clave para firmar URLs (por defecto LOCAL_STORAGE_SECRET;
+                si no existe se genera una por proceso y las URLs no
+                sobreviven a un reinicio)
+        """
+        self.base_dir = Path(base_dir).resolve()
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.ubicacion = str(self.base_dir)
+        self.usuarios_inicializados = set()
+        
+        secreto = secreto or os.getenv("LOCAL_STORAGE_SECRET")
+        self._secreto = secreto.encode() if secreto else secrets.token_bytes(32)
+        
+        print(f"✓ Almacenamiento local en {self.base_dir}")
+    
+    # ---------------- Utilidades de disco ----------------
+    
+    def _ruta_absoluta(self, ruta_relativa: str) -> Path:
+        """
+        Convierte una ruta del layout (users/..., cas/...) en ruta de disco
+        """
+        return self.base_dir / ruta_relativa
+    
+    def _validar_nombre(self, nombre_archivo: str):
+        """
+        Evita que un nombre de archivo salga de la carpeta del usuario
+        """
+        if (not nombre_archivo or nombre_archivo in (".", "..")
+                or Path(nombre_archivo).name != nombre_archivo
+                or nombre_archivo.startswith(PREFIJO_TEMPORAL)):
+            raise ValueError(f"Nombre de archivo inválido: {nombre_archivo}")
+    
+    def _escribir_atomico(self, destino: Path, contenido: bytes):
+        """
+        Escribe un archivo de forma atómica: los lectores ven el contenido
+        anterior o el nuevo completo, nunca uno a medias
+        """
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        fd, ruta_tmp = tempfile.mkstemp(dir=destino.parent, prefix=PREFIJO_TEMPORAL)
+        
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(contenido)
+            os.replace(ruta_tmp, destino)
+        except BaseException:
+            if os.path.exists(ruta_tmp):
+                os.remove(ruta_tmp)
+            raise
+    
+    def _enlazar_atomico(self, origen: Path, destino: Path):
+        """
+        Hace que destino apunte al contenido de origen (hardlink o copia),
+        reemplazando de forma atómica lo que hubiera
+        """
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        ruta_tmp = destino.parent / f"{PREFIJO_TEMPORAL}{secrets.token_hex(8)}"
+        
+        try:
+            try:
+                os.link(origen, ruta_tmp)
+            except OSError:
+                shutil.copyfile(origen, ruta_tmp)
+            os.replace(ruta_tmp, destino)
+        except BaseException:
+            if ruta_tmp.exists():
+                ruta_tmp.unlink()
+            raise
+    
+    def _crear_en_cas(self, ruta_cas: str, ruta_local: Optional[str] = None,
+                      contenido: Optional[Union[bytes, Iterable[bytes]]] = None) -> bool:
+        """
+        Crea un objeto en cas/ solo si aún no existe
+        
+        Returns:
+            True si el contenido ya existía (deduplicado), False si se escribió
+        """
+        destino = self._ruta_absoluta(ruta_cas)
+        if self._marcar_uso_cas(destino):
+            return True
+        
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        fd, ruta_tmp = tempfile.mkstemp(dir=destino.parent, prefix=PREFIJO_TEMPORAL)
+        
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if ruta_local is not None:
+                    with open(ruta_local, 'rb') as origen:
+                        shutil.copyfileobj(origen, f)
+                elif isinstance(contenido, (bytes, bytearray)):
+                    f.write(contenido)
+                else:
+                    for bloque in contenido:
+                        f.write(bloque)
+            
+            # os.link falla si el destino ya existe: si otra petición lo creó
+            # entretanto, se conserva el suyo
+            try:
+                os.link(ruta_tmp, destino)
+            except FileExistsError:
+                return True
+            except OSError:
+                os.replace(ruta_tmp, destino)
+                return False
+            
+            return False
+        finally:
+            if os.path.exists(ruta_tmp):
+                os.remove(ruta_tmp)
+    
+    def _marcar_uso_cas(self, ruta: Path) -> bool:
+        """
+        Marca un objeto de cas/ como recién usado (mtime) para que el
+        barrido de recolectar_cas_huerfanos no lo borre
+        
+        Returns:
+            False si el objeto no existe
+        """
+        try:
+            os.utime(ruta)
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def _leer_archivo(self, ruta: Path) -> bytes:
+        """
+        Lee un archivo completo mediante mmap
+        """
+        with open(ruta, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                return mapa[:]
+    
+    def _buscar_archivo(self, email: str, nombre_archivo: str,
+                        es_procesado: bool = False) -> Optional[Path]:
+        """
+        Busca un archivo del usuario en cualquier fecha
+        
+        Returns:
+            Ruta en disco o None si no existe
+        """
+        self._validar_nombre(nombre_archivo)
+        usuario_normalizado = self._normalizar_email(email)
+        tipo_carpeta = "processed" if es_procesado else "uploads"
+        patron = self.base_dir / "users" / usuario_normalizado / tipo_carpeta / "*" / "*"
+        
+        coincidencias = sorted(glob.glob(str(patron / glob.escape(nombre_archivo))))
+        return Path(coincidencias[0]) if coincidencias else None
+    
+    def _info_archivo(self, ruta: Path, nombre_archivo: str) -> Dict:
+        """
+        Información de un archivo del usuario tras escribirlo
+        """
+        ruta_relativa = ruta.relative_to(self.base_dir).as_posix()
+        return {
+            'success': True,
+            'filename': nombre_archivo,
+            'path': ruta_relativa,
+            'size': ruta.stat().st_size,
+            'url': ruta.as_uri()
+        }
+    
+    # ---------------- Interfaz StorageBackend ----------------
+    
+    def esta_disponible(self) -> bool:
+        """
+        Indica si el directorio base existe y se puede escribir
+        """
+        return self.base_dir.is_dir() and os.access(self.base_dir, os.W_OK)
+    
+    def _crear_marcador_usuario(self, ruta: str, contenido: bytes) -> bool:
+        """
+        Escribe el marcador de usuario solo si no existe (apertura exclusiva)
+        """
+        destino = self._ruta_absoluta(ruta)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        
+        try:
+            with open(destino, 'xb') as f:
+                f.write(contenido)
+            return True
+        except FileExistsError:
+            return False
+    
+    def subir_archivo_desde_bytes(self, contenido: bytes, email: str,
+                                  nombre_archivo: str, es_procesado: bool = False) -> Dict:
+        """
+        Guarda un archivo desde bytes
+        """
+        try:
+            self._validar_nombre(nombre_archivo)
+            destino = self._ruta_absoluta(self._construir_ruta(email, es_procesado, nombre_archivo))
+            self._escribir_atomico(destino, contenido)
+            
+            return self._info_archivo(destino, nombre_archivo)
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'filename': nombre_archivo
+            }
+    
+    def guardar_original_en_cas(self, ruta_local: Optional[str], sha256: str,
+                                content_type: Optional[str] = None,
+                                contenido: Optional[bytes] = None) -> bool:
+        """
+        Guarda el contenido de un original en cas/ (solo si aún no existe)
+        """
+        return self._crear_en_cas(self._ruta_cas_original(sha256), ruta_local=ruta_local, contenido=contenido)
+    
+    def crear_referencia_original(self, sha256: str, tamano: int, email: str,
+                                  nombre_archivo: str,
+                                  content_type: Optional[str] = None) -> Dict:
+        """
+        Enlaza el original en cas/ con el nombre del usuario en uploads/
+        """
+        try:
+            self._validar_nombre(nombre_archivo)
+            destino = self._ruta_absoluta(self._construir_ruta(email, False, nombre_archivo))
+            self._enlazar_atomico(self._ruta_absoluta(self._ruta_cas_original(sha256)), destino)
+            
+            return self._info_archivo(destino, nombre_archivo)
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'filename': nombre_archivo
+            }
+    
+    def existe_procesado_por_hash(self, sha256_original: str) -> bool:
+        """
+        Indica si el contenido con ese SHA-256 ya tiene texto procesado
+        """
+        return self._ruta_absoluta(self._ruta_cas_procesado(sha256_original)).exists()
+    
+    def obtener_procesado_por_hash(self, sha256_original: str) -> Optional[bytes]:
+        """
+        Obtiene el texto procesado de un original ya convertido, sin OCR
+        """
+        try:
+            return self._leer_archivo(self._ruta_absoluta(self._ruta_cas_procesado(sha256_original)))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error buscando procesado por hash: {e}")
+            return None
+    
+    def guardar_procesado_por_hash(self, sha256_original: str, contenido: bytes) -> bool:
+        """
+        Guarda el texto procesado de un original para reutilizarlo en el futuro
+        """
+        try:
+            self._crear_en_cas(self._ruta_cas_procesado(sha256_original), contenido=contenido)
+            return True
+        except Exception as e:
+            print(f"Error guardando procesado por hash: {e}")
+            return False
+    
+    def subir_procesado_deduplicado(self, sha256_original: str, email: str,
+                                    nombre_archivo: str,
+                                    contenido: Optional[Union[bytes, Iterable[bytes]]] = None) -> Dict:
+        """
+        Enlaza el .txt procesado del usuario con el texto compartido
+        """
+        try:
+            self._validar_nombre(nombre_archivo)
+            ruta_cas = self._ruta_cas_procesado(sha256_original)
+            
+            if contenido is not None:
+                self._crear_en_cas(ruta_cas, contenido=contenido)
+            else:
+                self._marcar_uso_cas(self._ruta_absoluta(ruta_cas))
+            
+            destino = self._ruta_absoluta(self._construir_ruta(email, True, nombre_archivo))
+            self._enlazar_atomico(self._ruta_absoluta(ruta_cas), destino)
+            
+            return self._info_archivo(destino, nombre_archivo)
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'filename': nombre_archivo
+            }
+    
+    def obtener_archivo_bytes(self, email: str, nombre_archivo: str,
+                              es_procesado: bool = False) -> Optional[bytes]:
+        """
+        Obtiene el contenido de un archivo como bytes
+        """
+        try:
+            ruta = self._buscar_archivo(email, nombre_archivo, es_procesado)
+            if ruta is None:
+                return None
+            
+            return self._leer_archivo(ruta)
+        
+        except Exception as e:
+            print(f"Error obteniendo archivo: {e}")
+            return None
+    
+    def _version_archivo(self, info: os.stat_result) -> str:
+        """
+        Versión del archivo: las escrituras atómicas crean un inodo nuevo
+        """
+        return f"{info.st_ino:x}-{info.st_mtime_ns:x}-{info.st_size:x}"
+    
+    def obtener_archivo_condicional(self, email: str, nombre_archivo: str,
+                                    es_procesado: bool = False,
+                                    versiones_conocidas: Iterable[str] = ()) -> Optional[Dict]:
+        """
+        Obtiene un archivo solo si su versión no es una de las conocidas
+        """
+        try:
+            ruta = self._buscar_archivo(email, nombre_archivo, es_procesado)
+            if ruta is None:
+                return None
+            
+            version = self._version_archivo(ruta.stat())
+            return {
+                'version': version,
+                'contenido': None if version in versiones_conocidas else self._leer_archivo(ruta)
+            }
+        
+        except Exception as e:
+            print(f"Error obteniendo archivo: {e}")
+            return None
+    
+    def listar_archivos(self, email: str, tipo: str = "uploads") -> List[Dict]:
+        """
+        Lista todos los archivos de un usuario
+        
+        Args:
+            email: Email del usuario
+            tipo: "uploads" o "processed"
+        
+        Returns:
+            Lista de diccionarios con información de archivos
+        """
+        try:
+            usuario_normalizado = self._normalizar_email(email)
+            carpeta_tipo = self.base_dir / "users" / usuario_normalizado / tipo
+            
+            archivos = []
+            for ruta in glob.glob(str(carpeta_tipo / "*" / "*" / "*")):
+                ruta = Path(ruta)
+                nombre_archivo = ruta.name
+                
+                if nombre_archivo.startswith(PREFIJO_TEMPORAL) or nombre_archivo.endswith('.keep'):
+                    continue
+                
+                info = ruta.stat()
+                fecha = f"{ruta.parent.parent.name}/{ruta.parent.name}"
+                
+                archivos.append({
+                    'name': nombre_archivo,
+                    'size': info.st_size,
+                    'size_mb': f"{info.st_size / (1024*1024):.2f}",
+                    'date': fecha,
+                    'created': datetime.fromtimestamp(info.st_mtime).isoformat(),
+                    'path': ruta.relative_to(self.base_dir).as_posix(),
+                    'content_type': mimetypes.guess_type(nombre_archivo)[0],
+                    'version': self._version_archivo(info)
+                })
+            
+            # Ordenar por fecha de creación (más reciente primero)
+            archivos.sort(key=lambda x: x['created'], reverse=True)
+            
+            return archivos
+        
+        except Exception as e:
+            print(f"Error listando archivos: {e}")
+            return []
+    
+    def eliminar_archivo(self, email: str, nombre_archivo: str,
+                        es_procesado: bool = False) -> Dict:
+        """
+        Elimina un archivo del usuario
+        
+        El contenido en cas/ se borra en el siguiente barrido de
+        recolectar_cas_huerfanos si ya no lo enlaza ningún otro archivo.
+        """
+        try:
+            ruta = self._buscar_archivo(email, nombre_archivo, es_procesado)
+            
+            if ruta is None:
+                return {
+                    'success': False,
+                    'error': f'Archivo no encontrado: {nombre_archivo}'
+                }
+            
+            ruta.unlink()
+            
+            return {
+                'success': True,
+                'filename': nombre_archivo,
+                'message': f'Archivo {nombre_archivo} eliminado correctamente'
+            }
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def recolectar_cas_huerfanos(self, antiguedad_minima_segundos: float = 3600) -> Dict:
+        """
+        Borra los objetos de cas/ que ya no enlaza ningún archivo de users/
+        
+        Los archivos del usuario son hardlinks al objeto de cas/, así que un
+        objeto con st_nlink == 1 no tiene referencias. El texto procesado se
+        conserva mientras su original siga enlazado. Si el sistema de
+        archivos no admite hardlinks los usuarios tienen su propia copia y
+        cas/ funciona solo como cache.
+        """
+        limite = time.time() - antiguedad_minima_segundos
+        resultado = {'revisados': 0, 'eliminados': 0, 'bytes_liberados': 0}
+        originales_en_uso = set()
+        
+        for prefijo in (PREFIJO_CAS_ORIGINALES, PREFIJO_CAS_PROCESADOS):
+            for ruta in glob.glob(str(self._ruta_absoluta(prefijo) / "*" / "*")):
+                ruta = Path(ruta)
+                if ruta.name.startswith(PREFIJO_TEMPORAL):
+                    continue
+                
+                resultado['revisados'] += 1
+                sha256 = self._sha256_de_ruta_cas(ruta.name)
+                
+                try:
+                    info = ruta.stat()
+                except FileNotFoundError:
+                    continue
+                
+                if info.st_nlink > 1 or info.st_mtime >= limite:
+                    originales_en_uso.add(sha256)
+                    continue
+                if prefijo == PREFIJO_CAS_PROCESADOS and sha256 in originales_en_uso:
+                    continue
+                
+                # Volver a comprobar justo antes de borrar: pudo enlazarse o usarse entretanto
+                try:
+                    actual = ruta.stat()
+                    if actual.st_nlink > 1 or actual.st_mtime_ns != info.st_mtime_ns:
+                        continue
+                    ruta.unlink()
+                except FileNotFoundError:
+                    continue
+                resultado['eliminados'] += 1
+                resultado['bytes_liberados'] += info.st_size
+        
+        return resultado
+    
+    # ---------------- URLs firmadas ----------------
+    
+    def _firmar(self, ruta_relativa: str, expira: int, disposicion: str) -> str:
+        """
+        Firma HMAC-SHA256 de una URL de descarga local
+        """
+        mensaje = f"{ruta_relativa}\n{expira}\n{disposicion}".encode()
+        return hmac.new(self._secreto, mensaje, hashlib.sha256).hexdigest()
+    
+    def obtener_url_descarga_temporal(self, email: str, nombre_archivo: str,
+                                     es_procesado: bool = False,
+                                     expiracion_minutos: int = 60,
+                                     disposicion: Optional[str] = None,
+                                     tamano_minimo: int = 0) -> Optional[str]:
+        """
+        Genera una URL temporal firmada, relativa a la API, para descargar un archivo
+        
+        Returns:
+            URL o None si no existe o es menor a tamano_minimo
+        """
+        try:
+            ruta = self._buscar_archivo(email, nombre_archivo, es_procesado)
+            if ruta is None or ruta.stat().st_size < tamano_minimo:
+                return None
+            
+            ruta_relativa = ruta.relative_to(self.base_dir).as_posix()
+            expira = int(time.time()) + expiracion_minutos * 60
+            disposicion = disposicion or ""
+            
+            parametros = urlencode({
+                'path': ruta_relativa,
+                'expires': expira,
+                'disposition': disposicion,
+                'signature': self._firmar(ruta_relativa, expira, disposicion)
+            })
+            return f"{RUTA_DESCARGA_LOCAL}?{parametros}"
+        
+        except Exception as e:
+            print(f"Error generando URL: {e}")
+            return None
+    
+    def verificar_url_firmada(self, ruta_relativa: str, expira: int,
+                              disposicion: str, firma: str) -> Optional[Path]:
+        """
+        Valida los parámetros de una URL generada por obtener_url_descarga_temporal
+        
+        Returns:
+            Ruta en disco del archivo o None si la firma no es válida, expiró
+            o el archivo ya no existe
+        """
+        if expira < time.time():
+            return None
+        
+        if not hmac.compare_digest(self._firmar(ruta_relativa, expira, disposicion), firma):
+            return None
+        
+        ruta = self._ruta_absoluta(ruta_relativa).resolve()
+        if self.base_dir not in ruta.parents or not ruta.is_file():
+            return None
+        
+        return ruta
@@ -1,7 +1,8 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Header, Query, Request
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Header, Query, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, RedirectResponse, Response, ORJSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
@@ -11,31 +12,51 @@ import os
 import re
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple, Union
 import json
 from datetime import datetime
 import tempfile
 import io
 import time
 import uuid
+import asyncio
+import hashlib
 import logging
-from docx import Document
-from docx.shared import Pt, RGBColor, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+import numpy as np
 from rag_system import get_rag_system, initialize_rag_system
+from rag_system.catalog import crear_catalogo_biblioteca, LibrarySnapshot
 from typing import List, Dict, Optional
 import json
 from pathlib import Path
 
 # Importar el módulo OCR
-from PruebaOcr import process_file_to_txt, check_supported_file, get_text_only
+from PruebaOcr import (
+    stream_converted_text, check_supported_file, get_text_only,
+    format_converted_text, strip_converted_header, shutdown_executors,
+    InMemoryFile, file_name
+)
 
-# Importar el módulo de Google Cloud Storage mejorado
-from gcs_storage import GCSStorageManagerV2
+# Importar el backend de almacenamiento (GCS o disco local)
+from storage_base import crear_storage_backend
 
 # Importar el servicio de Gemini AI
 from gemini_service import generar_plan_estudio
 
+# Documento Word de los planes
+from docx_renderer import (
+    generar_documento_word, propiedades_documento_word,
+    VERSION_DOCUMENTO_WORD, DOCX_MEDIA_TYPE
+)
+
+# Verificación local de tokens de Firebase
+from firebase_auth import crear_verificador_firebase, CertificadosNoDisponibles
+
+# Compresión brotli/gzip de respuestas
+from compresion import CompresionMiddleware
+
+# Tiempos por etapa de cada petición y métricas para /metrics
+from tracing import span, trazar, traza_actual, metricas
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -46,6 +67,9 @@ load_dotenv()
 app = FastAPI(title="ProfeGo API", version="2.0.0")
 rag_system = None
 
+# Biblioteca RAG en memoria (análisis, debug y health leen de aquí)
+library_catalog = crear_catalogo_biblioteca()
+
 # Rate Limiter
 limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
@@ -69,15 +93,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Content-Disposition"],
 )
 
+# Planes y análisis son JSON grandes: se comprimen a partir de COMPRESSION_MIN_BYTES
+app.add_middleware(CompresionMiddleware)
+
 # Configuración de archivos
 MAX_FILE_SIZE = 80 * 1024 * 1024  # 80MB
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024  # Lectura de uploads en bloques de 1MB
+# Uploads hasta este tamaño se procesan en memoria; los mayores se vuelcan a un archivo temporal
+UPLOAD_IN_MEMORY_MAX_SIZE = int(float(os.getenv("UPLOAD_IN_MEMORY_MAX_MB", "8")) * 1024 * 1024)
 ALLOWED_EXTENSIONS = {
     '.pdf', '.doc', '.docx', '.txt', '.jpg', '.jpeg', 
     '.png', '.xlsx', '.xls', '.csv', '.json', '.xml'
 }
 
+# Descargas grandes: redirección a URL firmada (GCS o /api/storage/local) en lugar de proxy
+REDIRECT_MIN_SIZE = int(os.getenv("REDIRECT_MIN_SIZE_MB", "5")) * 1024 * 1024
+SIGNED_URL_EXPIRATION_MINUTES = int(os.getenv("SIGNED_URL_EXPIRATION_MINUTES", "15"))
+
 # Obtener directorio base del script
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FRONTEND_DIR = os.path.join(BASE_DIR, "frontend")
@@ -104,10 +139,11 @@ firebaseConfig = {
 firebase = pyrebase.initialize_app(firebaseConfig)
 auth = firebase.auth()
 
-# Google Cloud Storage Manager V2
-gcs_storage = GCSStorageManagerV2(
-    bucket_name=os.getenv("GCS_BUCKET_NAME", "bucket-profe-go")
-)
+# Verifica los ID tokens en el proceso (None sin FIREBASE_PROJECT_ID: se consulta a Firebase)
+verificador_tokens = crear_verificador_firebase()
+
+# Almacenamiento: GCS por defecto, disco local con STORAGE_BACKEND=local
+storage_manager = crear_storage_backend()
 
 # ---------------- Modelos Pydantic ----------------
 class UserLogin(BaseModel):
@@ -151,6 +187,7 @@ class PlanResponse(BaseModel):
     plan_data: Optional[Dict] = None
     error: Optional[str] = None
     processing_time: Optional[float] = None
+    timings: Optional[Dict[str, float]] = None  # Milisegundos por etapa
 
 # ---------------- Utilidades ----------------
 class ProfeGoUtils:
@@ -189,6 +226,201 @@ class ProfeGoUtils:
         ext = os.path.splitext(filename)[1].lower()
         return ext in ALLOWED_EXTENSIONS
 
+# ---------------- Validación condicional (ETag) ----------------
+# Las respuestas se guardan en el navegador pero se revalidan siempre: con el
+# ETag vigente la API responde 304 sin cuerpo
+CACHE_CONTROL_VALIDAR = "private, no-cache"
+
+def etags_if_none_match(if_none_match: Optional[str]) -> set:
+    """Valores de If-None-Match sin W/ ni comillas (las versiones del almacenamiento)"""
+    if not if_none_match:
+        return set()
+    return {valor.strip().removeprefix('W/').strip('"') for valor in if_none_match.split(',')}
+
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara If-None-Match con un ETag (comparación débil, admite listas y *)"""
+    etiquetas = etags_if_none_match(if_none_match)
+    return '*' in etiquetas or etag.removeprefix('W/').strip('"') in etiquetas
+
+def etag_de_version(version: str) -> str:
+    """ETag de un objeto a partir de su versión en el almacenamiento"""
+    return f'"{version}"'
+
+def etag_de_archivos(archivos: List[Dict]) -> str:
+    """ETag de un listado: cambia si se agrega, elimina o reescribe un archivo"""
+    huella = hashlib.sha256()
+    for archivo in sorted(archivos, key=lambda a: a['path']):
+        huella.update(f"{archivo['path']}\0{archivo.get('version', '')}\n".encode('utf-8'))
+    return f'W/"{huella.hexdigest()[:32]}"'
+
+def cabeceras_validacion(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL_VALIDAR}
+
+def respuesta_no_modificada(etag: str) -> Response:
+    """304 Not Modified con los mismos validadores"""
+    return Response(status_code=304, headers=cabeceras_validacion(etag))
+
+# ---------------- Recepción de archivos en streaming ----------------
+async def recibir_archivo_en_stream(file: UploadFile, email: str, crear_referencia: bool = True) -> Dict:
+    """
+    Recibe un UploadFile por bloques sin cargarlo completo en memoria.
+    
+    Cada bloque se valida contra MAX_FILE_SIZE y se agrega al hash SHA-256.
+    Hasta UPLOAD_IN_MEMORY_MAX_SIZE los bloques se conservan en memoria y el
+    OCR lee directamente de ellos (InMemoryFile); si el archivo es mayor se
+    vuelca a un archivo temporal y se sigue escribiendo ahí. Con el hash
+    completo el original se guarda de forma deduplicada: si el contenido ya
+    existe en el bucket solo se crea la referencia del usuario, sin volver a
+    subir bytes.
+    
+    Con crear_referencia=False el contenido solo se guarda en cas/ y el
+    archivo no aparece en los uploads del usuario hasta que se llame a
+    crear_referencia_original (path queda en None).
+    
+    Returns:
+        Dict con success, archivo (InMemoryFile o ruta temporal), tmp_path
+        (None si quedó en memoria), size, sha256, content_type, deduplicado
+        y path; o error (too_large=True si se excedió el límite)
+    """
+    resultado = {
+        'success': False,
+        'archivo': None,
+        'tmp_path': None,
+        'size': 0,
+        'sha256': None,
+        'deduplicado': False,
+        'error': None,
+        'too_large': False
+    }
+    
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        resultado['error'] = "Archivo muy grande (máx: 80MB)"
+        resultado['too_large'] = True
+        return resultado
+    
+    hasher = hashlib.sha256()
+    total = 0
+    bloques = []
+    tmp_file = None
+    tmp_path = None
+    
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            
+            total += len(chunk)
+            if total > MAX_FILE_SIZE:
+                resultado['error'] = "Archivo muy grande (máx: 80MB)"
+                resultado['too_large'] = True
+                break
+            
+            hasher.update(chunk)
+            
+            if tmp_file is None and total > UPLOAD_IN_MEMORY_MAX_SIZE:
+                tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix)
+                tmp_path = tmp_file.name
+                for bloque in bloques:
+                    tmp_file.write(bloque)
+                bloques = []
+            
+            if tmp_file is not None:
+                tmp_file.write(chunk)
+            else:
+                bloques.append(chunk)
+        
+        if tmp_file is not None:
+            tmp_file.close()
+        
+        if resultado['too_large']:
+            if tmp_path:
+                os.remove(tmp_path)
+            return resultado
+        
+        sha256 = hasher.hexdigest()
+        contenido = None if tmp_path else b"".join(bloques)
+        bloques = []
+        
+        if crear_referencia:
+            subida = await run_in_threadpool(
+                storage_manager.subir_original_deduplicado,
+                tmp_path, sha256, total, email, file.filename, file.content_type, contenido
+            )
+        else:
+            subida = {
+                'success': True,
+                'path': None,
+                'deduplicado': await run_in_threadpool(
+                    storage_manager.guardar_original_en_cas,
+                    tmp_path, sha256, file.content_type, contenido
+                )
+            }
+        
+        if not subida['success']:
+            if tmp_path:
+                os.remove(tmp_path)
+            resultado['error'] = "Error guardando el archivo"
+            return resultado
+        
+        resultado.update({
+            'success': True,
+            'archivo': tmp_path or InMemoryFile(contenido, file.filename),
+            'tmp_path': tmp_path,
+            'size': total,
+            'sha256': sha256,
+            'content_type': file.content_type,
+            'deduplicado': subida.get('deduplicado', False),
+            'path': subida['path']
+        })
+        return resultado
+        
+    except Exception as e:
+        logger.error(f"❌ Error recibiendo {file.filename}: {e}")
+        if tmp_file is not None:
+            tmp_file.close()
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        resultado['error'] = "Error guardando el archivo"
+        return resultado
+
+async def obtener_texto_por_hash(archivo: Union[str, InMemoryFile], sha256: str) -> Dict:
+    """
+    Obtiene el texto de un archivo recibido reutilizando el procesado por hash.
+    
+    archivo es el de recibir_archivo_en_stream: una ruta temporal o un
+    InMemoryFile.
+    
+    Si el mismo contenido ya fue procesado (por cualquier usuario) se evita el
+    OCR; si no, se extrae el texto y se guarda para futuras subidas.
+    
+    Returns:
+        Dict con el mismo formato que get_text_only
+    """
+    with span("ocr.cache_hash"):
+        contenido = await run_in_threadpool(storage_manager.obtener_procesado_por_hash, sha256)
+    
+    if contenido is not None:
+        logger.info(f"♻️ Texto reutilizado por hash: {sha256[:12]}")
+        return {
+            'success': True,
+            'text': strip_converted_header(contenido.decode('utf-8-sig', errors='replace')),
+            'file_type': None,
+            'error': None
+        }
+    
+    with span("ocr.extraccion"):
+        resultado = await run_in_threadpool(get_text_only, archivo)
+    
+    if resultado['success'] and resultado['text']:
+        contenido = format_converted_text(
+            resultado['text'], file_name(archivo), resultado['file_type']
+        ).encode('utf-8-sig', errors='replace')
+        with span("ocr.cache_hash"):
+            await run_in_threadpool(storage_manager.guardar_procesado_por_hash, sha256, contenido)
+    
+    return resultado
+
 # ---------------- Dependency para autenticación ----------------
 async def get_current_user(authorization: str = Header(None)):
     """Verificar token de Firebase y extraer usuario"""
@@ -197,8 +429,23 @@ async def get_current_user(authorization: str = Header(None)):
     
     token = authorization.replace("Bearer ", "")
     
+    if verificador_tokens is not None:
+        try:
+            claims = verificador_tokens.verificar_en_cache(token)
+            if claims is None:
+                claims = await run_in_threadpool(verificador_tokens.verificar, token)
+            if not claims.get("email"):
+                raise ValueError("El token no tiene email")
+            return {"email": claims["email"], "token": token}
+        except ValueError as e:
+            logger.warning(f"Token rechazado: {e}")
+            raise HTTPException(status_code=401, detail="Token inválido o expirado")
+        except CertificadosNoDisponibles as e:
+            # Sin certificados no se puede verificar localmente: se consulta a Firebase
+            logger.warning(f"⚠️ Certificados de Firebase no disponibles, verificando en línea: {e}")
+    
     try:
-        user_info = auth.get_account_info(token)
+        user_info = await run_in_threadpool(auth.get_account_info, token)
         email = user_info['users'][0]['email']
         return {"email": email, "token": token}
     except Exception as e:
@@ -233,9 +480,11 @@ async def startup_event():
         
         logger.info("✅ Directorios RAG creados/verificados")
         
-        cuentos_count = len(list(Path('./rag_data/cuentos').glob('**/*.txt')))
-        canciones_count = len(list(Path('./rag_data/canciones').glob('**/*.txt')))
-        actividades_count = len(list(Path('./rag_data/actividades').glob('**/*.txt')))
+        biblioteca = await run_in_threadpool(library_catalog.refresh, True)
+        conteos = biblioteca.conteos()
+        cuentos_count = conteos['cuentos']
+        canciones_count = conteos['canciones']
+        actividades_count = conteos['actividades']
         
         logger.info(f"📚 Biblioteca: {cuentos_count} cuentos, {canciones_count} canciones, {actividades_count} actividades")
         
@@ -253,6 +502,9 @@ async def startup_event():
         rag_analyzer = RAGAnalyzer(rag_system)
         logger.info("✅ RAG Analyzer inicializado")
         
+        # Ids de los chunks de cada recurso, para leer sus embeddings directo
+        await run_in_threadpool(library_catalog.set_vector_store, rag_system.vector_store)
+        
         stats = rag_system.get_stats()
         
         if stats['total_documents'] == 0:
@@ -266,13 +518,21 @@ async def startup_event():
         rag_system = None
         rag_analyzer = None
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Libera los pools de OCR compartidos al apagar la aplicación
+    """
+    shutdown_executors()
+    logger.info("🛑 Pools de OCR cerrados")
+
 # ============================================================================
 # RUTAS DE AUTENTICACIÓN
 # ============================================================================
 
 @app.post("/api/auth/login", response_model=UserResponse)
 @limiter.limit("10/minute")
-async def login(request: Request, user_data: UserLogin):
+async def login(request: Request, user_data: UserLogin, background_tasks: BackgroundTasks):
     """Iniciar sesión con rate limiting"""
     logger.info(f"📧 Intento de login: {user_data.email}")
     
@@ -284,7 +544,8 @@ async def login(request: Request, user_data: UserLogin):
     
     try:
         user = auth.sign_in_with_email_and_password(user_data.email, user_data.password)
-        gcs_storage.inicializar_usuario(user_data.email)
+        # El registro del usuario en el almacenamiento no bloquea la respuesta
+        background_tasks.add_task(storage_manager.inicializar_usuario, user_data.email)
         logger.info(f"✅ Login exitoso: {user_data.email}")
         
         return UserResponse(
@@ -307,7 +568,7 @@ async def login(request: Request, user_data: UserLogin):
 
 @app.post("/api/auth/register")
 @limiter.limit("3/minute")
-async def register(request: Request, user_data: UserLogin):
+async def register(request: Request, user_data: UserLogin, background_tasks: BackgroundTasks):
     """Registrar nuevo usuario con rate limiting"""
     logger.info(f"📝 Intento de registro: {user_data.email}")
     
@@ -319,7 +580,7 @@ async def register(request: Request, user_data: UserLogin):
     
     try:
         auth.create_user_with_email_and_password(user_data.email, user_data.password)
-        gcs_storage.inicializar_usuario(user_data.email)
+        background_tasks.add_task(storage_manager.inicializar_usuario, user_data.email)
         logger.info(f"✅ Registro exitoso: {user_data.email}")
         
         return {"message": "Usuario registrado correctamente. Ya puedes iniciar sesión."}
@@ -358,63 +619,55 @@ async def upload_files(
                 )
                 continue
             
-            content = await file.read()
+            recibido = await recibir_archivo_en_stream(file, user_email)
             
-            if len(content) > MAX_FILE_SIZE:
+            if not recibido['success']:
                 errores_procesamiento.append(
-                    f"{file.filename}: Archivo muy grande (máx: 80MB)"
+                    f"{file.filename}: {recibido['error']}"
                 )
                 continue
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix) as tmp_file:
-                tmp_file.write(content)
-                tmp_file_path = tmp_file.name
+            archivo = recibido['archivo']
             
             try:
-                resultado_subida = gcs_storage.subir_archivo_desde_bytes(
-                    contenido=content,
-                    email=user_email,
-                    nombre_archivo=file.filename,
-                    es_procesado=False
-                )
+                archivos_subidos.append(file.filename)
                 
-                if resultado_subida['success']:
-                    archivos_subidos.append(file.filename)
-                    
-                    verificacion = check_supported_file(tmp_file_path)
+                verificacion = await run_in_threadpool(check_supported_file, archivo)
+                
+                if verificacion['supported']:
+                    nombre_base = Path(file.filename).stem
+                    nombre_txt = f"{nombre_base}_procesado.txt"
                     
-                    if verificacion['supported']:
-                        nombre_base = Path(file.filename).stem
-                        resultado_conversion = process_file_to_txt(tmp_file_path)
+                    # Si el mismo contenido ya fue procesado, solo se referencia
+                    if await run_in_threadpool(storage_manager.existe_procesado_por_hash, recibido['sha256']):
+                        logger.info(f"♻️ OCR omitido, contenido ya procesado: {file.filename}")
+                        resultado_txt = await run_in_threadpool(
+                            storage_manager.subir_procesado_deduplicado,
+                            recibido['sha256'], user_email, nombre_txt
+                        )
+                    else:
+                        resultado_txt = {'success': False}
+                        # El texto se sube por bloques a medida que se extrae
+                        conversion = await run_in_threadpool(stream_converted_text, archivo, file.filename)
                         
-                        if resultado_conversion['success']:
-                            with open(resultado_conversion['output_file'], 'rb') as f:
-                                contenido_procesado = f.read()
-                            
-                            resultado_txt = gcs_storage.subir_archivo_desde_bytes(
-                                contenido=contenido_procesado,
-                                email=user_email,
-                                nombre_archivo=f"{nombre_base}_procesado.txt",
-                                es_procesado=True
+                        if conversion['success']:
+                            resultado_txt = await run_in_threadpool(
+                                storage_manager.subir_procesado_deduplicado,
+                                recibido['sha256'], user_email, nombre_txt, conversion['chunks']
                             )
-                            
-                            if resultado_txt['success']:
-                                archivos_procesados.append({
-                                    'original': file.filename,
-                                    'txt': f"{nombre_base}_procesado.txt"
-                                })
-                            
-                            if os.path.exists(resultado_conversion['output_file']):
-                                os.remove(resultado_conversion['output_file'])
-                else:
-                    errores_procesamiento.append(
-                        f"{file.filename}: Error subiendo a GCS"
-                    )
+                        else:
+                            logger.warning(f"⚠️ No se pudo convertir {file.filename}: {conversion['error']}")
                     
-            finally:
-                if os.path.exists(tmp_file_path):
-                    os.remove(tmp_file_path)
+                    if resultado_txt['success']:
+                        archivos_procesados.append({
+                            'original': file.filename,
+                            'txt': nombre_txt
+                        })
                     
+            finally:
+                if recibido['tmp_path'] and os.path.exists(recibido['tmp_path']):
+                    os.remove(recibido['tmp_path'])
+        
         except Exception as ex:
             errores_procesamiento.append(f"{file.filename}: {str(ex)}")
     
@@ -430,10 +683,12 @@ async def upload_files(
         errors=errores_procesamiento
     )
 
-@app.get("/api/files/list")
+@app.get("/api/files/list", response_class=ORJSONResponse)
 async def list_files(
+    response: Response,
     page: int = Query(1, ge=1),
     per_page: int = Query(100, ge=1, le=100),
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
     """Listar archivos del usuario"""
@@ -441,8 +696,12 @@ async def list_files(
     files_info = []
     
     try:
-        archivos_originales = gcs_storage.listar_archivos(user_email, "uploads")
-        archivos_procesados = gcs_storage.listar_archivos(user_email, "processed")
+        archivos_originales = await run_in_threadpool(storage_manager.listar_archivos, user_email, "uploads")
+        archivos_procesados = await run_in_threadpool(storage_manager.listar_archivos, user_email, "processed")
+        
+        etag = etag_de_archivos(archivos_originales + archivos_procesados)
+        if etag_coincide(if_none_match, etag):
+            return respuesta_no_modificada(etag)
         
         for archivo in archivos_originales:
             files_info.append({
@@ -454,7 +713,7 @@ async def list_files(
             })
         
         for archivo in archivos_procesados:
-            if not archivo['name'].startswith('plan_') or not archivo['name'].endswith('.json'):
+            if not es_archivo_de_plan(archivo['name']):
                 files_info.append({
                     "name": archivo['name'],
                     "type": "TXT Procesado",
@@ -463,16 +722,38 @@ async def list_files(
                     "date": archivo['date']
                 })
         
+        response.headers.update(cabeceras_validacion(etag))
         return files_info
         
     except Exception as e:
         logger.error(f"❌ Error listando archivos: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error listando archivos: {str(e)}")
 
+@app.get("/api/storage/local")
+async def download_local_signed(
+    path: str,
+    expires: int,
+    signature: str,
+    disposition: str = ""
+):
+    """Servir una URL firmada del almacenamiento local (equivalente a la URL firmada de GCS)"""
+    if storage_manager.nombre_backend != "local":
+        raise HTTPException(status_code=404, detail="No disponible")
+    
+    ruta = storage_manager.verificar_url_firmada(path, expires, disposition, signature)
+    
+    if ruta is None:
+        raise HTTPException(status_code=403, detail="URL inválida o expirada")
+    
+    headers = {"Content-Disposition": disposition} if disposition else None
+    return FileResponse(ruta, headers=headers)
+
 @app.get("/api/files/download/{category}/{filename}")
 async def download_file(
     category: str,
     filename: str,
+    redirect: bool = Query(False, description="Redirigir a una URL firmada de GCS si el archivo es grande"),
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
     """Descargar archivo directamente desde GCS"""
@@ -481,16 +762,38 @@ async def download_file(
     try:
         es_procesado = category == "procesado"
         
-        # Obtener el archivo desde GCS
-        contenido = gcs_storage.obtener_archivo_bytes(
+        # Archivos grandes: GCS entrega los bytes mediante URL firmada
+        if redirect:
+            url_firmada = await run_in_threadpool(
+                storage_manager.obtener_url_descarga_temporal,
+                email=user_email,
+                nombre_archivo=filename,
+                es_procesado=es_procesado,
+                expiracion_minutos=SIGNED_URL_EXPIRATION_MINUTES,
+                disposicion=f"attachment; filename={filename}",
+                tamano_minimo=REDIRECT_MIN_SIZE
+            )
+            if url_firmada:
+                return RedirectResponse(url_firmada, status_code=302)
+        
+        # Obtener el archivo desde GCS (sin descargarlo si el cliente ya lo tiene)
+        archivo = await run_in_threadpool(
+            storage_manager.obtener_archivo_condicional,
             email=user_email,
             nombre_archivo=filename,
-            es_procesado=es_procesado
+            es_procesado=es_procesado,
+            versiones_conocidas=etags_if_none_match(if_none_match)
         )
         
-        if contenido is None:
+        if archivo is None:
             raise HTTPException(status_code=404, detail="Archivo no encontrado")
         
+        etag = etag_de_version(archivo['version'])
+        if archivo['contenido'] is None:
+            return respuesta_no_modificada(etag)
+        
+        contenido = archivo['contenido']
+        
         # Determinar el tipo MIME
         content_type = "application/octet-stream"
         ext = Path(filename).suffix.lower()
@@ -512,7 +815,8 @@ async def download_file(
             io.BytesIO(contenido),
             media_type=content_type,
             headers={
-                "Content-Disposition": f"attachment; filename={filename}"
+                "Content-Disposition": f"attachment; filename={filename}",
+                **cabeceras_validacion(etag)
             }
         )
         
@@ -525,6 +829,8 @@ async def download_file(
 async def preview_file(
     category: str,
     filename: str,
+    redirect: bool = Query(False, description="Redirigir a una URL firmada de GCS si el archivo es grande"),
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
     """Vista previa de archivo - devuelve contenido según tipo"""
@@ -532,19 +838,39 @@ async def preview_file(
     
     try:
         es_procesado = category == "procesado"
+        ext = Path(filename).suffix.lower()
+        
+        # PDFs e imágenes grandes: GCS los entrega inline mediante URL firmada
+        if redirect and ext in ['.pdf', '.jpg', '.jpeg', '.png', '.gif', '.bmp']:
+            url_firmada = await run_in_threadpool(
+                storage_manager.obtener_url_descarga_temporal,
+                email=user_email,
+                nombre_archivo=filename,
+                es_procesado=es_procesado,
+                expiracion_minutos=SIGNED_URL_EXPIRATION_MINUTES,
+                disposicion=f"inline; filename={filename}",
+                tamano_minimo=REDIRECT_MIN_SIZE
+            )
+            if url_firmada:
+                return RedirectResponse(url_firmada, status_code=302)
         
-        # Obtener el archivo desde GCS
-        contenido = gcs_storage.obtener_archivo_bytes(
+        # Obtener el archivo desde GCS (sin descargarlo si el cliente ya lo tiene)
+        archivo = await run_in_threadpool(
+            storage_manager.obtener_archivo_condicional,
             email=user_email,
             nombre_archivo=filename,
-            es_procesado=es_procesado
+            es_procesado=es_procesado,
+            versiones_conocidas=etags_if_none_match(if_none_match)
         )
         
-        if contenido is None:
+        if archivo is None:
             raise HTTPException(status_code=404, detail="Archivo no encontrado")
         
-        # Detectar tipo de archivo
-        ext = Path(filename).suffix.lower()
+        etag = etag_de_version(archivo['version'])
+        if archivo['contenido'] is None:
+            return respuesta_no_modificada(etag)
+        
+        contenido = archivo['contenido']
         
         # Para PDFs e imágenes, devolver el archivo directamente
         if ext in ['.pdf', '.jpg', '.jpeg', '.png', '.gif', '.bmp']:
@@ -560,7 +886,7 @@ async def preview_file(
             return StreamingResponse(
                 io.BytesIO(contenido),
                 media_type=mime_types.get(ext, 'application/octet-stream'),
-                headers={"Content-Disposition": f"inline; filename={filename}"}
+                headers={"Content-Disposition": f"inline; filename={filename}", **cabeceras_validacion(etag)}
             )
         
         # Para archivos TXT, devolver el contenido como JSON
@@ -574,7 +900,7 @@ async def preview_file(
                 "type": "text",
                 "content": texto,
                 "filename": filename
-            })
+            }, headers=cabeceras_validacion(etag))
         
         else:
             raise HTTPException(
@@ -602,7 +928,7 @@ async def delete_file(
     try:
         es_procesado = category == "procesado"
         
-        resultado = gcs_storage.eliminar_archivo(
+        resultado = storage_manager.eliminar_archivo(
             email=user_email,
             nombre_archivo=filename,
             es_procesado=es_procesado
@@ -621,10 +947,12 @@ async def delete_file(
 # RUTAS PARA GENERACIÓN DE PLANES CON IA + RAG
 # ============================================================================
 
-@app.post("/api/plans/generate", response_model=PlanResponse)
+@app.post("/api/plans/generate", response_model=PlanResponse, response_class=ORJSONResponse)
 @limiter.limit("5/hour")
+@trazar("plan_generate")
 async def generate_plan_with_rag(
     request: Request,
+    background_tasks: BackgroundTasks,
     plan_file: UploadFile = File(..., description="Archivo del plan de estudios"),
     diagnostico_file: Optional[UploadFile] = File(None, description="Archivo de diagnóstico (opcional)"),
     current_user: dict = Depends(get_current_user)
@@ -632,9 +960,15 @@ async def generate_plan_with_rag(
     """
     Genera un plan de estudio personalizado usando Gemini AI + RAG
     VERSIÓN CON SOPORTE PARA ACTIVIDADES
+    
+    La respuesta incluye timings con los milisegundos de cada etapa
+    (recepción, OCR, embeddings, Chroma, prompt, Gemini, almacenamiento).
     """
     user_email = current_user["email"]
     start_time = time.time()
+    tmp_plan_path = None
+    tmp_diag_path = None
+    diagnostico_recibido = None
     
     logger.info(f"🎓 Generando plan con RAG para usuario: {user_email}")
     
@@ -647,29 +981,45 @@ async def generate_plan_with_rag(
                 detail=f"Tipo de archivo no permitido para plan: {plan_file.filename}"
             )
         
-        plan_content = await plan_file.read()
-        if len(plan_content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail="El archivo del plan excede el límite de 80MB"
-            )
-        
-        diagnostico_content = None
-        diagnostico_filename = None
-        
         if diagnostico_file and diagnostico_file.filename:
             if not ProfeGoUtils.validar_extension(diagnostico_file.filename):
                 raise HTTPException(
                     status_code=400,
                     detail=f"Tipo de archivo no permitido para diagnóstico: {diagnostico_file.filename}"
                 )
-            
-            diagnostico_content = await diagnostico_file.read()
-            if len(diagnostico_content) > MAX_FILE_SIZE:
+        
+        with span("recepcion"):
+            plan_recibido = await recibir_archivo_en_stream(plan_file, user_email, crear_referencia=False)
+        if not plan_recibido['success']:
+            if plan_recibido['too_large']:
                 raise HTTPException(
                     status_code=400,
-                    detail="El archivo de diagnóstico excede el límite de 80MB"
+                    detail="El archivo del plan excede el límite de 80MB"
                 )
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error recibiendo el plan: {plan_recibido['error']}"
+            )
+        tmp_plan_path = plan_recibido['tmp_path']
+        
+        diagnostico_filename = None
+        
+        if diagnostico_file and diagnostico_file.filename:
+            with span("recepcion"):
+                diagnostico_recibido = await recibir_archivo_en_stream(
+                    diagnostico_file, user_email, crear_referencia=False
+                )
+            if not diagnostico_recibido['success']:
+                if diagnostico_recibido['too_large']:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="El archivo de diagnóstico excede el límite de 80MB"
+                    )
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Error recibiendo el diagnóstico: {diagnostico_recibido['error']}"
+                )
+            tmp_diag_path = diagnostico_recibido['tmp_path']
             diagnostico_filename = diagnostico_file.filename
         
         logger.info(f"✅ Archivos validados")
@@ -678,45 +1028,29 @@ async def generate_plan_with_rag(
         
         logger.info("📄 Extrayendo texto del plan de estudios...")
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(plan_file.filename).suffix) as tmp_plan:
-            tmp_plan.write(plan_content)
-            tmp_plan_path = tmp_plan.name
+        plan_result = await obtener_texto_por_hash(plan_recibido['archivo'], plan_recibido['sha256'])
         
-        try:
-            plan_result = get_text_only(tmp_plan_path)
-            
-            if not plan_result['success'] or not plan_result['text']:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"No se pudo extraer texto del plan"
-                )
-            
-            plan_text = plan_result['text']
-            logger.info(f"✅ Texto extraído del plan: {len(plan_text)} caracteres")
-            
-            diagnostico_text = None
+        if not plan_result['success'] or not plan_result['text']:
+            raise HTTPException(
+                status_code=400,
+                detail=f"No se pudo extraer texto del plan"
+            )
+        
+        plan_text = plan_result['text']
+        logger.info(f"✅ Texto extraído del plan: {len(plan_text)} caracteres")
+        
+        diagnostico_text = None
+        
+        if diagnostico_recibido:
+            logger.info("📄 Extrayendo texto del diagnóstico...")
             
-            if diagnostico_content:
-                logger.info("📄 Extrayendo texto del diagnóstico...")
-                
-                with tempfile.NamedTemporaryFile(delete=False, suffix=Path(diagnostico_filename).suffix) as tmp_diag:
-                    tmp_diag.write(diagnostico_content)
-                    tmp_diag_path = tmp_diag.name
-                
-                try:
-                    diagnostico_result = get_text_only(tmp_diag_path)
-                    
-                    if diagnostico_result['success'] and diagnostico_result['text']:
-                        diagnostico_text = diagnostico_result['text']
-                        logger.info(f"✅ Texto extraído del diagnóstico: {len(diagnostico_text)} caracteres")
-                
-                finally:
-                    if os.path.exists(tmp_diag_path):
-                        os.remove(tmp_diag_path)
+            diagnostico_result = await obtener_texto_por_hash(
+                diagnostico_recibido['archivo'], diagnostico_recibido['sha256']
+            )
             
-        finally:
-            if os.path.exists(tmp_plan_path):
-                os.remove(tmp_plan_path)
+            if diagnostico_result['success'] and diagnostico_result['text']:
+                diagnostico_text = diagnostico_result['text']
+                logger.info(f"✅ Texto extraído del diagnóstico: {len(diagnostico_text)} caracteres")
         
         # ========== RECUPERACIÓN RAG - CON ACTIVIDADES ==========
         
@@ -797,52 +1131,53 @@ async def generate_plan_with_rag(
                 logger.info(f"✅ {len(retrieved_docs['actividades'])} actividades recuperadas")
                 
                 # CONSTRUIR CONTEXTO RAG PARA GEMINI
-                rag_context_parts = []
-                
-                if retrieved_docs['cuentos']:
-                    rag_context_parts.append("\n\n# 📖 CUENTOS DISPONIBLES EN LA BIBLIOTECA:")
-                    for idx, cuento in enumerate(retrieved_docs['cuentos'], 1):
-                        filename = cuento['metadata'].get('filename', 'Desconocido')
-                        similitud = cuento['similarity'] * 100
-                        texto = cuento['text'][:500]
-                        
-                        rag_context_parts.append(f"""
+                with span("rag.contexto"):
+                    rag_context_parts = []
+                    
+                    if retrieved_docs['cuentos']:
+                        rag_context_parts.append("\n\n# 📖 CUENTOS DISPONIBLES EN LA BIBLIOTECA:")
+                        for idx, cuento in enumerate(retrieved_docs['cuentos'], 1):
+                            filename = cuento['metadata'].get('filename', 'Desconocido')
+                            similitud = cuento['similarity'] * 100
+                            texto = cuento['text'][:500]
+                            
+                            rag_context_parts.append(f"""
 ## Cuento {idx}: {filename}
 **Relevancia:** {similitud:.1f}%
 **Contenido:**
 {texto}
 """)
-                
-                if retrieved_docs['canciones']:
-                    rag_context_parts.append("\n\n# 🎵 CANCIONES DISPONIBLES EN LA BIBLIOTECA:")
-                    for idx, cancion in enumerate(retrieved_docs['canciones'], 1):
-                        filename = cancion['metadata'].get('filename', 'Desconocido')
-                        similitud = cancion['similarity'] * 100
-                        texto = cancion['text'][:500]
-                        
-                        rag_context_parts.append(f"""
+                    
+                    if retrieved_docs['canciones']:
+                        rag_context_parts.append("\n\n# 🎵 CANCIONES DISPONIBLES EN LA BIBLIOTECA:")
+                        for idx, cancion in enumerate(retrieved_docs['canciones'], 1):
+                            filename = cancion['metadata'].get('filename', 'Desconocido')
+                            similitud = cancion['similarity'] * 100
+                            texto = cancion['text'][:500]
+                            
+                            rag_context_parts.append(f"""
 ## Canción {idx}: {filename}
 **Relevancia:** {similitud:.1f}%
 **Contenido:**
 {texto}
 """)
-                
-                # ⭐ AGREGAR ACTIVIDADES AL CONTEXTO
-                if retrieved_docs['actividades']:
-                    rag_context_parts.append("\n\n# 🎯 ACTIVIDADES DIDÁCTICAS DISPONIBLES EN LA BIBLIOTECA:")
-                    for idx, actividad in enumerate(retrieved_docs['actividades'], 1):
-                        filename = actividad['metadata'].get('filename', 'Desconocido')
-                        similitud = actividad['similarity'] * 100
-                        texto = actividad['text'][:800]  # Más caracteres para actividades
-                        
-                        rag_context_parts.append(f"""
+                    
+                    # ⭐ AGREGAR ACTIVIDADES AL CONTEXTO
+                    if retrieved_docs['actividades']:
+                        rag_context_parts.append("\n\n# 🎯 ACTIVIDADES DIDÁCTICAS DISPONIBLES EN LA BIBLIOTECA:")
+                        for idx, actividad in enumerate(retrieved_docs['actividades'], 1):
+                            filename = actividad['metadata'].get('filename', 'Desconocido')
+                            similitud = actividad['similarity'] * 100
+                            texto = actividad['text'][:800]  # Más caracteres para actividades
+                            
+                            rag_context_parts.append(f"""
 ## Actividad {idx}: {filename}
 **Relevancia:** {similitud:.1f}%
 **Contenido completo:**
 {texto}
 """)
-                
-                rag_context_text = "\n".join(rag_context_parts)
+                    
+                    rag_context_text = "\n".join(rag_context_parts)
                 
                 logger.info(f"✅ Contexto RAG construido: {len(rag_context_text)} caracteres")
                 
@@ -946,46 +1281,54 @@ Al generar el plan:
         
         # ========== GUARDAR EN GCS ==========
         
-        plan_json = json.dumps(plan_data, indent=2, ensure_ascii=False)
-        plan_json_bytes = plan_json.encode('utf-8')
-        
-        resultado_guardado = gcs_storage.subir_archivo_desde_bytes(
-            contenido=plan_json_bytes,
-            email=user_email,
-            nombre_archivo=f"{plan_id}.json",
-            es_procesado=True
-        )
+        with span("storage.guardar_plan"):
+            plan_json = json.dumps(plan_data, indent=2, ensure_ascii=False)
+            plan_json_bytes = plan_json.encode('utf-8')
+            
+            resultado_guardado = storage_manager.subir_archivo_desde_bytes(
+                contenido=plan_json_bytes,
+                email=user_email,
+                nombre_archivo=f"{plan_id}.json",
+                es_procesado=True
+            )
         
         if resultado_guardado['success']:
             logger.info(f"✅ Plan guardado en GCS con metadata RAG (incluye actividades)")
-        
-        # Subir archivos originales
-        gcs_storage.subir_archivo_desde_bytes(
-            contenido=plan_content,
-            email=user_email,
-            nombre_archivo=plan_file.filename,
-            es_procesado=False
-        )
-        
-        if diagnostico_content:
-            gcs_storage.subir_archivo_desde_bytes(
-                contenido=diagnostico_content,
-                email=user_email,
-                nombre_archivo=diagnostico_filename,
-                es_procesado=False
-            )
+            # El Word y el análisis RAG se generan una sola vez, después de responder
+            background_tasks.add_task(generar_y_guardar_documento_word, user_email, plan_data)
+            background_tasks.add_task(generar_y_guardar_analisis_rag, user_email, plan_data)
+            
+            # Los originales ya están en cas/ desde la recepción; solo con el
+            # plan guardado aparecen en los uploads del usuario. Si la
+            # generación falla nadie los referencia y el barrido de cas/ los borra.
+            with span("storage.guardar_plan"):
+                for recibido, nombre_original in ((plan_recibido, plan_file.filename),
+                                                  (diagnostico_recibido, diagnostico_filename)):
+                    if recibido is None:
+                        continue
+                    referencia = await run_in_threadpool(
+                        storage_manager.crear_referencia_original,
+                        recibido['sha256'], recibido['size'], user_email,
+                        nombre_original, recibido['content_type']
+                    )
+                    if not referencia['success']:
+                        logger.warning(f"⚠️ No se pudo guardar el original {nombre_original}")
         
         # ========== RETORNAR RESULTADO ==========
         
         processing_time = time.time() - start_time
+        traza = traza_actual()
+        timings = traza.timings_ms() if traza is not None else None
         logger.info(f"⏱️ Tiempo total: {processing_time:.2f}s")
+        logger.info(f"⏱️ Etapas (ms): {timings}")
         logger.info(f"🎉 Plan generado exitosamente con RAG (incluye actividades)")
         
         return PlanResponse(
             success=True,
             plan_id=plan_id,
             plan_data=plan_data,
-            processing_time=processing_time
+            processing_time=processing_time,
+            timings=timings
         )
         
     except HTTPException:
@@ -996,55 +1339,77 @@ Al generar el plan:
             status_code=500,
             detail=f"Error inesperado: {str(e)}"
         )
+    finally:
+        for tmp_path in (tmp_plan_path, tmp_diag_path):
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
 # ============================================================================
 # OTRAS RUTAS DE PLANES
 # ============================================================================
 
-@app.get("/api/plans/list")
+@app.get("/api/plans/list", response_class=ORJSONResponse)
 async def list_plans(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
-    """Lista todos los planes generados del usuario"""
+    """
+    Lista todos los planes generados del usuario
+    
+    El ETag depende solo del listado de JSON de planes, así que una
+    revalidación responde 304 sin descargar ningún plan.
+    """
     user_email = current_user["email"]
     
     try:
-        archivos_procesados = gcs_storage.listar_archivos(user_email, "processed")
+        archivos_procesados = await run_in_threadpool(storage_manager.listar_archivos, user_email, "processed")
+        archivos_planes = [
+            archivo for archivo in archivos_procesados
+            if archivo['name'].startswith('plan_') and archivo['name'].endswith('.json')
+            and not archivo['name'].endswith('_analysis.json')
+        ]
+        
+        etag = etag_de_archivos(archivos_planes)
+        if etag_coincide(if_none_match, etag):
+            return respuesta_no_modificada(etag)
+        
         planes = []
         
-        for archivo in archivos_procesados:
-            if archivo['name'].startswith('plan_') and archivo['name'].endswith('.json'):
-                contenido = gcs_storage.obtener_archivo_bytes(
-                    email=user_email,
-                    nombre_archivo=archivo['name'],
-                    es_procesado=True
-                )
-                
-                if contenido:
-                    try:
-                        plan_data = json.loads(contenido.decode('utf-8'))
-                        
-                        planes.append({
-                            'plan_id': plan_data.get('plan_id'),
-                            'nombre_plan': plan_data.get('nombre_plan'),
-                            'grado': plan_data.get('grado'),
-                            'campo_formativo_principal': plan_data.get('campo_formativo_principal'),
-                            'ejes_articuladores_generales': plan_data.get('ejes_articuladores_generales', []),
-                            'edad_aprox': plan_data.get('edad_aprox'),
-                            'duracion_total': plan_data.get('duracion_total'),
-                            'materia': plan_data.get('materia'),
-                            'num_modulos': plan_data.get('num_modulos', len(plan_data.get('modulos', []))),
-                            'fecha_generacion': plan_data.get('fecha_generacion'),
-                            'tiene_diagnostico': plan_data.get('tiene_diagnostico', False),
-                            'archivos_originales': plan_data.get('archivos_originales', {}),
-                            'generado_con': plan_data.get('generado_con'),
-                            'modelo': plan_data.get('modelo')
-                        })
-                    except json.JSONDecodeError:
-                        logger.warning(f"⚠️ No se pudo parsear el plan: {archivo['name']}")
+        for archivo in archivos_planes:
+            contenido = await run_in_threadpool(
+                storage_manager.obtener_archivo_bytes,
+                email=user_email,
+                nombre_archivo=archivo['name'],
+                es_procesado=True
+            )
+            
+            if contenido:
+                try:
+                    plan_data = json.loads(contenido.decode('utf-8'))
+                    
+                    planes.append({
+                        'plan_id': plan_data.get('plan_id'),
+                        'nombre_plan': plan_data.get('nombre_plan'),
+                        'grado': plan_data.get('grado'),
+                        'campo_formativo_principal': plan_data.get('campo_formativo_principal'),
+                        'ejes_articuladores_generales': plan_data.get('ejes_articuladores_generales', []),
+                        'edad_aprox': plan_data.get('edad_aprox'),
+                        'duracion_total': plan_data.get('duracion_total'),
+                        'materia': plan_data.get('materia'),
+                        'num_modulos': plan_data.get('num_modulos', len(plan_data.get('modulos', []))),
+                        'fecha_generacion': plan_data.get('fecha_generacion'),
+                        'tiene_diagnostico': plan_data.get('tiene_diagnostico', False),
+                        'archivos_originales': plan_data.get('archivos_originales', {}),
+                        'generado_con': plan_data.get('generado_con'),
+                        'modelo': plan_data.get('modelo')
+                    })
+                except json.JSONDecodeError:
+                    logger.warning(f"⚠️ No se pudo parsear el plan: {archivo['name']}")
         
         planes.sort(key=lambda x: x.get('fecha_generacion', ''), reverse=True)
         
+        response.headers.update(cabeceras_validacion(etag))
         return {
             'success': True,
             'planes': planes,
@@ -1055,9 +1420,11 @@ async def list_plans(
         logger.error(f"❌ Error listando planes: {e}")
         raise HTTPException(status_code=500, detail=f"Error listando planes: {str(e)}")
 
-@app.get("/api/plans/{plan_id}")
+@app.get("/api/plans/{plan_id}", response_class=ORJSONResponse)
 async def get_plan_detail(
     plan_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
     """Obtiene el detalle completo de un plan específico"""
@@ -1066,17 +1433,24 @@ async def get_plan_detail(
     try:
         filename = f"{plan_id}.json"
         
-        contenido = gcs_storage.obtener_archivo_bytes(
+        archivo = await run_in_threadpool(
+            storage_manager.obtener_archivo_condicional,
             email=user_email,
             nombre_archivo=filename,
-            es_procesado=True
+            es_procesado=True,
+            versiones_conocidas=etags_if_none_match(if_none_match)
         )
         
-        if not contenido:
+        if archivo is None:
             raise HTTPException(status_code=404, detail="Plan no encontrado")
         
-        plan_data = json.loads(contenido.decode('utf-8'))
+        etag = etag_de_version(archivo['version'])
+        if archivo['contenido'] is None:
+            return respuesta_no_modificada(etag)
+        
+        plan_data = json.loads(archivo['contenido'].decode('utf-8'))
         
+        response.headers.update(cabeceras_validacion(etag))
         return {
             'success': True,
             'plan': plan_data
@@ -1101,7 +1475,7 @@ async def delete_plan(
     try:
         filename = f"{plan_id}.json"
         
-        resultado = gcs_storage.eliminar_archivo(
+        resultado = storage_manager.eliminar_archivo(
             email=user_email,
             nombre_archivo=filename,
             es_procesado=True
@@ -1110,6 +1484,14 @@ async def delete_plan(
         if not resultado['success']:
             raise HTTPException(status_code=404, detail="Plan no encontrado")
         
+        # El Word y el análisis guardados pueden no existir
+        for derivado in (nombre_documento_word(plan_id), nombre_analisis_rag(plan_id)):
+            storage_manager.eliminar_archivo(
+                email=user_email,
+                nombre_archivo=derivado,
+                es_procesado=True
+            )
+        
         return {
             'success': True,
             'message': 'Plan eliminado correctamente'
@@ -1125,373 +1507,135 @@ async def delete_plan(
 # GENERACIÓN DE DOCUMENTOS WORD
 # ============================================================================
 
-def generar_documento_word(plan_data: Dict) -> io.BytesIO:
+def es_archivo_de_plan(nombre_archivo: str) -> bool:
+    """Indica si un archivo procesado pertenece a un plan (JSON, Word o análisis RAG)"""
+    return nombre_archivo.startswith('plan_') and nombre_archivo.endswith(('.json', '.docx'))
+
+def nombre_documento_word(plan_id: str) -> str:
+    """Nombre del .docx cacheado de un plan, junto a su JSON en processed/"""
+    return f"{plan_id}.docx"
+
+def sufijo_etag_documento_word() -> str:
+    return f"-word{VERSION_DOCUMENTO_WORD}"
+
+def etag_documento_word(version_plan: str) -> str:
+    """
+    ETag del Word de un plan a partir de la versión almacenada de su JSON
+    
+    El documento se deriva del JSON del usuario, así que solo cambia con
+    ese objeto o con VERSION_DOCUMENTO_WORD (débil: dos generaciones de la
+    misma versión no son idénticas byte a byte).
+    """
+    return f'W/"{version_plan}{sufijo_etag_documento_word()}"'
+
+def versiones_plan_de_etags(if_none_match: Optional[str]) -> set:
+    """Versiones del JSON del plan contenidas en los ETag del Word de la versión actual"""
+    sufijo = sufijo_etag_documento_word()
+    return {
+        etiqueta[:-len(sufijo)]
+        for etiqueta in etags_if_none_match(if_none_match)
+        if etiqueta.endswith(sufijo)
+    }
+
+def guardar_documento_word(email: str, plan_id: str, docx_bytes: bytes, reemplazar: bool = False):
     """
-    Genera un documento Word profesional a partir de los datos del plan
-    VERSIÓN CON SOPORTE PARA ACTIVIDADES COMPLEMENTARIAS
+    Guarda el Word de un plan en processed/ para las descargas siguientes
+    
+    Con reemplazar=True se elimina antes la copia anterior (versión vieja),
+    que de otro modo podría encontrarse primero al buscar por nombre.
     """
-    doc = Document()
-    
-    # Configurar estilos del documento
-    style = doc.styles['Normal']
-    font = style.font
-    font.name = 'Arial'
-    font.size = Pt(12)
-    p_format = style.paragraph_format
-    p_format.line_spacing = 1.5
-    
-    # ========== PORTADA ==========
-    portada = doc.add_heading(plan_data.get('nombre_plan', 'Plan Educativo'), 0)
-    portada.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    portada.runs[0].font.color.rgb = RGBColor(0, 102, 204)
-    
-    # Información general
-    info_general = doc.add_paragraph()
-    info_general.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    
-    if plan_data.get('grado'):
-        run = info_general.add_run(f"Grado: {plan_data['grado']}\n")
-        run.bold = True
-        run.font.size = Pt(12)
-    
-    if plan_data.get('edad_aprox'):
-        run = info_general.add_run(f"Edad aproximada: {plan_data['edad_aprox']}\n")
-        run.font.size = Pt(12)
-    
-    if plan_data.get('duracion_total'):
-        run = info_general.add_run(f"Duración total: {plan_data['duracion_total']}\n")
-        run.font.size = Pt(12)
-
-    if plan_data.get('fecha_generacion'):
-        fecha = datetime.fromisoformat(plan_data['fecha_generacion']).strftime('%d/%m/%Y %H:%M')
-        run = info_general.add_run(f"Generado: {fecha}\n")
-        run.font.size = Pt(12)
-        run.italic = True
-    
-    doc.add_paragraph()
-    
-    # Campo formativo y ejes
-    if plan_data.get('campo_formativo_principal'):
-        p = doc.add_paragraph()
-        p.add_run('Campo Formativo Principal: ').bold = True
-        p.add_run(plan_data['campo_formativo_principal'])
-    
-    if plan_data.get('ejes_articuladores_generales'):
-        p = doc.add_paragraph()
-        p.add_run('Ejes Articuladores: ').bold = True
-        p.add_run(', '.join(plan_data['ejes_articuladores_generales']))
-    
-    doc.add_page_break()
-    
-    # ========== MÓDULOS ==========
-    doc.add_heading('◈ Módulos del Plan', 1)
-    
-    modulos = plan_data.get('modulos', [])
-    
-    for idx, modulo in enumerate(modulos, 1):
-        # Encabezado del módulo
-        modulo_heading = doc.add_heading(f"Módulo {modulo.get('numero', idx)}: {modulo.get('nombre', '')}", 2)
-        modulo_heading.runs[0].font.color.rgb = RGBColor(0, 102, 204)
-        
-        # Información del módulo
-        if modulo.get('campo_formativo'):
-            p = doc.add_paragraph()
-            p.add_run('◇ Campo Formativo: ').bold = True
-            p.add_run(modulo['campo_formativo'])
-        
-        if modulo.get('ejes_articuladores'):
-            p = doc.add_paragraph()
-            p.add_run('◇ Ejes Articuladores: ').bold = True
-            p.add_run(', '.join(modulo['ejes_articuladores']))
-        
-        if modulo.get('aprendizaje_esperado'):
-            p = doc.add_paragraph()
-            p.add_run('◇ Aprendizaje Esperado: ').bold = True
-            p.add_run(modulo['aprendizaje_esperado'])
-        
-        if modulo.get('tiempo_estimado'):
-            p = doc.add_paragraph()
-            p.add_run('◇ Tiempo Estimado: ').bold = True
-            p.add_run(modulo['tiempo_estimado'])
-        
-        doc.add_paragraph()
-        
-        # Actividad de inicio
-        if modulo.get('actividad_inicio'):
-            doc.add_heading('◆ Actividad de Inicio', 3)
-            inicio = modulo['actividad_inicio']
-            
-            p = doc.add_paragraph()
-            p.add_run('Nombre: ').bold = True
-            p.add_run(inicio.get('nombre', ''))
-            
-            p = doc.add_paragraph()
-            p.add_run('Descripción: ').bold = True
-            p.add_run(inicio.get('descripcion', ''))
-            
-            if inicio.get('duracion'):
-                p = doc.add_paragraph()
-                p.add_run('Duración: ').bold = True
-                p.add_run(inicio['duracion'])
-            
-            if inicio.get('materiales'):
-                p = doc.add_paragraph()
-                p.add_run('Materiales: ').bold = True
-                materiales = inicio['materiales'] if isinstance(inicio['materiales'], list) else [inicio['materiales']]
-                p.add_run(', '.join(materiales))
-            
-            if inicio.get('organizacion'):
-                p = doc.add_paragraph()
-                p.add_run('Organización: ').bold = True
-                p.add_run(inicio['organizacion'])
-        
-        # Actividades de desarrollo
-        if modulo.get('actividades_desarrollo'):
-            doc.add_heading('◆ Actividades de Desarrollo', 3)
-            
-            for act_idx, actividad in enumerate(modulo['actividades_desarrollo'], 1):
-                doc.add_heading(f"Actividad {act_idx}: {actividad.get('nombre', '')}", 4)
-                
-                if actividad.get('tipo'):
-                    p = doc.add_paragraph()
-                    p.add_run('Tipo: ').bold = True
-                    p.add_run(actividad['tipo'])
-                
-                # ⭐ NUEVO: Mostrar si está basada en la biblioteca
-                if actividad.get('basada_en_actividad_biblioteca') == 'SI':
-                    p = doc.add_paragraph()
-                    p.add_run('📚 Basada en biblioteca: ').bold = True
-                    p.add_run('SÍ')
-                    if actividad.get('fuente_actividad'):
-                        p = doc.add_paragraph()
-                        p.add_run('📄 Fuente: ').bold = True
-                        p.add_run(actividad['fuente_actividad'])
-                
-                if actividad.get('descripcion'):
-                    p = doc.add_paragraph()
-                    p.add_run('Descripción: ').bold = True
-                    p.add_run(actividad['descripcion'])
-                
-                if actividad.get('duracion'):
-                    p = doc.add_paragraph()
-                    p.add_run('Duración: ').bold = True
-                    p.add_run(actividad['duracion'])
-                
-                if actividad.get('organizacion'):
-                    p = doc.add_paragraph()
-                    p.add_run('Organización: ').bold = True
-                    p.add_run(actividad['organizacion'])
-                
-                if actividad.get('materiales'):
-                    p = doc.add_paragraph()
-                    p.add_run('Materiales: ').bold = True
-                    materiales = actividad['materiales'] if isinstance(actividad['materiales'], list) else [actividad['materiales']]
-                    p.add_run(', '.join(materiales))
-                
-                if actividad.get('aspectos_a_observar'):
-                    p = doc.add_paragraph()
-                    p.add_run('Aspectos a observar: ').bold = True
-                    p.add_run(actividad['aspectos_a_observar'])
-                
-                doc.add_paragraph()
-        
-        # Actividad de cierre
-        if modulo.get('actividad_cierre'):
-            doc.add_heading('◆ Actividad de Cierre', 3)
-            cierre = modulo['actividad_cierre']
-            
-            p = doc.add_paragraph()
-            p.add_run('Nombre: ').bold = True
-            p.add_run(cierre.get('nombre', ''))
-            
-            p = doc.add_paragraph()
-            p.add_run('Descripción: ').bold = True
-            p.add_run(cierre.get('descripcion', ''))
-            
-            if cierre.get('duracion'):
-                p = doc.add_paragraph()
-                p.add_run('Duración: ').bold = True
-                p.add_run(cierre['duracion'])
-            
-            if cierre.get('preguntas_guia'):
-                p = doc.add_paragraph()
-                p.add_run('Preguntas guía:').bold = True
-                for pregunta in cierre['preguntas_guia']:
-                    doc.add_paragraph(f" {pregunta}", style='List Bullet')
-        
-        # Información adicional del módulo
-        if modulo.get('consejos_maestra'):
-            doc.add_heading('◇ Consejos para el Docente', 3)
-            doc.add_paragraph(modulo['consejos_maestra'])
-        
-        if modulo.get('variaciones'):
-            doc.add_heading('◇ Variaciones', 3)
-            doc.add_paragraph(modulo['variaciones'])
-        
-        if modulo.get('vinculo_familia'):
-            doc.add_heading('◇ Vínculo con la Familia', 3)
-            doc.add_paragraph(modulo['vinculo_familia'])
-        
-        if modulo.get('evaluacion'):
-            doc.add_heading('◇ Evaluación', 3)
-            doc.add_paragraph(modulo['evaluacion'])
-        
-        # Separador entre módulos
-        if idx < len(modulos):
-            doc.add_page_break()
-    
-    # ========== RECURSOS EDUCATIVOS ==========
-    if plan_data.get('recursos_educativos'):
-        doc.add_page_break()
-        doc.add_heading('◈ Recursos Educativos', 1)
-        recursos = plan_data['recursos_educativos']
-        
-        if recursos.get('materiales_generales'):
-            doc.add_heading('◇ Materiales Generales', 2)
-            for material in recursos['materiales_generales']:
-                doc.add_paragraph(f" {material}", style='List Bullet')
-        
-        if recursos.get('cuentos_recomendados'):
-            doc.add_heading('◇ Cuentos Recomendados', 2)
-            for cuento in recursos['cuentos_recomendados']:
-                p = doc.add_paragraph()
-                p.add_run(f"• {cuento.get('titulo', '')}: ").bold = True
-                
-                detalles = []
-                if cuento.get('autor'):
-                    detalles.append(f"Autor: {cuento['autor']}")
-                if cuento.get('tipo'):
-                    detalles.append(f"Tipo: {cuento['tipo']}")
-                if cuento.get('acceso'):
-                    detalles.append(f"Acceso: {cuento['acceso']}")
-                if cuento.get('disponibilidad'):
-                    detalles.append(f"Disponibilidad: {cuento['disponibilidad']}")
-                
-                p.add_run(' | '.join(detalles))
-                
-                if cuento.get('descripcion_breve'):
-                    doc.add_paragraph(f"  {cuento['descripcion_breve']}", style='List Bullet 2')
-        
-        if recursos.get('canciones_recomendadas'):
-            doc.add_heading('◇ Canciones Recomendadas', 2)
-            for cancion in recursos['canciones_recomendadas']:
-                p = doc.add_paragraph()
-                p.add_run(f"• {cancion.get('titulo', '')}: ").bold = True
-                
-                detalles = []
-                if cancion.get('tipo'):
-                    detalles.append(f"Tipo: {cancion['tipo']}")
-                if cancion.get('acceso'):
-                    detalles.append(f"Acceso: {cancion['acceso']}")
-                if cancion.get('disponibilidad'):
-                    detalles.append(f"Disponibilidad: {cancion['disponibilidad']}")
-                
-                p.add_run(' | '.join(detalles))
-                
-                if cancion.get('uso_sugerido'):
-                    doc.add_paragraph(f"  Uso sugerido: {cancion['uso_sugerido']}", style='List Bullet 2')
-        
-        # ⭐ NUEVA SECCIÓN: ACTIVIDADES COMPLEMENTARIAS
-        if recursos.get('actividades_complementarias'):
-            doc.add_heading('🎯 Actividades Complementarias', 2)
-            for actividad in recursos['actividades_complementarias']:
-                p = doc.add_paragraph()
-                p.add_run(f"• {actividad.get('titulo', '')}: ").bold = True
-                
-                detalles = []
-                if actividad.get('linea_trabajo'):
-                    detalles.append(f"Línea: {actividad['linea_trabajo']}")
-                if actividad.get('ambito'):
-                    detalles.append(f"Ámbito: {actividad['ambito']}")
-                if actividad.get('organizacion'):
-                    detalles.append(f"Organización: {actividad['organizacion']}")
-                if actividad.get('tipo'):
-                    detalles.append(f"Tipo: {actividad['tipo']}")
-                if actividad.get('acceso'):
-                    detalles.append(f"Acceso: {actividad['acceso']}")
-                
-                p.add_run(' | '.join(detalles))
-                
-                if actividad.get('descripcion_breve'):
-                    doc.add_paragraph(f"  {actividad['descripcion_breve']}", style='List Bullet 2')
-                
-                if actividad.get('materiales_necesarios'):
-                    p_materiales = doc.add_paragraph(style='List Bullet 2')
-                    p_materiales.add_run('  Materiales: ').bold = True
-                    p_materiales.add_run(', '.join(actividad['materiales_necesarios']))
-    
-    # ========== RECOMENDACIONES DE AMBIENTE ==========
-    if plan_data.get('recomendaciones_ambiente'):
-        doc.add_heading('◇ Recomendaciones para el Ambiente', 2)
-        doc.add_paragraph(plan_data['recomendaciones_ambiente'])
-    
-    # ========== VINCULACIÓN CURRICULAR ==========
-    if plan_data.get('vinculacion_curricular'):
-        doc.add_heading('◇ Vinculación Curricular', 2)
-        vinculacion = plan_data['vinculacion_curricular']
-        
-        if vinculacion.get('campo_formativo_principal'):
-            p = doc.add_paragraph()
-            p.add_run('Campo Formativo Principal: ').bold = True
-            p.add_run(vinculacion['campo_formativo_principal'])
-        
-        if vinculacion.get('campos_secundarios'):
-            p = doc.add_paragraph()
-            p.add_run('Campos Secundarios: ').bold = True
-            p.add_run(', '.join(vinculacion['campos_secundarios']))
-        
-        if vinculacion.get('ejes_transversales'):
-            p = doc.add_paragraph()
-            p.add_run('Ejes Transversales: ').bold = True
-            p.add_run(', '.join(vinculacion['ejes_transversales']))
-        
-        if vinculacion.get('aprendizajes_clave'):
-            doc.add_heading('Aprendizajes Clave:', 3)
-            for aprendizaje in vinculacion['aprendizajes_clave']:
-                doc.add_paragraph(f" {aprendizaje}", style='List Bullet')
-    
-    # Guardar en memoria
-    docx_bytes = io.BytesIO()
-    doc.save(docx_bytes)
-    docx_bytes.seek(0)
-    
-    return docx_bytes
+    nombre_docx = nombre_documento_word(plan_id)
+    
+    if reemplazar:
+        storage_manager.eliminar_archivo(email=email, nombre_archivo=nombre_docx, es_procesado=True)
+    
+    resultado = storage_manager.subir_archivo_desde_bytes(
+        contenido=docx_bytes,
+        email=email,
+        nombre_archivo=nombre_docx,
+        es_procesado=True
+    )
+    
+    if resultado['success']:
+        logger.info(f"📄 Word cacheado: {nombre_docx}")
+    else:
+        logger.warning(f"⚠️ No se pudo cachear el Word {nombre_docx}: {resultado.get('error')}")
+
+def generar_y_guardar_documento_word(email: str, plan_data: Dict):
+    """
+    Genera y guarda el Word de un plan recién creado (tarea en segundo plano)
+    """
+    try:
+        docx_bytes = generar_documento_word(plan_data)
+        guardar_documento_word(email, plan_data['plan_id'], docx_bytes)
+    except Exception as e:
+        logger.error(f"❌ Error generando Word de {plan_data.get('plan_id')}: {e}")
 
 @app.get("/api/plans/{plan_id}/download")
 async def download_plan_word(
     plan_id: str,
+    background_tasks: BackgroundTasks,
+    if_none_match: Optional[str] = Header(None),
     current_user: dict = Depends(get_current_user)
 ):
-    """Descarga el plan como documento Word (.docx) profesional"""
+    """
+    Descarga el plan como documento Word (.docx) profesional
+    
+    El documento se genera una vez por plan (al crearlo o en la primera
+    descarga) y se guarda junto al JSON; las descargas siguientes lo leen
+    del almacenamiento, o responden 304 si el cliente ya lo tiene. El 304
+    se decide con la versión del JSON del usuario, así que un plan
+    eliminado responde 404.
+    """
     user_email = current_user["email"]
     
     try:
-        filename = f"{plan_id}.json"
-        
-        contenido = gcs_storage.obtener_archivo_bytes(
+        plan_json = await run_in_threadpool(
+            storage_manager.obtener_archivo_condicional,
             email=user_email,
-            nombre_archivo=filename,
-            es_procesado=True
+            nombre_archivo=f"{plan_id}.json",
+            es_procesado=True,
+            versiones_conocidas=versiones_plan_de_etags(if_none_match)
         )
         
-        if not contenido:
+        if plan_json is None:
             raise HTTPException(status_code=404, detail="Plan no encontrado")
         
-        plan_data = json.loads(contenido.decode('utf-8'))
+        etag = etag_documento_word(plan_json['version'])
+        if plan_json['contenido'] is None:
+            return respuesta_no_modificada(etag)
         
-        # Generar documento Word
-        docx_bytes = generar_documento_word(plan_data)
+        docx_bytes = await run_in_threadpool(
+            storage_manager.obtener_archivo_bytes,
+            email=user_email,
+            nombre_archivo=nombre_documento_word(plan_id),
+            es_procesado=True
+        )
+        
+        propiedades = propiedades_documento_word(docx_bytes) if docx_bytes else {}
+        
+        if propiedades.get('version') == VERSION_DOCUMENTO_WORD:
+            nombre_plan = propiedades.get('titulo') or 'Plan_Educativo'
+        else:
+            plan_data = json.loads(plan_json['contenido'].decode('utf-8'))
+            
+            # Generar documento Word fuera del event loop y cachearlo
+            docx_bytes = await run_in_threadpool(generar_documento_word, plan_data)
+            background_tasks.add_task(
+                guardar_documento_word, user_email, plan_id, docx_bytes, bool(propiedades)
+            )
+            nombre_plan = plan_data.get('nombre_plan', 'Plan_Educativo')
         
         # Crear nombre de archivo seguro
-        nombre_plan = plan_data.get('nombre_plan', 'Plan_Educativo')
         nombre_archivo = f"{nombre_plan.replace(' ', '_').replace('/', '_')}.docx"
         
         # Retornar archivo Word
-        return StreamingResponse(
-            docx_bytes,
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        return Response(
+            content=docx_bytes,
+            media_type=DOCX_MEDIA_TYPE,
             headers={
-                "Content-Disposition": f"attachment; filename={nombre_archivo}"
+                "Content-Disposition": f"attachment; filename={nombre_archivo}",
+                **cabeceras_validacion(etag)
             }
         )
         
@@ -1506,12 +1650,26 @@ async def download_plan_word(
 # CLASE RAGAnalyzer CON SOPORTE PARA ACTIVIDADES
 # ============================================================================
 
+# Similitud coseno a partir de la cual un recurso se considera usado en el plan
+UMBRAL_USO_RECURSO = 0.60
+
+def normalizar_filas(matriz: np.ndarray) -> np.ndarray:
+    """Divide cada fila entre su norma (las filas en cero quedan en cero)"""
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.maximum(normas, 1e-12)
+
 class RAGAnalyzer:
     """
-    Analizador avanzado de similitud semántica entre planes y recursos RAG
-    VERSIÓN CON SOPORTE PARA ACTIVIDADES
+    Analizador de similitud semántica entre planes y recursos RAG
+    
+    Embebe en un solo lote los módulos y actividades del plan y calcula con
+    NumPy la matriz coseno segmento x recurso contra los embeddings de la
+    biblioteca que ya están en el vector store. El uso de cada recurso y la
+    relevancia por módulo se derivan de esa matriz.
     """
     
+    TIPOS_RECURSO = (('cuentos', 'cuento'), ('canciones', 'cancion'), ('actividades', 'actividad'))
+    
     def __init__(self, rag_system):
         self.rag_system = rag_system
     
@@ -1534,123 +1692,45 @@ class RAGAnalyzer:
                 'recursos_utilizados': 0,
                 'porcentaje_uso_rag': 0.0,
                 'similitud_promedio': 0.0,
-                'actividades_biblioteca_usadas': 0  # ⭐ NUEVO
+                'actividades_biblioteca_usadas': 0
             },
             'recomendaciones_adicionales': []
         }
         
-        # Extraer texto completo del plan
-        plan_text = self._extract_plan_text(plan_data)
-        plan_text_lower = plan_text.lower()
-        
-        # Combinar todos los recursos
-        cuentos = retrieved_docs.get('cuentos', [])
-        canciones = retrieved_docs.get('canciones', [])
-        actividades = retrieved_docs.get('actividades', [])  # ⭐ NUEVO
-        
-        analisis['metricas_rag']['total_recursos_rag'] = len(cuentos) + len(canciones) + len(actividades)
+        recursos = [
+            (tipo, doc)
+            for carpeta, tipo in self.TIPOS_RECURSO
+            for doc in retrieved_docs.get(carpeta, [])
+        ]
+        analisis['metricas_rag']['total_recursos_rag'] = len(recursos)
+        
+        # Matriz segmento del plan x recurso
+        segmentos, modulo_de_segmento = self._plan_segments(plan_data)
+        matriz = self._similarity_matrix(segmentos, recursos)
+        similitud_plan = matriz.max(axis=0) if segmentos else np.zeros(len(recursos))
+        
+        # Actividades que el plan declara tomadas de la biblioteca
+        fuentes_biblioteca = [
+            act.get('fuente_actividad', '').lower()
+            for modulo in plan_data.get('modulos', [])
+            for act in modulo.get('actividades_desarrollo', [])
+            if act.get('basada_en_actividad_biblioteca') == 'SI'
+        ]
         
-        # Análisis mejorado: Buscar coincidencias semánticas
         recursos_encontrados = []
-        
-        # Procesar cuentos
-        for cuento in cuentos:
-            filename = cuento['metadata'].get('filename', '')
-            clean_name = Path(filename).stem.replace('_', ' ').lower()
-            similitud = cuento.get('similarity', 0)
-            
-            usado = False
-            keywords = clean_name.split()[:3]
+        for indice, (tipo, doc) in enumerate(recursos):
+            similitud = float(similitud_plan[indice])
+            filename = doc['metadata'].get('filename', '').lower()
+            declarada = tipo == 'actividad' and any(filename and filename in fuente for fuente in fuentes_biblioteca)
+            usado = declarada or similitud >= UMBRAL_USO_RECURSO
             
-            for keyword in keywords:
-                if len(keyword) > 3 and keyword in plan_text_lower:
-                    usado = True
-                    break
-            
-            # También revisar si está en la sección de recursos
-            recursos_plan = plan_data.get('recursos_educativos', {})
-            cuentos_recomendados = recursos_plan.get('cuentos_recomendados', [])
-            
-            for cuento_rec in cuentos_recomendados:
-                titulo = cuento_rec.get('titulo', '').lower()
-                if any(kw in titulo for kw in keywords if len(kw) > 3):
-                    usado = True
-                    break
-            
-            if usado or similitud >= 0.65:
-                recurso_info = self._format_recurso(cuento, 'cuento', similitud)
-                recursos_encontrados.append(recurso_info)
-                if usado:
-                    analisis['metricas_rag']['recursos_utilizados'] += 1
-        
-        # Procesar canciones
-        for cancion in canciones:
-            filename = cancion['metadata'].get('filename', '')
-            clean_name = Path(filename).stem.replace('_', ' ').lower()
-            similitud = cancion.get('similarity', 0)
-            
-            usado = False
-            keywords = clean_name.split()[:4]
-            
-            for keyword in keywords:
-                if len(keyword) > 4 and keyword in plan_text_lower:
-                    usado = True
-                    break
-            
-            recursos_plan = plan_data.get('recursos_educativos', {})
-            canciones_recomendadas = recursos_plan.get('canciones_recomendadas', [])
-            
-            for cancion_rec in canciones_recomendadas:
-                titulo = cancion_rec.get('titulo', '').lower()
-                if any(kw in titulo for kw in keywords if len(kw) > 3):
-                    usado = True
-                    break
-            
-            if usado or similitud >= 0.65:
-                recurso_info = self._format_recurso(cancion, 'cancion', similitud)
-                recursos_encontrados.append(recurso_info)
-                if usado:
-                    analisis['metricas_rag']['recursos_utilizados'] += 1
-        
-        # ⭐ PROCESAR ACTIVIDADES
-        for actividad in actividades:
-            filename = actividad['metadata'].get('filename', '')
-            clean_name = Path(filename).stem.replace('_', ' ').lower()
-            similitud = actividad.get('similarity', 0)
-            
-            usado = False
-            
-            # Buscar en actividades_desarrollo
-            for modulo in plan_data.get('modulos', []):
-                for act in modulo.get('actividades_desarrollo', []):
-                    # Si está marcada como basada en biblioteca
-                    if act.get('basada_en_actividad_biblioteca') == 'SI':
-                        fuente = act.get('fuente_actividad', '').lower()
-                        if filename.lower() in fuente or clean_name in act.get('nombre', '').lower():
-                            usado = True
-                            analisis['metricas_rag']['actividades_biblioteca_usadas'] += 1
-                            break
-                if usado:
-                    break
+            if usado:
+                analisis['metricas_rag']['recursos_utilizados'] += 1
+                if tipo == 'actividad':
+                    analisis['metricas_rag']['actividades_biblioteca_usadas'] += 1
             
-            # Buscar en actividades_complementarias
-            if not usado:
-                recursos_plan = plan_data.get('recursos_educativos', {})
-                actividades_complementarias = recursos_plan.get('actividades_complementarias', [])
-                
-                for act_comp in actividades_complementarias:
-                    titulo = act_comp.get('titulo', '').lower()
-                    keywords = clean_name.split()[:3]
-                    if any(kw in titulo for kw in keywords if len(kw) > 3):
-                        usado = True
-                        analisis['metricas_rag']['actividades_biblioteca_usadas'] += 1
-                        break
-            
-            if usado or similitud >= 0.65:
-                recurso_info = self._format_recurso(actividad, 'actividad', similitud)
-                recursos_encontrados.append(recurso_info)
-                if usado:
-                    analisis['metricas_rag']['recursos_utilizados'] += 1
+            if usado or similitud >= threshold:
+                recursos_encontrados.append(self._format_recurso(doc, tipo, similitud))
         
         # Ordenar por similitud
         recursos_encontrados.sort(key=lambda x: x['similitud_porcentaje'], reverse=True)
@@ -1660,7 +1740,7 @@ class RAGAnalyzer:
         recursos_plan = plan_data.get('recursos_educativos', {})
         total_cuentos_plan = len(recursos_plan.get('cuentos_recomendados', []))
         total_canciones_plan = len(recursos_plan.get('canciones_recomendadas', []))
-        total_actividades_plan = len(recursos_plan.get('actividades_complementarias', []))  # ⭐ NUEVO
+        total_actividades_plan = len(recursos_plan.get('actividades_complementarias', []))
         total_recursos_plan = total_cuentos_plan + total_canciones_plan + total_actividades_plan
         
         if total_recursos_plan > 0:
@@ -1675,7 +1755,6 @@ class RAGAnalyzer:
                 if cancion_plan.get('tipo') == 'RECURSO REAL':
                     recursos_rag_en_plan += 1
             
-            # ⭐ Contar actividades de la biblioteca
             for actividad_plan in recursos_plan.get('actividades_complementarias', []):
                 if actividad_plan.get('tipo') == 'RECURSO REAL':
                     recursos_rag_en_plan += 1
@@ -1704,10 +1783,15 @@ class RAGAnalyzer:
                 1
             )
         
+        if recursos:
+            analisis['similitud_general'] = round(float(similitud_plan.mean()) * 100, 1)
+        
         # Analizar por módulo
         analisis['recursos_por_modulo'] = self._analyze_modules(
             plan_data,
-            retrieved_docs,
+            recursos,
+            matriz,
+            modulo_de_segmento,
             threshold
         )
         
@@ -1720,45 +1804,119 @@ class RAGAnalyzer:
         
         return analisis
     
-    def _extract_plan_text(self, plan_data: Dict) -> str:
-        """Extrae el texto completo del plan para análisis"""
-        texts = []
-        
-        texts.append(plan_data.get('nombre_plan', ''))
-        texts.append(plan_data.get('campo_formativo_principal', ''))
+    def _plan_segments(self, plan_data: Dict) -> Tuple[List[str], List[int]]:
+        """
+        Textos del plan a comparar: cada módulo, cada una de sus actividades
+        y los recursos educativos recomendados
         
-        for modulo in plan_data.get('modulos', []):
-            texts.append(modulo.get('nombre', ''))
-            texts.append(modulo.get('aprendizaje_esperado', ''))
-            
-            if modulo.get('actividad_inicio'):
-                texts.append(modulo['actividad_inicio'].get('descripcion', ''))
-            
-            for act in modulo.get('actividades_desarrollo', []):
-                texts.append(act.get('descripcion', ''))
-                # ⭐ Incluir nombre de actividad y fuente
-                texts.append(act.get('nombre', ''))
-                texts.append(act.get('fuente_actividad', ''))
+        Returns:
+            Los textos y, para cada uno, el índice de su módulo (-1 si no
+            pertenece a ninguno)
+        """
+        segmentos = []
+        modulo_de_segmento = []
+        
+        def agregar(indice_modulo: int, *partes):
+            # Solo las partes con texto: un módulo vacío no debe quedar como "."
+            texto = '. '.join(filter(None, (str(parte).strip() for parte in partes if parte)))
+            if texto:
+                segmentos.append(texto)
+                modulo_de_segmento.append(indice_modulo)
+        
+        for indice, modulo in enumerate(plan_data.get('modulos', [])):
+            agregar(indice, modulo.get('nombre'), modulo.get('aprendizaje_esperado'))
             
-            if modulo.get('actividad_cierre'):
-                texts.append(modulo['actividad_cierre'].get('descripcion', ''))
+            actividades = [
+                modulo.get('actividad_inicio'),
+                *modulo.get('actividades_desarrollo', []),
+                modulo.get('actividad_cierre')
+            ]
+            for act in actividades:
+                if act:
+                    agregar(indice, act.get('nombre'), act.get('descripcion'))
         
-        # Incluir recursos educativos
         recursos = plan_data.get('recursos_educativos', {})
+        for clave in ('cuentos_recomendados', 'canciones_recomendadas', 'actividades_complementarias'):
+            for recurso in recursos.get(clave, []):
+                agregar(-1, recurso.get('titulo'), recurso.get('descripcion_breve'))
+        
+        return segmentos, modulo_de_segmento
+    
+    def _library_embeddings(self, docs: List[Dict]) -> Dict[str, np.ndarray]:
+        """
+        Embedding de cada recurso de la biblioteca: suma de los embeddings
+        normalizados de sus chunks en el vector store
+        
+        Los chunks se leen por id cuando el catálogo los conoce y, si no,
+        filtrando por nombre de archivo.
+        """
+        vector_store = self.rag_system.vector_store
+        ids = [chunk_id for doc in docs for chunk_id in doc['metadata'].get('embedding_ids', ())]
+        sin_ids = sorted({
+            doc['metadata'].get('filename', '')
+            for doc in docs
+            if not doc['metadata'].get('embedding_ids')
+        } - {''})
+        
+        embeddings = []
+        metadatas = []
+        if ids:
+            resultado = vector_store.get_embeddings(ids=ids)
+            embeddings.extend(resultado['embeddings'])
+            metadatas.extend(resultado['metadatas'])
+        if sin_ids:
+            resultado = vector_store.get_embeddings({
+                '$and': [
+                    {'user_email': 'general'},
+                    {'filename': {'$in': sin_ids}}
+                ]
+            })
+            embeddings.extend(resultado['embeddings'])
+            metadatas.extend(resultado['metadatas'])
         
-        for cuento in recursos.get('cuentos_recomendados', []):
-            texts.append(cuento.get('titulo', ''))
-            texts.append(cuento.get('descripcion_breve', ''))
+        if not embeddings:
+            return {}
         
-        for cancion in recursos.get('canciones_recomendadas', []):
-            texts.append(cancion.get('titulo', ''))
+        vectores = normalizar_filas(np.asarray(embeddings, dtype=np.float32))
+        nombres_chunk = [metadata.get('filename', '') for metadata in metadatas]
         
-        # ⭐ Incluir actividades complementarias
-        for actividad in recursos.get('actividades_complementarias', []):
-            texts.append(actividad.get('titulo', ''))
-            texts.append(actividad.get('descripcion_breve', ''))
+        unicos, inverso = np.unique(nombres_chunk, return_inverse=True)
+        sumas = np.zeros((len(unicos), vectores.shape[1]), dtype=np.float32)
+        np.add.at(sumas, inverso, vectores)
         
-        return ' '.join(filter(None, texts))
+        return dict(zip(unicos.tolist(), sumas))
+    
+    def _similarity_matrix(self, segmentos: List[str], recursos: List[Tuple[str, Dict]]) -> np.ndarray:
+        """
+        Matriz coseno segmento x recurso
+        
+        Los segmentos del plan, y los recursos que no estén en el vector
+        store, se embeben juntos en un solo lote.
+        """
+        embeddings = self.rag_system.embeddings
+        dimension = embeddings.dimension
+        
+        nombres = [doc['metadata'].get('filename', '') for _, doc in recursos]
+        biblioteca = {
+            nombre: vector
+            for nombre, vector in self._library_embeddings([doc for _, doc in recursos]).items()
+            if vector.shape == (dimension,)
+        }
+        faltantes = [indice for indice, nombre in enumerate(nombres) if nombre not in biblioteca]
+        
+        textos = segmentos + [recursos[indice][1].get('text', '') for indice in faltantes]
+        lote = np.zeros((0, dimension), dtype=np.float32)
+        if textos:
+            lote = np.asarray(embeddings.embed_documents(textos), dtype=np.float32).reshape(len(textos), dimension)
+        
+        vectores_recursos = np.zeros((len(recursos), dimension), dtype=np.float32)
+        for indice, nombre in enumerate(nombres):
+            if nombre in biblioteca:
+                vectores_recursos[indice] = biblioteca[nombre]
+        for fila, indice in enumerate(faltantes):
+            vectores_recursos[indice] = lote[len(segmentos) + fila]
+        
+        return normalizar_filas(lote[:len(segmentos)]) @ normalizar_filas(vectores_recursos).T
     
     def _format_recurso(self, doc: Dict, tipo: str, similitud: float) -> Dict:
         """Formatea un recurso RAG para presentación"""
@@ -1778,21 +1936,7 @@ class RAGAnalyzer:
             'contenido_completo': texto,
             'fragmento': texto[:300] + '...' if len(texto) > 300 else texto,
             'filename': filename,
-            'acceso': 'GRATUITO',
-            'markdown_formato': f"""---
-### 📚 {titulo}
-
-**Tipo:** {tipo.upper()}  
-**Disponibilidad:** Biblioteca Digital ProfeGo  
-**Acceso:** GRATUITO  
-**Similitud con el plan:** {round(similitud * 100, 1)}%
-
-**Contenido:**
-
-{texto[:500]}...
-
----
-"""
+            'acceso': 'GRATUITO'
         }
     
     def _get_similarity_level(self, similitud: float) -> str:
@@ -1811,68 +1955,47 @@ class RAGAnalyzer:
     def _analyze_modules(
         self,
         plan_data: Dict,
-        retrieved_docs: Dict,
+        recursos: List[Tuple[str, Dict]],
+        matriz: np.ndarray,
+        modulo_de_segmento: List[int],
         threshold: float
     ) -> List[Dict]:
-        """Analiza similitud por módulo - INCLUYE ACTIVIDADES"""
-        modulos_analisis = []
+        """
+        Relevancia por módulo: para cada recurso, la mayor similitud con el
+        módulo o con alguna de sus actividades
+        """
+        modulos = plan_data.get('modulos', [])
+        if not modulos or not recursos or matriz.size == 0:
+            return []
         
-        for modulo in plan_data.get('modulos', []):
-            modulo_text = f"{modulo.get('nombre', '')} {modulo.get('aprendizaje_esperado', '')}"
-            modulo_text_lower = modulo_text.lower()
-            
-            if not modulo_text.strip():
-                continue
-            
+        # Matriz módulo x recurso (máximo sobre los segmentos de cada módulo)
+        indices = np.asarray(modulo_de_segmento)
+        del_modulo = indices >= 0
+        relevancia = np.full((len(modulos), len(recursos)), -1.0, dtype=np.float32)
+        np.maximum.at(relevancia, indices[del_modulo], matriz[del_modulo])
+        
+        # Top 5 por módulo, de mayor a menor
+        orden = np.argsort(-relevancia, axis=1)[:, :5]
+        
+        modulos_analisis = []
+        for indice, modulo in enumerate(modulos):
             recursos_modulo = []
-            
-            # Buscar cuentos relacionados
-            for cuento in retrieved_docs.get('cuentos', []):
-                filename = cuento['metadata'].get('filename', '')
-                clean_name = Path(filename).stem.replace('_', ' ')
-                similitud = cuento.get('similarity', 0)
-                
-                keywords = clean_name.lower().split()[:3]
-                if any(kw in modulo_text_lower for kw in keywords if len(kw) > 3):
-                    recursos_modulo.append({
-                        'titulo': clean_name.title(),
-                        'tipo': 'cuento',
-                        'similitud': round(similitud * 100, 1)
-                    })
-            
-            # Buscar canciones relacionadas
-            for cancion in retrieved_docs.get('canciones', []):
-                filename = cancion['metadata'].get('filename', '')
-                clean_name = Path(filename).stem.replace('_', ' ')
-                similitud = cancion.get('similarity', 0)
-                
-                keywords = clean_name.lower().split()[:3]
-                if any(kw in modulo_text_lower for kw in keywords if len(kw) > 3):
-                    recursos_modulo.append({
-                        'titulo': clean_name.title(),
-                        'tipo': 'cancion',
-                        'similitud': round(similitud * 100, 1)
-                    })
-            
-            # ⭐ Buscar actividades relacionadas
-            for actividad in retrieved_docs.get('actividades', []):
-                filename = actividad['metadata'].get('filename', '')
-                clean_name = Path(filename).stem.replace('_', ' ')
-                similitud = actividad.get('similarity', 0)
-                
-                keywords = clean_name.lower().split()[:3]
-                if any(kw in modulo_text_lower for kw in keywords if len(kw) > 3):
-                    recursos_modulo.append({
-                        'titulo': clean_name.title(),
-                        'tipo': 'actividad',
-                        'similitud': round(similitud * 100, 1)
-                    })
+            for columna in orden[indice]:
+                similitud = float(relevancia[indice, columna])
+                if similitud < threshold:
+                    break
+                tipo, doc = recursos[columna]
+                recursos_modulo.append({
+                    'titulo': Path(doc['metadata'].get('filename', '')).stem.replace('_', ' ').title(),
+                    'tipo': tipo,
+                    'similitud': round(similitud * 100, 1)
+                })
             
             if recursos_modulo:
                 modulos_analisis.append({
                     'numero': modulo.get('numero', 0),
                     'nombre': modulo.get('nombre', ''),
-                    'recursos_relacionados': recursos_modulo[:5]  # Top 5
+                    'recursos_relacionados': recursos_modulo
                 })
         
         return modulos_analisis
@@ -1892,23 +2015,164 @@ async def initialize_rag_analyzer():
         logger.info("✅ RAG Analyzer inicializado")
 
 
+# ============================================================================
+# ANÁLISIS RAG PRECALCULADO
+# ============================================================================
+
+# Subir al cambiar RAGAnalyzer: los análisis guardados se recalculan
+VERSION_ANALIZADOR_RAG = "3"
+
+def nombre_analisis_rag(plan_id: str) -> str:
+    """Nombre del análisis RAG guardado de un plan, junto a su JSON en processed/"""
+    return f"{plan_id}_analysis.json"
+
+def cargar_documentos_rag(recursos_metadata: Dict, biblioteca: LibrarySnapshot) -> Dict:
+    """
+    Reconstruye retrieved_docs con los recursos que se recuperaron al
+    generar el plan, tomados del catálogo de la biblioteca
+    """
+    retrieved_docs = {carpeta: [] for carpeta in biblioteca.documentos}
+    
+    for carpeta in retrieved_docs:
+        for recurso_meta in recursos_metadata.get(carpeta, []):
+            documento = biblioteca.documento(carpeta, recurso_meta.get('nombre', ''))
+            if documento is None:
+                continue
+            
+            retrieved_docs[carpeta].append({
+                'text': documento.texto,
+                'metadata': {
+                    'filename': documento.filename,
+                    'document_type': documento.tipo,
+                    'embedding_ids': documento.embedding_ids
+                },
+                'similarity': recurso_meta.get('similitud', 0.75)
+            })
+    
+    return retrieved_docs
+
+def calcular_analisis_rag(plan_id: str, plan_data: Dict) -> Dict:
+    """
+    Análisis RAG completo de un plan (bloqueante: calcula embeddings)
+    
+    Devuelve la respuesta del endpoint; si el análisis se pudo hacer
+    incluye las versiones de biblioteca y analizador con que se calculó.
+    """
+    rag_metadata = plan_data.get('rag_metadata', {})
+    
+    if not rag_metadata or not rag_metadata.get('recursos_recuperados'):
+        logger.warning(f"Plan sin metadata RAG: {plan_id}")
+        return {
+            'success': False,
+            'message': 'Este plan no tiene metadata RAG.',
+            'plan_name': plan_data.get('nombre_plan'),
+            'sugerencia': 'Genera un nuevo plan para que incluya análisis RAG automáticamente.'
+        }
+    
+    biblioteca = library_catalog.snapshot()
+    retrieved_docs = cargar_documentos_rag(rag_metadata['recursos_recuperados'], biblioteca)
+    
+    total_recursos = sum(len(docs) for docs in retrieved_docs.values())
+    logger.info(f"📊 Total recursos cargados: {total_recursos} (cuentos: {len(retrieved_docs['cuentos'])}, canciones: {len(retrieved_docs['canciones'])}, actividades: {len(retrieved_docs['actividades'])})")
+    
+    if total_recursos == 0:
+        return {
+            'success': False,
+            'message': 'Los recursos RAG del plan ya no están en la biblioteca.',
+            'plan_name': plan_data.get('nombre_plan')
+        }
+    
+    analisis = rag_analyzer.analyze_plan_rag_match(
+        plan_data,
+        retrieved_docs,
+        threshold=0.50
+    )
+    
+    # El contenido completo de cada recurso viaja una sola vez, en
+    # recursos_completos; el resumen del análisis lleva solo el fragmento
+    # y el frontend arma el markdown del recurso
+    recursos_completos = analisis['recursos_altamente_relevantes']
+    analisis['recursos_altamente_relevantes'] = [
+        {clave: valor for clave, valor in recurso.items() if clave != 'contenido_completo'}
+        for recurso in recursos_completos
+    ]
+    
+    return {
+        'success': True,
+        'plan_id': plan_id,
+        'plan_name': plan_data.get('nombre_plan'),
+        'analisis': analisis,
+        'recursos_completos': recursos_completos,
+        'version_biblioteca': biblioteca.version,
+        'version_analizador': VERSION_ANALIZADOR_RAG
+    }
+
+def analisis_rag_vigente(resultado: Optional[Dict]) -> bool:
+    """Indica si un análisis guardado corresponde a la biblioteca y analizador actuales"""
+    return bool(resultado) and (
+        resultado.get('version_analizador') == VERSION_ANALIZADOR_RAG
+        and resultado.get('version_biblioteca') == library_catalog.snapshot().version
+    )
+
+def guardar_analisis_rag(email: str, plan_id: str, resultado: Dict, reemplazar: bool = False):
+    """
+    Guarda el análisis RAG de un plan en processed/ para las consultas siguientes
+    
+    Con reemplazar=True se elimina antes la copia anterior (versión vieja),
+    que de otro modo podría encontrarse primero al buscar por nombre.
+    """
+    nombre_analisis = nombre_analisis_rag(plan_id)
+    
+    if reemplazar:
+        storage_manager.eliminar_archivo(email=email, nombre_archivo=nombre_analisis, es_procesado=True)
+    
+    resultado_guardado = storage_manager.subir_archivo_desde_bytes(
+        contenido=json.dumps(resultado, ensure_ascii=False).encode('utf-8'),
+        email=email,
+        nombre_archivo=nombre_analisis,
+        es_procesado=True
+    )
+    
+    if resultado_guardado['success']:
+        logger.info(f"🔬 Análisis RAG guardado: {nombre_analisis}")
+    else:
+        logger.warning(f"⚠️ No se pudo guardar el análisis {nombre_analisis}: {resultado_guardado.get('error')}")
+
+def generar_y_guardar_analisis_rag(email: str, plan_data: Dict):
+    """
+    Calcula y guarda el análisis RAG de un plan recién creado (tarea en segundo plano)
+    """
+    if rag_analyzer is None:
+        return
+    
+    try:
+        resultado = calcular_analisis_rag(plan_data['plan_id'], plan_data)
+        if resultado['success']:
+            guardar_analisis_rag(email, plan_data['plan_id'], resultado)
+    except Exception as e:
+        logger.error(f"❌ Error calculando análisis RAG de {plan_data.get('plan_id')}: {e}")
+
+
 # ============================================================================
 # RUTAS DE ANÁLISIS RAG
 # ============================================================================
 
-@app.get("/api/plans/{plan_id}/rag-analysis")
+@app.get("/api/plans/{plan_id}/rag-analysis", response_class=ORJSONResponse)
 async def analyze_plan_rag(
     plan_id: str,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Endpoint: Análisis completo de similitud RAG (INCLUYE ACTIVIDADES)
+    
+    El análisis se calcula al generar el plan y se guarda como
+    {plan_id}_analysis.json; solo se recalcula si cambió la biblioteca
+    RAG o la versión del analizador.
     """
     user_email = current_user["email"]
     
     try:
-        logger.info(f"🔍 Iniciando análisis RAG para plan: {plan_id}")
-        
         if rag_analyzer is None or rag_system is None:
             logger.warning("Sistema RAG no disponible")
             return {
@@ -1916,11 +2180,24 @@ async def analyze_plan_rag(
                 'message': 'El sistema de análisis RAG no está disponible en este momento.'
             }
         
+        guardado = await run_in_threadpool(
+            storage_manager.obtener_archivo_bytes,
+            email=user_email,
+            nombre_archivo=nombre_analisis_rag(plan_id),
+            es_procesado=True
+        )
+        
+        analisis_guardado = json.loads(guardado.decode('utf-8')) if guardado else None
+        if await run_in_threadpool(analisis_rag_vigente, analisis_guardado):
+            return analisis_guardado
+        
+        logger.info(f"🔍 Calculando análisis RAG para plan: {plan_id}")
+        
         # Obtener el plan
-        filename = f"{plan_id}.json"
-        contenido = gcs_storage.obtener_archivo_bytes(
+        contenido = await run_in_threadpool(
+            storage_manager.obtener_archivo_bytes,
             email=user_email,
-            nombre_archivo=filename,
+            nombre_archivo=f"{plan_id}.json",
             es_procesado=True
         )
         
@@ -1929,159 +2206,16 @@ async def analyze_plan_rag(
             raise HTTPException(status_code=404, detail="Plan no encontrado")
         
         plan_data = json.loads(contenido.decode('utf-8'))
-        logger.info(f"✅ Plan cargado: {plan_data.get('nombre_plan')}")
-        
-        # Verificar metadata RAG
-        rag_metadata = plan_data.get('rag_metadata', {})
-        
-        if not rag_metadata or not rag_metadata.get('recursos_recuperados'):
-            logger.warning(f"Plan sin metadata RAG: {plan_id}")
-            return {
-                'success': False,
-                'message': 'Este plan no tiene metadata RAG.',
-                'plan_name': plan_data.get('nombre_plan'),
-                'sugerencia': 'Genera un nuevo plan para que incluya análisis RAG automáticamente.'
-            }
-        
-        # Reconstruir retrieved_docs desde metadata
-        retrieved_docs = {
-            'cuentos': [],
-            'canciones': [],
-            'actividades': []  # ⭐ NUEVO
-        }
-        
-        logger.info("📚 Reconstruyendo documentos RAG desde metadata...")
-        
-        recursos_metadata = rag_metadata.get('recursos_recuperados', {})
-        
-        # Buscar cuentos
-        cuentos_dir = Path('./rag_data/cuentos')
-        for cuento_meta in recursos_metadata.get('cuentos', []):
-            filename_cuento = cuento_meta.get('nombre', '')
-            if not filename_cuento:
-                continue
-                
-            cuento_path = cuentos_dir / filename_cuento
-            
-            if cuento_path.exists():
-                try:
-                    with open(cuento_path, 'r', encoding='utf-8') as f:
-                        contenido_cuento = f.read()
-                    
-                    retrieved_docs['cuentos'].append({
-                        'text': contenido_cuento,
-                        'metadata': {
-                            'filename': filename_cuento,
-                            'document_type': 'cuento'
-                        },
-                        'similarity': cuento_meta.get('similitud', 0.75)
-                    })
-                    logger.info(f"✅ Cuento cargado: {filename_cuento}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Error leyendo cuento {filename_cuento}: {e}")
-        
-        # Buscar canciones
-        canciones_dir = Path('./rag_data/canciones')
-        for cancion_meta in recursos_metadata.get('canciones', []):
-            filename_cancion = cancion_meta.get('nombre', '')
-            if not filename_cancion:
-                continue
-                
-            cancion_path = canciones_dir / filename_cancion
-            
-            if cancion_path.exists():
-                try:
-                    with open(cancion_path, 'r', encoding='utf-8') as f:
-                        contenido_cancion = f.read()
-                    
-                    retrieved_docs['canciones'].append({
-                        'text': contenido_cancion,
-                        'metadata': {
-                            'filename': filename_cancion,
-                            'document_type': 'cancion'
-                        },
-                        'similarity': cancion_meta.get('similitud', 0.75)
-                    })
-                    logger.info(f"✅ Canción cargada: {filename_cancion}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Error leyendo canción {filename_cancion}: {e}")
-        
-        # ⭐ Buscar actividades
-        actividades_dir = Path('./rag_data/actividades')
-        for actividad_meta in recursos_metadata.get('actividades', []):
-            filename_actividad = actividad_meta.get('nombre', '')
-            if not filename_actividad:
-                continue
-                
-            actividad_path = actividades_dir / filename_actividad
-            
-            if actividad_path.exists():
-                try:
-                    with open(actividad_path, 'r', encoding='utf-8') as f:
-                        contenido_actividad = f.read()
-                    
-                    retrieved_docs['actividades'].append({
-                        'text': contenido_actividad,
-                        'metadata': {
-                            'filename': filename_actividad,
-                            'document_type': 'actividad'
-                        },
-                        'similarity': actividad_meta.get('similitud', 0.75)
-                    })
-                    logger.info(f"✅ Actividad cargada: {filename_actividad}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Error leyendo actividad {filename_actividad}: {e}")
-        
-        total_recursos = len(retrieved_docs['cuentos']) + len(retrieved_docs['canciones']) + len(retrieved_docs['actividades'])
-        logger.info(f"📊 Total recursos cargados: {total_recursos} (cuentos: {len(retrieved_docs['cuentos'])}, canciones: {len(retrieved_docs['canciones'])}, actividades: {len(retrieved_docs['actividades'])})")
-        
-        if total_recursos == 0:
-            return {
-                'success': False,
-                'message': 'No se pudieron cargar los recursos RAG desde el filesystem.',
-                'plan_name': plan_data.get('nombre_plan')
-            }
         
-        # Realizar análisis
-        logger.info("🔬 Analizando similitud semántica...")
-        analisis = rag_analyzer.analyze_plan_rag_match(
-            plan_data,
-            retrieved_docs,
-            threshold=0.50
-        )
+        resultado = await run_in_threadpool(calcular_analisis_rag, plan_id, plan_data)
         
-        logger.info(f"✅ Análisis completado: {analisis['metricas_rag']['porcentaje_uso_rag']}% uso RAG")
-        logger.info(f"   Actividades biblioteca usadas: {analisis['metricas_rag']['actividades_biblioteca_usadas']}")
-        
-        # Generar recursos formateados
-        recursos_completos = []
-        for recurso in analisis['recursos_altamente_relevantes']:
-            recursos_completos.append({
-                **recurso,
-                'markdown_formato': f"""---
-### 📚 Recurso Educativo Relacionado
-
-**Título:** {recurso['titulo']}  
-**Tipo:** {recurso['tipo'].upper()}  
-**Fuente:** {recurso['fuente']}  
-**Similitud con el plan:** {recurso['similitud_porcentaje']}% ({recurso['similitud_nivel']})  
-**Acceso:** {recurso['acceso']}
-
-**Contenido completo:**
-
-{recurso['contenido_completo']}
-
----
-"""
-            })
+        if resultado['success']:
+            logger.info(f"✅ Análisis completado: {resultado['analisis']['metricas_rag']['porcentaje_uso_rag']}% uso RAG")
+            background_tasks.add_task(
+                guardar_analisis_rag, user_email, plan_id, resultado, analisis_guardado is not None
+            )
         
-        return {
-            'success': True,
-            'plan_id': plan_id,
-            'plan_name': plan_data.get('nombre_plan'),
-            'analisis': analisis,
-            'recursos_completos': recursos_completos
-        }
+        return resultado
         
     except HTTPException:
         raise
@@ -2100,26 +2234,22 @@ async def analyze_plan_rag(
 @app.get("/api/rag/debug/status")
 async def rag_debug_status():
     """Endpoint de debug para verificar estado del sistema RAG"""
-    cuentos_path = Path('./rag_data/cuentos')
-    canciones_path = Path('./rag_data/canciones')
-    actividades_path = Path('./rag_data/actividades')
-    
-    cuentos_files = list(cuentos_path.glob('**/*.txt')) if cuentos_path.exists() else []
-    canciones_files = list(canciones_path.glob('**/*.txt')) if canciones_path.exists() else []
-    actividades_files = list(actividades_path.glob('**/*.txt')) if actividades_path.exists() else []
+    biblioteca = await run_in_threadpool(library_catalog.snapshot)
+    directorios = {carpeta: directorio for carpeta, (_, directorio) in library_catalog.directorios.items()}
     
     status = {
         'rag_system_initialized': rag_system is not None,
         'rag_analyzer_initialized': rag_analyzer is not None,
         'filesystem': {
-            'cuentos_dir_exists': cuentos_path.exists(),
-            'canciones_dir_exists': canciones_path.exists(),
-            'actividades_dir_exists': actividades_path.exists(),
-            'cuentos_files': [f.name for f in cuentos_files],
-            'canciones_files': [f.name for f in canciones_files],
-            'actividades_files': [f.name for f in actividades_files],
-            'total_files': len(cuentos_files) + len(canciones_files) + len(actividades_files)
-        }
+            'cuentos_dir_exists': directorios['cuentos'].exists(),
+            'canciones_dir_exists': directorios['canciones'].exists(),
+            'actividades_dir_exists': directorios['actividades'].exists(),
+            'cuentos_files': list(biblioteca.archivos('cuentos')),
+            'canciones_files': list(biblioteca.archivos('canciones')),
+            'actividades_files': list(biblioteca.archivos('actividades')),
+            'total_files': biblioteca.total
+        },
+        'library_version': biblioteca.version
     }
     
     if rag_system:
@@ -2170,23 +2300,176 @@ async def serve_menu():
     else:
         raise HTTPException(status_code=404, detail="menu.html no encontrado")
 
+# ============================================================================
+# LIMPIEZA DE CAS (contenido sin referencias)
+# ============================================================================
+
+# Cada cuánto se barre cas/ y cuánto tiempo sin usarse debe llevar un
+# contenido sin referencias antes de borrarlo
+CAS_GC_INTERVAL_SECONDS = float(os.getenv("CAS_GC_INTERVAL_SECONDS", "3600"))
+CAS_GC_GRACE_SECONDS = float(os.getenv("CAS_GC_GRACE_SECONDS", "3600"))
+
+tarea_limpieza_cas: Optional[asyncio.Task] = None
+
+async def limpiar_cas_periodicamente():
+    """Tarea de fondo: borra de cas/ el contenido que ya no referencia ningún usuario"""
+    while True:
+        try:
+            resultado = await run_in_threadpool(
+                storage_manager.recolectar_cas_huerfanos, CAS_GC_GRACE_SECONDS
+            )
+            if resultado['eliminados']:
+                logger.info(
+                    f"🧹 cas/: {resultado['eliminados']} de {resultado['revisados']} objetos "
+                    f"eliminados ({resultado['bytes_liberados'] / (1024*1024):.2f} MB)"
+                )
+        except Exception as e:
+            logger.error(f"❌ Error limpiando cas/: {e}")
+        await asyncio.sleep(CAS_GC_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def iniciar_limpieza_cas():
+    """Arranca el barrido periódico de cas/"""
+    global tarea_limpieza_cas
+    tarea_limpieza_cas = asyncio.create_task(limpiar_cas_periodicamente())
+
+@app.on_event("shutdown")
+async def detener_limpieza_cas():
+    """Detiene el barrido periódico de cas/"""
+    if tarea_limpieza_cas is not None:
+        tarea_limpieza_cas.cancel()
+
+# ============================================================================
+# SONDAS DE SALUD (livez / readyz)
+# ============================================================================
+
+# Intervalo con el que la tarea de fondo revisa los componentes
+HEALTH_REFRESH_SECONDS = float(os.getenv("HEALTH_REFRESH_SECONDS", "30"))
+
+# Último estado conocido de los componentes; /readyz solo lo lee. Se
+# reemplaza completo en cada revisión, nunca se modifica en sitio.
+estado_componentes: Dict = {
+    'verificado_en': None,
+    'storage_disponible': False,
+    'ultimo_storage_ok': None,
+    'rag_inicializado': False,
+    'modelo_embeddings_cargado': False,
+    'vectores': None,
+    'biblioteca_documentos': 0
+}
+tarea_estado_componentes: Optional[asyncio.Task] = None
+
+def verificar_componentes(anterior: Dict) -> Dict:
+    """
+    Revisa almacenamiento, sistema RAG y biblioteca (bloqueante: el
+    almacenamiento puede hacer una llamada de red)
+    """
+    ahora = datetime.now().isoformat()
+    
+    try:
+        storage_ok = storage_manager.esta_disponible()
+    except Exception as e:
+        logger.warning(f"⚠️ Almacenamiento no disponible: {e}")
+        storage_ok = False
+    
+    vectores = None
+    if rag_system is not None:
+        vectores = rag_system.get_stats().get('total_documents')
+    
+    return {
+        'verificado_en': ahora,
+        'storage_disponible': storage_ok,
+        'ultimo_storage_ok': ahora if storage_ok else anterior.get('ultimo_storage_ok'),
+        'rag_inicializado': rag_system is not None and rag_analyzer is not None,
+        'modelo_embeddings_cargado': getattr(getattr(rag_system, 'embeddings', None), 'model', None) is not None,
+        'vectores': vectores,
+        'biblioteca_documentos': library_catalog.snapshot().total
+    }
+
+async def refrescar_estado_componentes():
+    """Tarea de fondo: actualiza estado_componentes cada HEALTH_REFRESH_SECONDS"""
+    global estado_componentes
+    
+    while True:
+        try:
+            estado_componentes = await run_in_threadpool(verificar_componentes, estado_componentes)
+        except Exception as e:
+            logger.error(f"❌ Error revisando componentes: {e}")
+        await asyncio.sleep(HEALTH_REFRESH_SECONDS)
+
+@app.on_event("startup")
+async def iniciar_estado_componentes():
+    """Arranca la revisión periódica de componentes (después de inicializar RAG)"""
+    global tarea_estado_componentes
+    tarea_estado_componentes = asyncio.create_task(refrescar_estado_componentes())
+
+@app.on_event("shutdown")
+async def detener_estado_componentes():
+    """Detiene la revisión periódica de componentes"""
+    if tarea_estado_componentes is not None:
+        tarea_estado_componentes.cancel()
+
+@app.get("/livez")
+async def liveness():
+    """Sonda de vida: el proceso responde (sin E/S)"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness():
+    """
+    Sonda de disponibilidad con el estado en cache de los componentes
+    
+    Responde 503 hasta la primera revisión y mientras el almacenamiento no
+    esté disponible; el RAG es opcional y solo se reporta.
+    """
+    estado = estado_componentes
+    listo = estado['verificado_en'] is not None and estado['storage_disponible']
+    
+    return JSONResponse(
+        content={
+            "status": "ready" if listo else "not_ready",
+            "storage_backend": storage_manager.nombre_backend,
+            **estado
+        },
+        status_code=200 if listo else 503
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Duración por etapa de las peticiones trazadas (generación de planes),
+    en formato de texto de Prometheus: histogramas y percentiles p50/p95/p99
+    """
+    return PlainTextResponse(
+        metricas.prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 @app.get("/health")
 async def health_check():
     """Verificar estado del servicio"""
     try:
-        gcs_status = "connected" if gcs_storage.bucket.exists() else "disconnected"
+        storage_ok = await run_in_threadpool(storage_manager.esta_disponible)
+        storage_status = "connected" if storage_ok else "disconnected"
         gemini_configured = bool(os.getenv("GEMINI_API_KEY"))
         
-        # Verificar biblioteca RAG
-        cuentos_count = len(list(Path('./rag_data/cuentos').glob('**/*.txt')))
-        canciones_count = len(list(Path('./rag_data/canciones').glob('**/*.txt')))
-        actividades_count = len(list(Path('./rag_data/actividades').glob('**/*.txt')))
+        # Biblioteca RAG (del catálogo en memoria)
+        conteos = (await run_in_threadpool(library_catalog.snapshot)).conteos()
+        cuentos_count = conteos['cuentos']
+        canciones_count = conteos['canciones']
+        actividades_count = conteos['actividades']
+        
+        # gcs_status y bucket_name se mantienen para los monitores existentes
+        es_gcs = storage_manager.nombre_backend == "gcs"
         
         return {
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
-            "gcs_status": gcs_status,
-            "bucket_name": gcs_storage.bucket_name,
+            "gcs_status": storage_status if es_gcs else "not_configured",
+            "bucket_name": getattr(storage_manager, 'bucket_name', None),
+            "storage_backend": storage_manager.nombre_backend,
+            "storage_status": storage_status,
+            "storage_location": storage_manager.ubicacion,
             "frontend_dir": FRONTEND_DIR,
             "frontend_exists": os.path.exists(FRONTEND_DIR),
             "gemini_configured": gemini_configured,
@@ -2216,7 +2499,7 @@ if __name__ == "__main__":
     print("🚀 ProfeGo API v2.0 - Servidor Iniciando")
     print("=" * 60)
     print(f"📁 Frontend: {FRONTEND_DIR}")
-    print(f"☁️ GCS Bucket: {gcs_storage.bucket_name}")
+    print(f"☁️ Almacenamiento ({storage_manager.nombre_backend}): {storage_manager.ubicacion}")
     print(f"📦 Límite de archivo: {MAX_FILE_SIZE / (1024*1024)}MB")
     print(f"🔐 CORS Origins: {allowed_origins}")
     print(f"🤖 Gemini AI: {'✅ Configurado' if os.getenv('GEMINI_API_KEY') else '❌ No configurado'}")
@@ -0,0 +1,211 @@
+"""
+Catálogo en memoria de la biblioteca RAG (cuentos, canciones y actividades)
+
+La biblioteca es texto de solo lectura en la práctica: se carga una vez y
+se sirve desde una instantánea inmutable. La instantánea se reconstruye
+cuando cambia el manifiesto de archivos (nombre, tamaño y fecha de
+modificación), que se revisa como máximo cada refresh_seconds; en una
+reconstrucción solo se vuelven a leer los archivos que cambiaron.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# carpeta -> (tipo de documento en el vector store, directorio)
+DIRECTORIOS_BIBLIOTECA = {
+    'cuentos': ('cuento', './rag_data/cuentos'),
+    'canciones': ('cancion', './rag_data/canciones'),
+    'actividades': ('actividad', './rag_data/actividades')
+}
+
+
+@dataclass(frozen=True)
+class LibraryDocument:
+    """Un recurso de la biblioteca"""
+    filename: str
+    tipo: str
+    titulo: str
+    texto: str
+    embedding_ids: Tuple[str, ...] = ()
+    tamano: int = 0
+    modificado_ns: int = 0
+
+
+@dataclass(frozen=True)
+class LibrarySnapshot:
+    """Estado inmutable de la biblioteca en un momento dado"""
+    version: str
+    documentos: Mapping[str, Mapping[str, LibraryDocument]]
+    cargado_en: float = field(default_factory=time.time)
+    
+    def documento(self, carpeta: str, filename: str) -> Optional[LibraryDocument]:
+        """Documento de una carpeta por nombre de archivo, o None"""
+        return self.documentos.get(carpeta, {}).get(filename)
+    
+    def archivos(self, carpeta: str) -> Tuple[str, ...]:
+        """Nombres de archivo de una carpeta, ordenados"""
+        return tuple(sorted(self.documentos.get(carpeta, {})))
+    
+    def conteos(self) -> Dict[str, int]:
+        """Cantidad de documentos por carpeta"""
+        return {carpeta: len(documentos) for carpeta, documentos in self.documentos.items()}
+    
+    @property
+    def total(self) -> int:
+        return sum(len(documentos) for documentos in self.documentos.values())
+
+
+class LibraryCatalog:
+    """
+    Catálogo de la biblioteca con recarga por manifiesto
+    
+    snapshot() devuelve siempre una instantánea completa; los lectores no
+    necesitan bloqueo porque las instantáneas nunca se modifican.
+    """
+    
+    def __init__(
+        self,
+        directorios: Optional[Dict[str, Tuple[str, str]]] = None,
+        refresh_seconds: float = 60,
+        vector_store=None
+    ):
+        """
+        Args:
+            directorios: carpeta -> (tipo, directorio); por defecto rag_data
+            refresh_seconds: Intervalo mínimo entre revisiones del manifiesto
+            vector_store: VectorStore del que tomar los ids de los chunks
+        """
+        self.directorios = {
+            carpeta: (tipo, Path(directorio))
+            for carpeta, (tipo, directorio) in (directorios or DIRECTORIOS_BIBLIOTECA).items()
+        }
+        self.refresh_seconds = refresh_seconds
+        self.vector_store = vector_store
+        
+        self._lock = threading.Lock()
+        self._snapshot: Optional[LibrarySnapshot] = None
+        self._revisado = 0.0
+    
+    def set_vector_store(self, vector_store):
+        """Asocia el vector store y recarga los ids de embeddings"""
+        self.vector_store = vector_store
+        self.refresh(force=True)
+    
+    def snapshot(self) -> LibrarySnapshot:
+        """Instantánea actual (revisa el manifiesto si ya pasó el intervalo)"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._revisado < self.refresh_seconds:
+            return snapshot
+        return self.refresh()
+    
+    def refresh(self, force: bool = False) -> LibrarySnapshot:
+        """
+        Revisa el manifiesto y reconstruye la instantánea si cambió
+        
+        Args:
+            force: Reconstruir aunque el manifiesto no haya cambiado (por
+                ejemplo después de reindexar el vector store)
+        """
+        with self._lock:
+            # Otro hilo pudo haber revisado mientras se esperaba el bloqueo
+            if not force and self._snapshot is not None and time.monotonic() - self._revisado < self.refresh_seconds:
+                return self._snapshot
+            
+            manifiesto = self._manifiesto()
+            version = self._version(manifiesto)
+            
+            if force or self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = self._construir(manifiesto, version)
+                logger.info(f"📚 Catálogo de biblioteca cargado: {self._snapshot.conteos()} (versión {version})")
+            
+            self._revisado = time.monotonic()
+            return self._snapshot
+    
+    def _manifiesto(self) -> Dict[str, Dict[str, Tuple[Path, int, int]]]:
+        """carpeta -> filename -> (ruta, tamaño, fecha de modificación)"""
+        manifiesto = {}
+        for carpeta, (_, directorio) in self.directorios.items():
+            archivos = {}
+            if directorio.exists():
+                for ruta in sorted(directorio.glob('**/*.txt')):
+                    try:
+                        stat = ruta.stat()
+                    except OSError:
+                        continue
+                    # Como en el vector store, el documento se identifica por nombre
+                    archivos.setdefault(ruta.name, (ruta, stat.st_size, stat.st_mtime_ns))
+            manifiesto[carpeta] = archivos
+        return manifiesto
+    
+    def _version(self, manifiesto: Dict[str, Dict[str, Tuple[Path, int, int]]]) -> str:
+        huella = hashlib.sha256()
+        for carpeta in sorted(manifiesto):
+            for filename, (ruta, tamano, modificado_ns) in sorted(manifiesto[carpeta].items()):
+                huella.update(f"{carpeta}/{filename}:{tamano}:{modificado_ns}\n".encode('utf-8'))
+        return huella.hexdigest()[:16]
+    
+    def _construir(self, manifiesto, version: str) -> LibrarySnapshot:
+        """Nueva instantánea, reutilizando los documentos que no cambiaron"""
+        anterior = self._snapshot
+        embedding_ids = self._embedding_ids()
+        
+        documentos = {}
+        for carpeta, archivos in manifiesto.items():
+            tipo = self.directorios[carpeta][0]
+            por_nombre = {}
+            
+            for filename, (ruta, tamano, modificado_ns) in archivos.items():
+                previo = anterior.documento(carpeta, filename) if anterior else None
+                
+                if previo is not None and (previo.tamano, previo.modificado_ns) == (tamano, modificado_ns):
+                    texto = previo.texto
+                else:
+                    try:
+                        texto = ruta.read_text(encoding='utf-8')
+                    except (OSError, UnicodeDecodeError) as e:
+                        logger.warning(f"⚠️ Error leyendo {tipo} {filename}: {e}")
+                        continue
+                
+                por_nombre[filename] = LibraryDocument(
+                    filename=filename,
+                    tipo=tipo,
+                    titulo=Path(filename).stem.replace('_', ' ').title(),
+                    texto=texto,
+                    embedding_ids=embedding_ids.get((tipo, filename), ()),
+                    tamano=tamano,
+                    modificado_ns=modificado_ns
+                )
+            
+            documentos[carpeta] = MappingProxyType(por_nombre)
+        
+        return LibrarySnapshot(version=version, documentos=MappingProxyType(documentos))
+    
+    def _embedding_ids(self) -> Dict[Tuple[str, str], Tuple[str, ...]]:
+        """(tipo, filename) -> ids de los chunks de la biblioteca general"""
+        if self.vector_store is None:
+            return {}
+        
+        resultado = self.vector_store.get_metadata({'user_email': 'general'})
+        
+        ids = {}
+        for chunk_id, metadata in zip(resultado['ids'], resultado['metadatas']):
+            clave = (metadata.get('document_type', ''), metadata.get('filename', ''))
+            ids.setdefault(clave, []).append(chunk_id)
+        return {clave: tuple(sorted(valores)) for clave, valores in ids.items()}
+
+
+def crear_catalogo_biblioteca(vector_store=None) -> LibraryCatalog:
+    """Catálogo de rag_data con el intervalo de RAG_LIBRARY_REFRESH_SECONDS"""
+    return LibraryCatalog(
+        refresh_seconds=float(os.getenv("RAG_LIBRARY_REFRESH_SECONDS", "60")),
+        vector_store=vector_store
+    )
@@ -7,6 +7,8 @@ from sentence_transformers import SentenceTransformer
 from typing import List
 import logging
 
+from tracing import span
+
 logger = logging.getLogger(__name__)
 
 class GeminiEmbeddings:
@@ -44,7 +46,8 @@ class GeminiEmbeddings:
                 logger.warning("Texto vacio recibido para embedding")
                 return [0.0] * self.dimension
             
-            embedding = self.model.encode(text, show_progress_bar=False)
+            with span("rag.embedding"):
+                embedding = self.model.encode(text, show_progress_bar=False)
             return embedding.tolist()
             
         except Exception as e:
@@ -65,11 +68,12 @@ class GeminiEmbeddings:
             logger.info(f"Generando {len(texts)} embeddings...")
             
             # Procesar en batch (más eficiente)
-            embeddings = self.model.encode(
-                texts, 
-                show_progress_bar=False,
-                batch_size=8  # Procesar de 8 en 8
-            )
+            with span("rag.embedding"):
+                embeddings = self.model.encode(
+                    texts, 
+                    show_progress_bar=False,
+                    batch_size=8  # Procesar de 8 en 8
+                )
             
             logger.info(f"{len(embeddings)} embeddings generados")
             return [emb.tolist() for emb in embeddings]
@@ -10,6 +10,8 @@ import logging
 import os
 from pathlib import Path
 
+from tracing import span
+
 logger = logging.getLogger(__name__)
 
 class VectorStore:
@@ -134,12 +136,13 @@ class VectorStore:
             Resultados de la búsqueda
         """
         try:
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                where=filter_metadata,
-                include=['documents', 'metadatas', 'distances']
-            )
+            with span("rag.chroma"):
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=n_results,
+                    where=filter_metadata,
+                    include=['documents', 'metadatas', 'distances']
+                )
             
             logger.info(f"🔍 Query ejecutado: {len(results['documents'][0])} resultados")
             
@@ -157,6 +160,68 @@ class VectorStore:
                 'distances': []
             }
     
+    def get_embeddings(
+        self,
+        filter_metadata: Optional[Dict] = None,
+        ids: Optional[List[str]] = None
+    ) -> Dict:
+        """
+        Obtiene los embeddings guardados de los chunks por filtro o por ids
+        
+        Args:
+            filter_metadata: Filtros de metadata (ej: {'filename': {'$in': [...]}})
+            ids: Ids de los chunks
+        
+        Returns:
+            Embeddings y metadata de cada chunk
+        """
+        try:
+            results = self.collection.get(
+                ids=ids,
+                where=filter_metadata,
+                include=['embeddings', 'metadatas']
+            )
+            
+            return {
+                'embeddings': results['embeddings'],
+                'metadatas': results['metadatas']
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo embeddings: {e}")
+            return {
+                'embeddings': [],
+                'metadatas': []
+            }
+    
+    def get_metadata(self, filter_metadata: Dict) -> Dict:
+        """
+        Obtiene ids y metadata (sin textos ni embeddings) de los chunks que cumplen un filtro
+        
+        Args:
+            filter_metadata: Filtros de metadata (ej: {'user_email': 'general'})
+        
+        Returns:
+            Ids y metadata de cada chunk
+        """
+        try:
+            results = self.collection.get(
+                where=filter_metadata,
+                include=['metadatas']
+            )
+            
+            return {
+                'ids': results['ids'],
+                'metadatas': results['metadatas']
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo metadata: {e}")
+            return {
+                'ids': [],
+                'metadatas': []
+            }
+    
     def delete_documents(self, filter_metadata: Dict) -> bool:
         """
         Elimina documentos basados en metadata
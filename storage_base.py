@@ -0,0 +1,408 @@
+"""
+Interfaz común de almacenamiento de archivos de usuario
+Estructura: users/{email}/uploads|processed/{año}/{mes}/archivo
+
+Implementaciones:
+- GCSStorageManagerV2 (gcs_storage.py): Google Cloud Storage
+- LocalStorageManager (local_storage.py): disco local, para desarrollo y benchmarks
+
+El backend se elige con STORAGE_BACKEND=gcs|local (ver crear_storage_backend).
+
+Retención de cas/: los originales y textos procesados viven en cas/ mientras
+algún archivo de users/ los referencie. Al eliminar el último archivo que
+apunta a un contenido, ese contenido se borra en el siguiente barrido de
+recolectar_cas_huerfanos (la API lo ejecuta cada CAS_GC_INTERVAL_SECONDS),
+una vez que lleva más de CAS_GC_GRACE_SECONDS sin usarse. El texto procesado
+de un original se conserva mientras el original siga referenciado.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional, Dict, Union
+from datetime import datetime
+import os
+import json
+
+
+# Almacenamiento direccionado por contenido
+PREFIJO_CAS_ORIGINALES = "cas/sha256"
+PREFIJO_CAS_PROCESADOS = "cas/procesados"
+
+# Marcador persistente de usuario conocido: users/{email}/MARCADOR_USUARIO
+MARCADOR_USUARIO = ".profego-user"
+
+
+class StorageBackend(ABC):
+    """
+    Operaciones de almacenamiento que usa la API, independientes del proveedor
+    """
+    
+    # Identificador del backend ("gcs" o "local") y ubicación legible
+    nombre_backend: str = ""
+    ubicacion: str = ""
+    
+    # ---------------- Rutas compartidas ----------------
+    
+    def _normalizar_email(self, email: str) -> str:
+        """
+        Normaliza el email para usarlo como nombre de carpeta
+        """
+        return email.replace("@", "_").replace(".", "_")
+    
+    def _obtener_fecha_path(self) -> str:
+        """
+        Obtiene la ruta de fecha actual (año/mes)
+        """
+        now = datetime.now()
+        return f"{now.year}/{now.month:02d}"
+    
+    def _construir_ruta(self, email: str, es_procesado: bool, nombre_archivo: str,
+                       fecha_personalizada: Optional[str] = None) -> str:
+        """
+        Construye la ruta completa del archivo
+        
+        Args:
+            email: Email del usuario
+            es_procesado: Si es archivo procesado o original
+            nombre_archivo: Nombre del archivo
+            fecha_personalizada: Fecha en formato "YYYY/MM" (opcional)
+        
+        Returns:
+            Ruta: users/{email}/uploads|processed/{año}/{mes}/archivo
+        """
+        usuario_normalizado = self._normalizar_email(email)
+        tipo_carpeta = "processed" if es_procesado else "uploads"
+        fecha_path = fecha_personalizada or self._obtener_fecha_path()
+        
+        return f"users/{usuario_normalizado}/{tipo_carpeta}/{fecha_path}/{nombre_archivo}"
+    
+    def _ruta_marcador_usuario(self, email: str) -> str:
+        """
+        Ruta del marcador que indica que el usuario ya fue registrado
+        """
+        return f"users/{self._normalizar_email(email)}/{MARCADOR_USUARIO}"
+    
+    def _ruta_cas_original(self, sha256: str) -> str:
+        """
+        Ruta del objeto compartido para un original con ese SHA-256
+        """
+        return f"{PREFIJO_CAS_ORIGINALES}/{sha256[:2]}/{sha256}"
+    
+    def _ruta_cas_procesado(self, sha256_original: str) -> str:
+        """
+        Ruta del texto procesado derivado de un original con ese SHA-256
+        """
+        return f"{PREFIJO_CAS_PROCESADOS}/{sha256_original[:2]}/{sha256_original}.txt"
+    
+    def _sha256_de_ruta_cas(self, ruta_cas: str) -> str:
+        """
+        SHA-256 del original a partir de la ruta de un objeto de cas/
+        """
+        return ruta_cas.rsplit('/', 1)[-1].split('.', 1)[0]
+    
+    # ---------------- Operaciones de cada backend ----------------
+    
+    @abstractmethod
+    def esta_disponible(self) -> bool:
+        """
+        Indica si el almacenamiento responde (usado por /health)
+        """
+    
+    @abstractmethod
+    def _crear_marcador_usuario(self, ruta: str, contenido: bytes) -> bool:
+        """
+        Escribe el marcador de usuario solo si no existe
+        
+        Returns:
+            True si se creó, False si ya existía
+        """
+    
+    @abstractmethod
+    def subir_archivo_desde_bytes(self, contenido: bytes, email: str,
+                                  nombre_archivo: str, es_procesado: bool = False) -> Dict:
+        """
+        Guarda un archivo desde bytes
+        
+        Returns:
+            Dict con success, filename, path, size y url; o success=False y error
+        """
+    
+    @abstractmethod
+    def guardar_original_en_cas(self, ruta_local: Optional[str], sha256: str,
+                                content_type: Optional[str] = None,
+                                contenido: Optional[bytes] = None) -> bool:
+        """
+        Guarda el contenido de un original en cas/ sin crear la referencia
+        del usuario (el archivo no aparece en sus uploads)
+        
+        El contenido viene de ruta_local o, si el archivo se recibió en
+        memoria, de contenido (con ruta_local=None). Si nadie lo referencia
+        después, lo borra recolectar_cas_huerfanos.
+        
+        Returns:
+            True si el contenido ya existía (deduplicado), False si se guardó
+        """
+    
+    @abstractmethod
+    def crear_referencia_original(self, sha256: str, tamano: int, email: str,
+                                  nombre_archivo: str,
+                                  content_type: Optional[str] = None) -> Dict:
+        """
+        Crea en uploads/ el archivo del usuario para un original ya guardado
+        con guardar_original_en_cas
+        
+        Returns:
+            Dict con success, filename, path, size y url
+        """
+    
+    @abstractmethod
+    def existe_procesado_por_hash(self, sha256_original: str) -> bool:
+        """
+        Indica si el contenido con ese SHA-256 ya tiene texto procesado
+        """
+    
+    @abstractmethod
+    def obtener_procesado_por_hash(self, sha256_original: str) -> Optional[bytes]:
+        """
+        Obtiene el texto procesado de un original ya convertido, o None
+        """
+    
+    @abstractmethod
+    def guardar_procesado_por_hash(self, sha256_original: str, contenido: bytes) -> bool:
+        """
+        Guarda el texto procesado de un original para reutilizarlo en el futuro
+        """
+    
+    @abstractmethod
+    def subir_procesado_deduplicado(self, sha256_original: str, email: str,
+                                    nombre_archivo: str,
+                                    contenido: Optional[Union[bytes, Iterable[bytes]]] = None) -> Dict:
+        """
+        Crea el .txt procesado del usuario a partir del texto compartido
+        
+        contenido puede ser bytes o un iterable de bloques (texto generado en
+        streaming); si es None el texto debe existir ya por hash.
+        """
+    
+    @abstractmethod
+    def obtener_archivo_bytes(self, email: str, nombre_archivo: str,
+                              es_procesado: bool = False) -> Optional[bytes]:
+        """
+        Obtiene el contenido de un archivo como bytes, o None si no existe
+        """
+    
+    @abstractmethod
+    def obtener_archivo_condicional(self, email: str, nombre_archivo: str,
+                                    es_procesado: bool = False,
+                                    versiones_conocidas: Iterable[str] = ()) -> Optional[Dict]:
+        """
+        Obtiene un archivo solo si su versión no es una de las conocidas
+        
+        La versión cambia cada vez que el objeto se reescribe (generation y
+        metageneration en GCS; inodo, mtime y tamaño en disco), por lo que
+        sirve como ETag sin leer el contenido.
+        
+        Returns:
+            None si no existe; si no, dict con 'version' y 'contenido'
+            (None cuando la versión está en versiones_conocidas)
+        """
+    
+    @abstractmethod
+    def listar_archivos(self, email: str, tipo: str = "uploads") -> List[Dict]:
+        """
+        Lista los archivos de un usuario (más reciente primero)
+        
+        Returns:
+            Lista de dicts con name, size, size_mb, date, created, path,
+            content_type y version (la de obtener_archivo_condicional)
+        """
+    
+    @abstractmethod
+    def eliminar_archivo(self, email: str, nombre_archivo: str,
+                        es_procesado: bool = False) -> Dict:
+        """
+        Elimina un archivo del usuario
+        """
+    
+    @abstractmethod
+    def obtener_url_descarga_temporal(self, email: str, nombre_archivo: str,
+                                     es_procesado: bool = False,
+                                     expiracion_minutos: int = 60,
+                                     disposicion: Optional[str] = None,
+                                     tamano_minimo: int = 0) -> Optional[str]:
+        """
+        Genera una URL temporal de descarga directa
+        
+        Returns:
+            URL o None si no existe, es menor a tamano_minimo o no se pudo generar
+        """
+    
+    @abstractmethod
+    def recolectar_cas_huerfanos(self, antiguedad_minima_segundos: float = 3600) -> Dict:
+        """
+        Borra los objetos de cas/ a los que ya no apunta ningún archivo de users/
+        
+        Solo se borran objetos sin usar (creados o deduplicados) desde hace
+        más de antiguedad_minima_segundos, para no competir con subidas en
+        curso que todavía no crearon su referencia.
+        
+        Returns:
+            Dict con revisados, eliminados y bytes_liberados
+        """
+    
+    # ---------------- Operaciones compartidas ----------------
+    
+    def subir_original_deduplicado(self, ruta_local: Optional[str], sha256: str, tamano: int,
+                                   email: str, nombre_archivo: str,
+                                   content_type: Optional[str] = None,
+                                   contenido: Optional[bytes] = None) -> Dict:
+        """
+        Guarda un archivo original una sola vez por contenido y crea la
+        referencia del usuario
+        
+        Si ya existe un objeto con el mismo SHA-256 no se vuelve a subir; en
+        ambos casos el usuario recibe una referencia con su nombre de archivo.
+        
+        Returns:
+            Dict con información del archivo y 'deduplicado'
+        """
+        try:
+            deduplicado = self.guardar_original_en_cas(ruta_local, sha256, content_type, contenido)
+            resultado = self.crear_referencia_original(sha256, tamano, email, nombre_archivo, content_type)
+            resultado['deduplicado'] = deduplicado
+            return resultado
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e),
+                'filename': nombre_archivo
+            }
+    
+    def inicializar_usuario(self, email: str) -> bool:
+        """
+        Registra al usuario como conocido
+        
+        No hay carpetas que crear: los prefijos users/{email}/... aparecen con
+        el primer archivo. El marcador persistente se escribe solo si no
+        existe, por lo que otros workers o un reinicio pagan como máximo una
+        escritura condicional, y dentro del proceso ninguna.
+        """
+        if email in self.usuarios_inicializados:
+            return True
+        
+        try:
+            contenido = json.dumps({
+                "email": email,
+                "registrado": datetime.now().isoformat()
+            }).encode("utf-8")
+            
+            if self._crear_marcador_usuario(self._ruta_marcador_usuario(email), contenido):
+                print(f"✓ Usuario registrado: {self._normalizar_email(email)}")
+            
+            self.usuarios_inicializados.add(email)
+            return True
+            
+        except Exception as e:
+            print(f"✗ Error inicializando usuario {email}: {e}")
+            return False
+    
+    def descargar_archivo(self, email: str, nombre_archivo: str,
+                         destino_local: str, es_procesado: bool = False) -> Dict:
+        """
+        Descarga un archivo del almacenamiento a un archivo local
+        """
+        try:
+            contenido = self.obtener_archivo_bytes(email, nombre_archivo, es_procesado)
+            
+            if contenido is None:
+                return {
+                    'success': False,
+                    'error': f'Archivo no encontrado: {nombre_archivo}'
+                }
+            
+            # Guardar en archivo local
+            with open(destino_local, 'wb') as f:
+                f.write(contenido)
+            
+            return {
+                'success': True,
+                'filename': nombre_archivo,
+                'local_path': destino_local,
+                'size': len(contenido)
+            }
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def obtener_info_almacenamiento(self, email: str) -> Dict:
+        """
+        Obtiene información detallada del almacenamiento del usuario
+        """
+        try:
+            archivos_subidos = self.listar_archivos(email, "uploads")
+            archivos_procesados = self.listar_archivos(email, "processed")
+            
+            total_size_subidos = sum(archivo['size'] for archivo in archivos_subidos)
+            total_size_procesados = sum(archivo['size'] for archivo in archivos_procesados)
+            total_size = total_size_subidos + total_size_procesados
+            
+            return {
+                "email": email,
+                "total_files": len(archivos_subidos) + len(archivos_procesados),
+                "uploaded_files": len(archivos_subidos),
+                "processed_files": len(archivos_procesados),
+                "total_size_bytes": total_size,
+                "total_size_mb": f"{total_size / (1024*1024):.2f}",
+                "uploaded_size_mb": f"{total_size_subidos / (1024*1024):.2f}",
+                "processed_size_mb": f"{total_size_procesados / (1024*1024):.2f}",
+                "storage_structure": {
+                    "uploads_by_month": self._agrupar_por_fecha(archivos_subidos),
+                    "processed_by_month": self._agrupar_por_fecha(archivos_procesados)
+                }
+            }
+        
+        except Exception as e:
+            return {
+                "error": str(e),
+                "email": email,
+                "total_files": 0
+            }
+    
+    def _agrupar_por_fecha(self, archivos: List[Dict]) -> Dict:
+        """
+        Agrupa archivos por año/mes
+        """
+        agrupados = {}
+        for archivo in archivos:
+            fecha = archivo.get('date', 'sin_fecha')
+            if fecha not in agrupados:
+                agrupados[fecha] = []
+            agrupados[fecha].append(archivo['name'])
+        return agrupados
+
+
+def crear_storage_backend() -> StorageBackend:
+    """
+    Crea el backend de almacenamiento según STORAGE_BACKEND
+    
+    - gcs (por defecto): bucket GCS_BUCKET_NAME
+    - local: directorio LOCAL_STORAGE_DIR (por defecto ./local_storage)
+    """
+    backend = os.getenv("STORAGE_BACKEND", "gcs").strip().lower()
+    
+    if backend == "local":
+        from local_storage import LocalStorageManager
+        return LocalStorageManager(
+            base_dir=os.getenv("LOCAL_STORAGE_DIR", "./local_storage")
+        )
+    
+    if backend == "gcs":
+        from gcs_storage import GCSStorageManagerV2
+        return GCSStorageManagerV2(
+            bucket_name=os.getenv("GCS_BUCKET_NAME", "bucket-profe-go")
+        )
+    
+    raise ValueError(f"STORAGE_BACKEND no soportado: {backend} (usa 'gcs' o 'local')")
@@ -185,6 +185,50 @@ async def test_full_system():
         traceback.print_exc()
         return False
 
+def test_plan_segments():
+    """Prueba que los módulos y actividades vacíos no generan segmentos"""
+    print("\n" + "="*60)
+    print("🧪 TEST 5: Segmentos del plan para el análisis RAG")
+    print("="*60)
+    
+    try:
+        from main import RAGAnalyzer
+        
+        plan = {
+            'modulos': [
+                {
+                    'nombre': 'Los animales',
+                    'aprendizaje_esperado': 'Reconoce animales de la granja',
+                    'actividad_inicio': {'nombre': 'Adivinanzas', 'descripcion': ''},
+                    'actividades_desarrollo': [{}],
+                    'actividad_cierre': None
+                },
+                {
+                    'nombre': '',
+                    'aprendizaje_esperado': '  ',
+                    'actividad_inicio': {},
+                    'actividades_desarrollo': [{'nombre': '', 'descripcion': ''}]
+                }
+            ],
+            'recursos_educativos': {
+                'cuentos_recomendados': [{'titulo': '', 'descripcion_breve': ''}]
+            }
+        }
+        
+        segmentos, modulo_de_segmento = RAGAnalyzer(None)._plan_segments(plan)
+        
+        assert segmentos == ['Los animales. Reconoce animales de la granja', 'Adivinanzas'], segmentos
+        assert modulo_de_segmento == [0, 0], modulo_de_segmento
+        
+        print(f"✅ Segmentos generados: {len(segmentos)}")
+        print(f"   El módulo vacío no generó segmentos")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error en test de segmentos del plan: {e}")
+        return False
+
 async def run_all_tests():
     """Ejecuta todos los tests"""
     print("\n" + "🚀"*30)
@@ -205,6 +249,9 @@ async def run_all_tests():
     # Test 4: Sistema completo
     results['full_system'] = await test_full_system()
     
+    # Test 5: Segmentos del plan
+    results['plan_segments'] = test_plan_segments()
+    
     # Resumen
     print("\n" + "="*60)
     print("📊 RESUMEN DE PRUEBAS")
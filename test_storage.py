@@ -0,0 +1,151 @@
+"""
+Script de prueba del almacenamiento de originales
+Usa el backend local en un directorio temporal y un Gemini simulado
+"""
+
+import asyncio
+import os
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+# El backend local en un directorio temporal, antes de importar la API
+DIRECTORIO_PRUEBA = tempfile.mkdtemp(prefix="profego-storage-")
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["LOCAL_STORAGE_DIR"] = DIRECTORIO_PRUEBA
+
+EMAIL = "docente@test.com"
+
+def crear_cliente(resultado_gemini):
+    """Cliente de la API con usuario fijo y Gemini simulado"""
+    from fastapi.testclient import TestClient
+    import main
+    
+    async def generar_plan_simulado(plan_text, diagnostico_text=None):
+        return resultado_gemini
+    
+    main.generar_plan_estudio = generar_plan_simulado
+    main.app.dependency_overrides[main.get_current_user] = lambda: {"email": EMAIL, "token": "test"}
+    return main, TestClient(main.app)
+
+def test_generacion_fallida_conserva_archivos():
+    """Una generación fallida no toca un original con el mismo nombre"""
+    print("\n" + "="*60)
+    print("🧪 TEST 1: Generación fallida con un archivo del mismo nombre")
+    print("="*60)
+    
+    try:
+        main, cliente = crear_cliente({'success': False, 'error': 'Gemini no disponible'})
+        storage = main.storage_manager
+        
+        # Original previo del docente con el mismo nombre
+        respuesta = cliente.post(
+            "/api/files/upload",
+            files={'files': ('plan.txt', 'Plan del ciclo anterior ' * 20, 'text/plain')}
+        )
+        assert respuesta.status_code == 200, respuesta.text
+        antes = storage.listar_archivos(EMAIL, "uploads")
+        
+        respuesta = cliente.post(
+            "/api/plans/generate",
+            files={
+                'plan_file': ('plan.txt', 'Plan del ciclo nuevo ' * 20, 'text/plain'),
+                'diagnostico_file': ('diagnostico.txt', 'Diagnóstico del grupo ' * 20, 'text/plain')
+            }
+        )
+        assert respuesta.status_code == 500, respuesta.text
+        
+        despues = storage.listar_archivos(EMAIL, "uploads")
+        assert [a['name'] for a in despues] == ['plan.txt'], despues
+        assert despues[0]['version'] == antes[0]['version'], (antes, despues)
+        contenido = storage.obtener_archivo_bytes(EMAIL, 'plan.txt')
+        assert contenido.startswith(b'Plan del ciclo anterior'), contenido[:40]
+        
+        print(f"✅ El original previo se conservó sin cambios")
+        
+        # Lo recibido en la petición fallida queda sin referencias en cas/
+        resultado = storage.recolectar_cas_huerfanos(0)
+        assert resultado['eliminados'] > 0, resultado
+        assert storage.obtener_archivo_bytes(EMAIL, 'plan.txt') == contenido
+        
+        print(f"✅ Barrido de cas/: {resultado['eliminados']} objetos sin referencias eliminados")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ Error en test de generación fallida: {e}")
+        return False
+
+def test_generacion_exitosa_crea_referencias():
+    """Con el plan guardado los originales aparecen en los uploads"""
+    print("\n" + "="*60)
+    print("🧪 TEST 2: Generación exitosa")
+    print("="*60)
+    
+    try:
+        main, cliente = crear_cliente({
+            'success': True,
+            'plan': {'nombre_plan': 'Plan de prueba', 'modulos': []}
+        })
+        storage = main.storage_manager
+        
+        respuesta = cliente.post(
+            "/api/plans/generate",
+            files={
+                'plan_file': ('plan.txt', 'Plan del ciclo nuevo ' * 20, 'text/plain'),
+                'diagnostico_file': ('diagnostico.txt', 'Diagnóstico del grupo ' * 20, 'text/plain')
+            }
+        )
+        assert respuesta.status_code == 200, respuesta.text
+        
+        nombres = sorted(a['name'] for a in storage.listar_archivos(EMAIL, "uploads"))
+        assert nombres == ['diagnostico.txt', 'plan.txt'], nombres
+        assert storage.obtener_archivo_bytes(EMAIL, 'plan.txt').startswith(b'Plan del ciclo nuevo')
+        
+        print(f"✅ Originales referenciados: {nombres}")
+        
+        return True
+    
+    except Exception as e:
+        print(f"❌ Error en test de generación exitosa: {e}")
+        return False
+
+async def run_all_tests():
+    """Ejecuta todos los tests"""
+    print("\n" + "🚀"*30)
+    print("SUITE DE PRUEBAS - Almacenamiento ProfeGo")
+    print("🚀"*30)
+    
+    results = {}
+    
+    try:
+        # Test 1: Generación fallida
+        results['generacion_fallida'] = test_generacion_fallida_conserva_archivos()
+        
+        # Test 2: Generación exitosa
+        results['generacion_exitosa'] = test_generacion_exitosa_crea_referencias()
+    finally:
+        shutil.rmtree(DIRECTORIO_PRUEBA, ignore_errors=True)
+    
+    # Resumen
+    print("\n" + "="*60)
+    print("📊 RESUMEN DE PRUEBAS")
+    print("="*60)
+    
+    for test_name, passed in results.items():
+        status = "✅ PASÓ" if passed else "❌ FALLÓ"
+        print(f"{status} - {test_name}")
+    
+    total = len(results)
+    passed = sum(results.values())
+    
+    print("\n" + "="*60)
+    print(f"🎯 Resultado: {passed}/{total} pruebas pasaron")
+    print("="*60)
+
+if __name__ == "__main__":
+    asyncio.run(run_all_tests())
@@ -0,0 +1,188 @@
+"""
+Trazas ligeras por petición y métricas de duración por etapa
+
+Una traza se abre con iniciar_traza() al comienzo de una petición y queda
+en una ContextVar, así que la ven también las funciones que corren en el
+threadpool (run_in_threadpool copia el contexto). Cada etapa se mide con
+
+    with span("ocr.extraccion"):
+        ...
+
+Los spans con el mismo nombre se acumulan (por ejemplo las tres consultas
+a Chroma). Fuera de una traza un span no registra nada. Al cerrar la traza
+el total de cada etapa se agrega a un histograma por etapa, que /metrics
+expone en formato de texto de Prometheus con percentiles p50/p95/p99.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterator, Optional, Tuple
+import os
+import threading
+import time
+
+
+# Límites de los buckets del histograma, en segundos
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CUANTILES = (0.5, 0.95, 0.99)
+# Muestras recientes por etapa con que se calculan los percentiles
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1024"))
+
+_traza_actual: ContextVar[Optional["Traza"]] = ContextVar("traza_actual", default=None)
+
+
+class Traza:
+    """Duraciones acumuladas por etapa de una petición"""
+    
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.etapas: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def registrar(self, etapa: str, segundos: float):
+        with self._lock:
+            self.etapas[etapa] = self.etapas.get(etapa, 0.0) + segundos
+    
+    def timings_ms(self) -> Dict[str, float]:
+        """Etapas en milisegundos, en el orden en que terminaron"""
+        with self._lock:
+            return {etapa: round(segundos * 1000, 1) for etapa, segundos in self.etapas.items()}
+
+
+@contextmanager
+def span(etapa: str) -> Iterator[None]:
+    """Mide una etapa dentro de la traza actual (no hace nada sin traza)"""
+    traza = _traza_actual.get()
+    if traza is None:
+        yield
+        return
+    
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        traza.registrar(etapa, time.perf_counter() - inicio)
+
+
+@contextmanager
+def iniciar_traza(nombre: str) -> Iterator[Traza]:
+    """
+    Abre una traza para la petición actual
+    
+    Al salir registra la etapa "total" y agrega todas las etapas a los
+    histogramas, también cuando la petición termina con error.
+    """
+    traza = Traza(nombre)
+    token = _traza_actual.set(traza)
+    inicio = time.perf_counter()
+    try:
+        yield traza
+    finally:
+        traza.registrar("total", time.perf_counter() - inicio)
+        _traza_actual.reset(token)
+        metricas.observar_traza(traza)
+
+
+def trazar(nombre: str):
+    """Decorador para endpoints async: cada llamada corre dentro de una traza"""
+    def decorador(funcion):
+        @wraps(funcion)
+        async def envoltura(*args, **kwargs):
+            with iniciar_traza(nombre):
+                return await funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def traza_actual() -> Optional[Traza]:
+    """Traza de la petición en curso, o None"""
+    return _traza_actual.get()
+
+
+class _Histograma:
+    """Histograma acumulado y ventana de muestras recientes de una etapa"""
+    
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS_SEGUNDOS)
+        self.suma = 0.0
+        self.cuenta = 0
+        self.recientes = deque(maxlen=METRICS_WINDOW)
+    
+    def observar(self, segundos: float):
+        for indice, limite in enumerate(BUCKETS_SEGUNDOS):
+            if segundos <= limite:
+                self.buckets[indice] += 1
+        self.suma += segundos
+        self.cuenta += 1
+        self.recientes.append(segundos)
+    
+    def cuantiles(self) -> Dict[float, float]:
+        """Percentiles por rango más cercano sobre las muestras recientes"""
+        muestras = sorted(self.recientes)
+        if not muestras:
+            return {}
+        return {
+            cuantil: muestras[min(len(muestras) - 1, max(0, int(round(cuantil * len(muestras))) - 1))]
+            for cuantil in CUANTILES
+        }
+
+
+def _etiquetas(**valores: str) -> str:
+    partes = []
+    for clave, valor in valores.items():
+        valor = str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        partes.append(f'{clave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+class MetricasEtapas:
+    """Histogramas por (traza, etapa)"""
+    
+    def __init__(self):
+        self._histogramas: Dict[Tuple[str, str], _Histograma] = {}
+        self._lock = threading.Lock()
+    
+    def observar_traza(self, traza: Traza):
+        with self._lock:
+            for etapa, segundos in traza.etapas.items():
+                histograma = self._histogramas.setdefault((traza.nombre, etapa), _Histograma())
+                histograma.observar(segundos)
+    
+    def prometheus(self) -> str:
+        """Métricas en formato de texto de Prometheus (0.0.4)"""
+        lineas = [
+            "# HELP profego_stage_duration_seconds Duración de cada etapa por petición",
+            "# TYPE profego_stage_duration_seconds histogram"
+        ]
+        cuantiles = [
+            "# HELP profego_stage_duration_quantile_seconds Percentiles de las últimas muestras de cada etapa",
+            "# TYPE profego_stage_duration_quantile_seconds summary"
+        ]
+        
+        with self._lock:
+            for (nombre, etapa), histograma in sorted(self._histogramas.items()):
+                for limite, cuenta in zip(BUCKETS_SEGUNDOS, histograma.buckets):
+                    lineas.append(
+                        f"profego_stage_duration_seconds_bucket{_etiquetas(pipeline=nombre, stage=etapa, le=repr(limite))} {cuenta}"
+                    )
+                lineas.append(
+                    f"profego_stage_duration_seconds_bucket{_etiquetas(pipeline=nombre, stage=etapa, le='+Inf')} {histograma.cuenta}"
+                )
+                lineas.append(f"profego_stage_duration_seconds_sum{_etiquetas(pipeline=nombre, stage=etapa)} {histograma.suma}")
+                lineas.append(f"profego_stage_duration_seconds_count{_etiquetas(pipeline=nombre, stage=etapa)} {histograma.cuenta}")
+                
+                for cuantil, valor in histograma.cuantiles().items():
+                    cuantiles.append(
+                        f"profego_stage_duration_quantile_seconds{_etiquetas(pipeline=nombre, stage=etapa, quantile=cuantil)} {valor}"
+                    )
+                # _sum y _count son contadores acumulados, como en el histograma
+                cuantiles.append(f"profego_stage_duration_quantile_seconds_sum{_etiquetas(pipeline=nombre, stage=etapa)} {histograma.suma}")
+                cuantiles.append(f"profego_stage_duration_quantile_seconds_count{_etiquetas(pipeline=nombre, stage=etapa)} {histograma.cuenta}")
+        
+        return "\n".join(lineas + cuantiles) + "\n"
+
+
+# Registro global del proceso
+metricas = MetricasEtapas()